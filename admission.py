@@ -0,0 +1,200 @@
+"""Admission control: per-key rate limits and prioritized provider slots.
+
+Two gates, both answering 429 with Retry-After when they turn a request
+away. ``check_rate`` is a token bucket per API key, taken once per request
+right after authentication. ``slot`` bounds concurrent provider calls: a
+global cap (outbound connections) plus a cap per tier, with waiters served
+premium first and shed once they have queued longer than their tier's
+deadline, so a burst of free traffic cannot starve premium callers.
+"""
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+import telemetry
+
+FREE = "free"
+PREMIUM = "premium"
+
+# Tier of the request being served, set when its API key is authorized;
+# provider calls made outside a request (scripts, jobs) count as free
+current_tier: ContextVar[str] = ContextVar("admission_tier", default=FREE)
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Take one token: 0.0 if there was one, else seconds until there is."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class TierPolicy:
+    """Limits for one tier; a lower ``priority`` is served first."""
+
+    def __init__(self, name: str, priority: int, rate: float, burst: float,
+                 concurrency: int, max_wait: float):
+        self.name = name
+        self.priority = priority
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.concurrency = concurrency
+        self.max_wait = max_wait
+        self.inflight = 0
+        self.admitted = 0
+        self.rate_limited = 0
+        self.shed = 0
+
+
+def _retry_after(seconds: float) -> Dict[str, str]:
+    return {"Retry-After": str(max(1, math.ceil(seconds)))}
+
+
+class AdmissionController:
+    def __init__(self, tiers: List[TierPolicy], capacity: int, enabled: bool = True):
+        self.tiers = {tier.name: tier for tier in tiers}
+        self.capacity = capacity
+        self.enabled = enabled
+        self.inflight = 0
+        self._buckets: Dict[Tuple[str, str], TokenBucket] = {}
+        # [priority, seq, tier, future]; entries whose future is done are stale
+        self._waiters: List[list] = []
+        self._seq = itertools.count()
+
+    @classmethod
+    def from_env(cls) -> "AdmissionController":
+        """ADMISSION_CONTROL=0 disables both gates. ADMISSION_MAX_CONCURRENCY
+        caps provider calls in flight (default: LLM_MAX_CONNECTIONS); per tier,
+        RATE_LIMIT_<TIER>_RPS/_BURST set the key's bucket (0 rps: unlimited),
+        ADMISSION_<TIER>_CONCURRENCY its share of the slots and
+        ADMISSION_<TIER>_MAX_WAIT how long it may queue for one."""
+        capacity = int(os.getenv("ADMISSION_MAX_CONCURRENCY", os.getenv("LLM_MAX_CONNECTIONS", 100)))
+        defaults = {
+            PREMIUM: dict(priority=0, rate=60.0, burst=120.0, concurrency=capacity, max_wait=10.0),
+            FREE: dict(priority=1, rate=30.0, burst=60.0, concurrency=max(1, capacity * 3 // 4), max_wait=2.0),
+        }
+        tiers = []
+        for name, default in defaults.items():
+            prefix = name.upper()
+            tiers.append(TierPolicy(
+                name,
+                default["priority"],
+                rate=float(os.getenv(f"RATE_LIMIT_{prefix}_RPS", default["rate"])),
+                burst=float(os.getenv(f"RATE_LIMIT_{prefix}_BURST", default["burst"])),
+                concurrency=int(os.getenv(f"ADMISSION_{prefix}_CONCURRENCY", default["concurrency"])),
+                max_wait=float(os.getenv(f"ADMISSION_{prefix}_MAX_WAIT", default["max_wait"])),
+            ))
+        return cls(tiers, capacity, enabled=os.getenv("ADMISSION_CONTROL", "1") != "0")
+
+    def check_rate(self, key: str, tier_name: str):
+        """Charge one request to ``key``'s bucket, or raise 429."""
+        current_tier.set(tier_name)
+        tier = self.tiers[tier_name]
+        if not self.enabled or tier.rate <= 0:
+            return
+        bucket = self._buckets.get((tier_name, key))
+        if bucket is None:
+            bucket = self._buckets[(tier_name, key)] = TokenBucket(tier.rate, tier.burst)
+        wait = bucket.take()
+        if wait > 0:
+            tier.rate_limited += 1
+            telemetry.ADMISSION_REJECTIONS.inc(tier_name, "rate")
+            raise HTTPException(status_code=429, detail="Rate limit exceeded for this API key",
+                                headers=_retry_after(wait))
+
+    def _dispatch(self):
+        blocked = []
+        while self._waiters and self.inflight < self.capacity:
+            waiter = heapq.heappop(self._waiters)
+            tier, future = waiter[2], waiter[3]
+            if future.done():
+                continue
+            if tier.inflight >= tier.concurrency:
+                blocked.append(waiter)
+                continue
+            tier.inflight += 1
+            self.inflight += 1
+            future.set_result(None)
+        for waiter in blocked:
+            heapq.heappush(self._waiters, waiter)
+
+    def _release(self, tier: TierPolicy):
+        tier.inflight -= 1
+        self.inflight -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, tier_name: Optional[str] = None) -> AsyncIterator[None]:
+        """Hold one provider-call slot for the current request's tier."""
+        if not self.enabled:
+            yield
+            return
+        tier = self.tiers[tier_name or current_tier.get()]
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, [tier.priority, next(self._seq), tier, future])
+        self._dispatch()
+        started = time.perf_counter()
+        if not future.done():
+            try:
+                await asyncio.wait_for(future, tier.max_wait)
+            except asyncio.TimeoutError:
+                tier.shed += 1
+                telemetry.ADMISSION_REJECTIONS.inc(tier.name, "queue")
+                raise HTTPException(status_code=429, detail="Server is busy, please retry shortly",
+                                    headers=_retry_after(tier.max_wait)) from None
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    self._release(tier)
+                raise
+        tier.admitted += 1
+        telemetry.ADMISSION_WAIT.observe(time.perf_counter() - started, tier.name)
+        try:
+            yield
+        finally:
+            self._release(tier)
+
+    def queued(self) -> Dict[str, int]:
+        counts = {name: 0 for name in self.tiers}
+        for _, _, tier, future in self._waiters:
+            if not future.done():
+                counts[tier.name] += 1
+        return counts
+
+    def stats(self) -> Dict:
+        queued = self.queued()
+        return {
+            "enabled": self.enabled,
+            "capacity": self.capacity,
+            "inflight": self.inflight,
+            "tiers": {
+                name: {
+                    "inflight": tier.inflight,
+                    "queued": queued[name],
+                    "concurrency": tier.concurrency,
+                    "admitted": tier.admitted,
+                    "rate_limited": tier.rate_limited,
+                    "shed": tier.shed,
+                }
+                for name, tier in self.tiers.items()
+            },
+        }
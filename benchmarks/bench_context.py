@@ -0,0 +1,138 @@
+"""Prompt tokens per request before and after token-budgeted context packing.
+
+    python benchmarks/bench_context.py [--db data/index/chunks.db] [--sentence-db /tmp/sentences.db]
+
+Prompts are the exact chat messages each client would send (system prompt
+with context, plus the question), counted with the same tokenizer as the
+service (tiktoken if installed, else its local estimate). "before" is the
+old assembly: the top two chunks, every web snippet, the whole platform
+context. "after" packs deduplicated passages into each model's budget and
+sends only the platform sections a question touches. With --sentence-db (a
+store built with ``python -m retrieval.ingest --chunking sentences``) the
+document path is also measured on sentence chunks with overlap.
+"""
+import argparse
+import statistics
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from llm_clients import GPT4Client, GroqClient  # noqa: E402
+from retrieval.bm25 import BM25Index  # noqa: E402
+from retrieval.context import Passage, SectionedContext, build_context, context_budget  # noqa: E402
+from retrieval.ingest import DEFAULT_STORE_PATH  # noqa: E402
+from retrieval.store import ChunkStore  # noqa: E402
+from retrieval.text import count_tokens  # noqa: E402
+
+DOCUMENT_QUERIES = [
+    "berapa kebutuhan kalori ibu hamil trimester 3",
+    "asam folat untuk ibu hamil",
+    "makanan yang mengandung zat besi untuk mencegah anemia",
+    "status gizi ibu hamil diukur dengan LILA",
+    "apa penyebab kurang energi kronis pada ibu hamil",
+    "kebutuhan protein selama kehamilan",
+    "sistem pakar menu sehat ibu hamil",
+    "faktor yang mempengaruhi berat badan lahir rendah",
+    "pengetahuan ibu tentang gizi kehamilan",
+    "konsumsi tablet fe dan kadar hemoglobin",
+    "pola makan ibu hamil yang sehat",
+    "metode forward chaining untuk diagnosa",
+]
+CONVERSATION_QUERIES = [
+    "halo, apa kabar?",
+    "fitur apa saja yang ada di aplikasi ini?",
+    "bagaimana cara konsultasi dengan doctor?",
+    "bisa ingatkan jadwal checkup lewat whatsapp?",
+    "saya ingin mencatat nutrition harian",
+    "apa bedanya AI diagnosis dan AI analytics?",
+    "terima kasih sudah menemani saya",
+    "exercise apa yang aman untuk trimester 2?",
+]
+WEB_RESULTS = [
+    {"title": "Nutrisi Ibu Hamil - Kemenkes", "link": "https://example.org/a",
+     "body": "Ibu hamil perlu asupan asam folat, zat besi, kalsium dan protein yang cukup. Konsumsi sayur dan buah setiap hari."},
+    {"title": "Gizi Seimbang Kehamilan", "link": "https://example.org/b",
+     "body": "Ibu hamil perlu asupan asam folat, zat besi, kalsium dan protein yang cukup. Konsumsi sayur dan buah setiap hari."},
+    {"title": "Anemia pada Kehamilan", "link": "https://example.org/c",
+     "body": "Anemia saat hamil umumnya karena kekurangan zat besi. Tablet tambah darah diminum setiap hari selama kehamilan."},
+    {"title": "Tablet Tambah Darah", "link": "https://example.org/d",
+     "body": "Tablet tambah darah diminum setiap hari selama kehamilan. Minum bersama air jeruk membantu penyerapan."},
+    {"title": "Kalori Ibu Hamil", "link": "https://example.org/e",
+     "body": "Trimester kedua dan ketiga membutuhkan tambahan sekitar 300 kkal per hari dibanding sebelum hamil."},
+]
+
+
+def prompt_tokens(client, query: str, context: str) -> int:
+    return sum(count_tokens(message["content"]) for message in client._build_payload(query, context)["messages"])
+
+
+def load(db: str):
+    store = ChunkStore(db, read_only=True)
+    try:
+        rows = list(store.iter_chunks())
+    finally:
+        store.close()
+    index = BM25Index()
+    for _, tokens, _ in rows:
+        index.add_tokens(tokens.split())
+    index.finalize()
+    return [(text, source) for text, _, source in rows], index
+
+
+def document_contexts(chunks, index, query, budget, min_score_ratio):
+    before = "\n".join(chunks[doc_id][0] for doc_id, _ in index.search(query, 2))
+    passages = [Passage(*chunks[doc_id], score) for doc_id, score in index.search(query, 8)]
+    after, _, _ = build_context(passages, budget, min_score_ratio)
+    return before, after
+
+
+def web_contexts(budget):
+    formatted = [f"{result['title']}\n{result['body']}\n{result['link']}" for result in WEB_RESULTS]
+    after, _, _ = build_context([Passage(text, result["link"]) for text, result in zip(formatted, WEB_RESULTS)], budget)
+    return "\n".join(formatted), after
+
+
+def report(label, pairs):
+    before = [b for b, _ in pairs]
+    after = [a for _, a in pairs]
+    change = sum(after) / sum(before) - 1
+    print(f"  {label:<34} before {statistics.mean(before):7.0f}  after {statistics.mean(after):7.0f}  "
+          f"change {change:+6.0%}  max after {max(after):5d}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default=DEFAULT_STORE_PATH)
+    parser.add_argument("--sentence-db", default=None)
+    parser.add_argument("--min-score-ratio", type=float, default=0.6)
+    args = parser.parse_args()
+
+    from main import WEBSITE_CONTEXT
+
+    stores = [("word chunks", *load(args.db))]
+    if args.sentence_db:
+        stores.append(("sentence chunks", *load(args.sentence_db)))
+    platform = SectionedContext(WEBSITE_CONTEXT)
+
+    for client in (GroqClient(), GPT4Client()):
+        budget = context_budget(client.model)
+        print(f"\n{client.model} (context budget {budget} tokens), mean prompt tokens per request")
+        for name, chunks, index in stores:
+            pairs = []
+            for query in DOCUMENT_QUERIES:
+                before, after = document_contexts(chunks, index, query, budget, args.min_score_ratio)
+                pairs.append((prompt_tokens(client, query, before), prompt_tokens(client, query, after)))
+            report(f"documents, {name}", pairs)
+        before, after = web_contexts(budget)
+        report("web snippets (2 duplicates)", [(prompt_tokens(client, q, before), prompt_tokens(client, q, after))
+                                              for q in DOCUMENT_QUERIES])
+        if isinstance(client, GroqClient):
+            report("conversation (platform context)", [
+                (prompt_tokens(client, q, WEBSITE_CONTEXT), prompt_tokens(client, q, platform.for_query(q)))
+                for q in CONVERSATION_QUERIES
+            ])
+
+
+if __name__ == "__main__":
+    main()
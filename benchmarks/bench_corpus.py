@@ -0,0 +1,121 @@
+"""Bytes per chunk and load time: list + text-keyed source dict vs ChunkCorpus.
+
+    python benchmarks/bench_corpus.py [--copies 400]
+
+The bundled chunk store is replicated ``--copies`` times (each copy's
+chunks made distinct, as different journals would be) into a temporary
+store, which is then loaded into each layout the way
+``HealthKnowledgeBase.load_store`` does, without the BM25 index. Load time
+is the best of three untraced loads; memory is what tracemalloc sees
+allocated by one more. "top-8 lookup" materializes the text and source of
+8 random chunks, as a search does.
+"""
+import argparse
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from retrieval.corpus import ChunkCorpus  # noqa: E402
+from retrieval.ingest import DEFAULT_STORE_PATH  # noqa: E402
+from retrieval.store import ChunkStore  # noqa: E402
+
+
+def replicate(source: str, target: str, copies: int) -> int:
+    store = ChunkStore(source, read_only=True)
+    try:
+        rows = list(store.iter_chunks())
+    finally:
+        store.close()
+    store = ChunkStore(target)
+    try:
+        for copy in range(copies):
+            chunks = [(seq, seq + 1, f"{text} ({copy})", tokens) for seq, (text, tokens, _) in enumerate(rows)]
+            store.replace_file(f"copy-{copy}.pdf", f"Document: copy-{copy}.pdf", 0.0, 0, str(copy), chunks)
+        return store.signature()[0]
+    finally:
+        store.close()
+
+
+def load_legacy(path: str):
+    knowledge, sources = [], {}
+    store = ChunkStore(path, read_only=True)
+    try:
+        for chunk, _, source in store.iter_chunks():
+            knowledge.append(chunk)
+            sources[chunk] = source
+    finally:
+        store.close()
+    return knowledge, sources
+
+
+def load_corpus(path: str):
+    corpus = ChunkCorpus()
+    store = ChunkStore(path, read_only=True)
+    try:
+        for chunk, _, source in store.iter_chunks():
+            corpus.append(chunk, source)
+    finally:
+        store.close()
+    return corpus
+
+
+def measure(load, path: str, repeats: int = 3):
+    """Best-of-``repeats`` load time, then the memory of one more (traced) load."""
+    elapsed = float("inf")
+    for _ in range(repeats):
+        started = time.perf_counter()
+        load(path)
+        elapsed = min(elapsed, time.perf_counter() - started)
+    tracemalloc.start()
+    layout = load(path)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return layout, elapsed, current, peak
+
+
+def lookup_us(lookup, count: int, repeats: int = 2000) -> float:
+    rng = random.Random(0)
+    ids = [[rng.randrange(count) for _ in range(8)] for _ in range(repeats)]
+    started = time.perf_counter()
+    for top in ids:
+        for doc_id in top:
+            lookup(doc_id)
+    return (time.perf_counter() - started) / repeats * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--copies", type=int, default=400)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    try:
+        path = str(Path(tmp) / "chunks.db")
+        count = replicate(DEFAULT_STORE_PATH, path, args.copies)
+        (knowledge, sources), legacy_s, legacy_bytes, legacy_peak = measure(load_legacy, path)
+        text_bytes = sum(len(chunk.encode("utf-8")) for chunk in knowledge)
+        legacy_lookup = lookup_us(lambda doc_id: (knowledge[doc_id], sources[knowledge[doc_id]]), count)
+        del knowledge, sources
+        corpus, corpus_s, corpus_bytes, corpus_peak = measure(load_corpus, path)
+        corpus_lookup = lookup_us(lambda doc_id: corpus[doc_id], count)
+
+        print(f"{count} chunks, {text_bytes / count:.0f} bytes of UTF-8 text per chunk")
+        print(f"{'layout':<26} {'bytes/chunk':>11} {'total MB':>9} {'peak MB':>8} {'load s':>7} {'top-8 lookup':>12}")
+        for name, seconds, size, peak, lookup in [
+            ("list + dict[text]", legacy_s, legacy_bytes, legacy_peak, legacy_lookup),
+            ("ChunkCorpus", corpus_s, corpus_bytes, corpus_peak, corpus_lookup),
+        ]:
+            print(f"{name:<26} {size / count:11.0f} {size / 1e6:9.1f} {peak / 1e6:8.1f} {seconds:7.2f} "
+                  f"{lookup:10.1f}us")
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == "__main__":
+    main()
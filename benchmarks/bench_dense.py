@@ -0,0 +1,94 @@
+"""Recall and query latency: legacy overlap scan vs BM25 vs dense vs hybrid.
+
+    python -m retrieval.ingest            # build data/index/chunks.db first
+    python benchmarks/bench_dense.py [--queries 300]
+
+Queries are 8-word windows from random chunks of the bundled journals,
+perturbed with inflections (-nya, -an, di-, ke-) and typos, the way users
+rephrase; the chunk a query came from is its relevant answer.
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from retrieval.bm25 import BM25Index  # noqa: E402
+from retrieval.dense import DenseIndex, HashedNgramEmbedder, hybrid_merge  # noqa: E402
+from retrieval.ingest import DEFAULT_STORE_PATH  # noqa: E402
+from retrieval.store import ChunkStore  # noqa: E402
+
+
+def perturb(word: str, rng: random.Random) -> str:
+    roll = rng.random()
+    if roll < 0.2:
+        return word + rng.choice(["nya", "an", "kan"])
+    if roll < 0.3:
+        return rng.choice(["di", "ke", "ber"]) + word
+    if roll < 0.45 and len(word) > 4:
+        i = rng.randrange(1, len(word) - 1)
+        return word[:i] + word[i + 1:]
+    return word
+
+
+def legacy_scan(knowledge, query, k):
+    query_words = set(query.lower().split())
+    scored = []
+    for doc_id, chunk in enumerate(knowledge):
+        score = len(query_words.intersection(set(chunk.lower().split())))
+        if score > 0:
+            scored.append((score, doc_id))
+    scored.sort(reverse=True)
+    return [(doc_id, score) for score, doc_id in scored[:k]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default=DEFAULT_STORE_PATH)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--k", type=int, default=2)
+    args = parser.parse_args()
+
+    store = ChunkStore(args.db, read_only=True)
+    knowledge = [text for text, _, _ in store.iter_chunks()]
+    store.close()
+
+    index = BM25Index()
+    index.add_many(knowledge)
+    index.finalize()
+    embedder = HashedNgramEmbedder()
+    dense = DenseIndex.build(embedder, knowledge)
+    dense_int8 = DenseIndex.build(embedder, knowledge, quantize=True)
+
+    rng = random.Random(0)
+    queries = []
+    for _ in range(args.queries):
+        doc_id = rng.randrange(len(knowledge))
+        words = knowledge[doc_id].split()
+        start = rng.randrange(max(1, len(words) - 8))
+        queries.append((doc_id, " ".join(perturb(w, rng) for w in words[start:start + 8])))
+
+    k = args.k
+    scorers = {
+        "legacy overlap": lambda q: legacy_scan(knowledge, q, k),
+        "bm25": lambda q: index.search(q, k),
+        "dense f32": lambda q: dense.search(embedder.embed([q])[0], k),
+        "dense int8": lambda q: dense_int8.search(embedder.embed([q])[0], k),
+        "hybrid": lambda q: hybrid_merge(index.search(q, 50), dense.search(embedder.embed([q])[0], 50), k),
+    }
+
+    print(f"{len(knowledge)} chunks, {len(queries)} queries")
+    print(f"{'scorer':<16} {f'recall@{k}':>9} {'ms/query':>9}")
+    for name, scorer in scorers.items():
+        hits = 0
+        start = time.perf_counter()
+        for doc_id, query in queries:
+            hits += any(hit == doc_id for hit, _ in scorer(query))
+        elapsed = (time.perf_counter() - start) * 1000 / len(queries)
+        print(f"{name:<16} {hits / len(queries):9.3f} {elapsed:9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""Diagnosis parse failures, LLM calls per successful diagnosis, and batch throughput.
+
+    python benchmarks/bench_diagnosis.py [--checkins 200]
+
+A stub LLM answers like real models do without JSON mode: often clean, but
+also fenced, wrapped in chatter, with trailing commas or cut off by the
+token limit (the mix is synthetic, see NOISE). With ``response_format``
+set it returns bare JSON, occasionally truncated. A failed parse is
+retried, as the user would, up to --attempts times. The complaint is one
+the local rules do not recognise, so every diagnosis takes the LLM path.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.stub_servers import llm_app, serve  # noqa: E402
+
+ANALYSIS = {
+    "health_score": 72,
+    "severity_level": "Sedang",
+    "urgency_level": "Sedang",
+    "possible_conditions": ["Hiperemesis gravidarum", "Dehidrasi ringan"],
+    "recommendations": ["Minum air sedikit tapi sering", "Periksa ke bidan jika muntah berlanjut"],
+}
+COMPLAINT = "merasa tidak enak badan sejak kemarin"
+CLEAN = json.dumps(ANALYSIS, ensure_ascii=False, indent=2)
+
+NOISE = [
+    (0.45, lambda: CLEAN),
+    (0.20, lambda: f"```json\n{CLEAN}\n```"),
+    (0.12, lambda: f"Berikut hasil analisis dalam format JSON:\n{CLEAN}"),
+    (0.10, lambda: CLEAN.replace("]\n}", "],\n}")),
+    (0.08, lambda: f"{CLEAN}\n\nCatatan: ini bukan pengganti diagnosis dokter."),
+    (0.05, lambda: CLEAN[:-40]),
+]
+
+
+def make_reply(seed: int):
+    rng = random.Random(seed)
+
+    def reply(body):
+        if body.get("response_format"):
+            return CLEAN[:-40] if rng.random() < 0.02 else CLEAN
+        roll = rng.random()
+        for share, render in NOISE:
+            if roll < share:
+                return render()
+            roll -= share
+        return CLEAN
+
+    return reply
+
+
+async def legacy_analyze(client, prompt):
+    # The old path: no JSON mode, bare json.loads, required keys
+    response = await client.get_response(prompt, "")
+    analysis = json.loads(response)
+    for key in ("health_score", "severity_level", "urgency_level", "possible_conditions", "recommendations"):
+        analysis[key]
+
+
+async def run(args, stub):
+    import telemetry
+    from expert_system.inference_engine import InferenceEngine, InteractiveDiagnosis
+    from expert_system.knowledge_base import KnowledgeBase
+    from llm_clients import BaseLLMClient, GroqClient
+
+    client = GroqClient()
+    engine = InferenceEngine(KnowledgeBase(lang="id"), client)
+    answers = {"Sudah berapa lama Anda mengalami keluhan ini?": "3 hari"}
+
+    async def legacy_once():
+        try:
+            await legacy_analyze(client, f"Keluhan: {COMPLAINT}. Jawaban: {answers}")
+            return True
+        except (ValueError, KeyError):
+            return False
+
+    async def engine_once():
+        before = telemetry.DIAGNOSIS_PARSES.values.get(("failed",), 0)
+        await engine.analyze_answers(InteractiveDiagnosis(COMPLAINT, answers=answers))
+        return telemetry.DIAGNOSIS_PARSES.values.get(("failed",), 0) == before
+
+    async def measure(name, once):
+        calls = parse_failures = successes = 0
+        for _ in range(args.checkins):
+            for _ in range(args.attempts):
+                calls += 1
+                if await once():
+                    successes += 1
+                    break
+                parse_failures += 1
+        print(f"{name:<30} failed parses {parse_failures / calls:6.1%}  "
+              f"calls/successful diagnosis {calls / max(successes, 1):5.2f}  "
+              f"unresolved {args.checkins - successes:3d}/{args.checkins}")
+
+    print(f"{args.checkins} check-ins, up to {args.attempts} attempts each")
+    await measure("bare json.loads, no JSON mode", legacy_once)
+    BaseLLMClient.json_mode_supported = False
+    await measure("extractor, no JSON mode", engine_once)
+    BaseLLMClient.json_mode_supported = True
+    await measure("extractor + JSON mode", engine_once)
+
+    stub.state.config.update(latency_ms=args.latency_ms, jitter_ms=args.latency_ms / 5)
+    requests = [{"complaint": f"{COMPLAINT} ({i})", "answers": answers} for i in range(args.batch)]
+    start = time.perf_counter()
+    for request in requests:
+        await engine.diagnose(request["complaint"], request["answers"])
+    sequential = time.perf_counter() - start
+    start = time.perf_counter()
+    await engine.diagnose_batch(requests, args.concurrency)
+    batched = time.perf_counter() - start
+    print(f"\n{args.batch} check-ins at ~{args.latency_ms:.0f} ms/LLM call")
+    print(f"one request per check-in  {sequential:6.2f} s")
+    print(f"diagnose_batch (x{args.concurrency})      {batched:6.2f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--checkins", type=int, default=200)
+    parser.add_argument("--attempts", type=int, default=3)
+    parser.add_argument("--batch", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    args = parser.parse_args()
+
+    stub = llm_app(latency_ms=0, jitter_ms=0, reply=make_reply(seed=0))
+    with serve(stub) as llm_url:
+        os.environ["GROQ_BASE_URL"] = f"{llm_url}/v1"
+        asyncio.run(run(args, stub))
+
+
+if __name__ == "__main__":
+    main()
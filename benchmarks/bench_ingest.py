@@ -0,0 +1,40 @@
+"""Pages/sec and peak RSS of bulk ingestion over the bundled PDFs.
+
+    python benchmarks/bench_ingest.py [--workers 1,2,4] [DIR ...]
+
+Each configuration runs `python -m retrieval.ingest` in a fresh process
+against a throw-away store, so peak RSS numbers are not polluted by earlier
+runs.
+"""
+import argparse
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("directories", nargs="*", default=["data/sistem-pakar"])
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--pages-per-task", type=int, default=4)
+    args = parser.parse_args()
+
+    for workers in args.workers.split(","):
+        with tempfile.TemporaryDirectory() as tmp:
+            output = subprocess.run(
+                [sys.executable, "-m", "retrieval.ingest", *args.directories,
+                 "--db", str(Path(tmp) / "chunks.db"),
+                 "--workers", workers, "--pages-per-task", str(args.pages_per_task)],
+                cwd=ROOT, capture_output=True, text=True, check=True,
+            ).stdout
+        summary = [line for line in output.splitlines() if not line.strip().startswith(("added", "unchanged"))]
+        print(f"workers={workers}")
+        for line in summary:
+            print(f"  {line}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Accuracy and throughput of the small-talk intent classifier vs the old regexes.
+
+    python benchmarks/bench_intents.py [--corpus benchmarks/data/intent_corpus.jsonl]
+
+The corpus is labeled JSONL ({"text", "intent"}); "none" marks messages
+that must reach retrieval/LLM. Reports per-intent precision/recall, the
+share of messages answered locally, and per-message classification latency.
+"""
+import argparse
+import json
+import re
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from intents import IntentClassifier  # noqa: E402
+
+DEFAULT_CORPUS = Path(__file__).resolve().parent / "data" / "intent_corpus.jsonl"
+
+# What health_chat did before: three regex scans, then the same three again
+LEGACY_PATTERNS = [
+    ("greeting", r'^hi\b|^hello\b|^hay\b|^halo\b'),
+    ("thanks", r'thank|thanks|terima kasih'),
+    ("goodbye", r'bye|goodbye|sampai jumpa'),
+]
+
+
+def legacy_classify(text: str) -> str:
+    if not any(re.search(pattern, text.lower()) for _, pattern in LEGACY_PATTERNS):
+        return "none"
+    for intent, pattern in LEGACY_PATTERNS:
+        if re.search(pattern, text.lower()):
+            return intent
+    return "none"
+
+
+def evaluate(name, predict, rows, repeat):
+    predictions = [predict(text) for text, _ in rows]
+    correct = sum(p == label for p, (_, label) in zip(predictions, rows))
+    # A local answer to a "none" message is the costly error: a real question gets small talk
+    wrong_local = sum(p != "none" and label == "none" for p, (_, label) in zip(predictions, rows))
+    local = sum(p != "none" for p in predictions)
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for text, _ in rows:
+            predict(text)
+    elapsed = time.perf_counter() - start
+    per_message_us = elapsed * 1e6 / (repeat * len(rows))
+
+    print(f"{name:<12} accuracy {correct / len(rows):6.1%}  answered locally {local / len(rows):6.1%}  "
+          f"questions swallowed {wrong_local:3d}  {per_message_us:6.1f} us/msg  "
+          f"{repeat * len(rows) / elapsed:10,.0f} msg/s")
+    return predictions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", default=str(DEFAULT_CORPUS))
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    with open(args.corpus, encoding="utf-8") as file:
+        rows = [(row["text"], row["intent"]) for row in map(json.loads, file) if row]
+
+    classifier = IntentClassifier()
+
+    def predict(text: str) -> str:
+        intent = classifier.classify(text)
+        return intent.name if intent and intent.confidence >= classifier.min_confidence else "none"
+
+    print(f"{len(rows)} labeled messages, {len({label for _, label in rows})} classes")
+    evaluate("legacy regex", legacy_classify, rows, args.repeat)
+    predictions = evaluate("classifier", predict, rows, args.repeat)
+
+    true_positive, predicted, actual = Counter(), Counter(), Counter()
+    for prediction, (_, label) in zip(predictions, rows):
+        predicted[prediction] += 1
+        actual[label] += 1
+        true_positive[label] += prediction == label
+    print(f"\n{'intent':<14} {'precision':>9} {'recall':>7} {'n':>4}")
+    for label in sorted(actual):
+        precision = true_positive[label] / predicted[label] if predicted[label] else 0.0
+        print(f"{label:<14} {precision:9.2f} {true_positive[label] / actual[label]:7.2f} {actual[label]:4d}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""Concurrent diagnoses one node holds: synchronous requests vs the job queue.
+
+    python benchmarks/bench_jobs.py [--clients 50 200 800] [--llm-latency-ms 10000] [--gateway-timeout 30]
+
+The app runs in-process on uvicorn with ``--server-slots`` as its
+``limit_concurrency`` (connections beyond it get 503), against a stub
+provider that takes ``--llm-latency-ms`` per call, like GPT-4 on a long
+diagnosis. For each client count, that many clients ask for a full-LLM
+diagnosis at the same moment, each behind a ``--gateway-timeout`` like the
+mobile gateway:
+
+  sync  POST /v1/health/diagnose and wait for the answer
+  jobs  POST /v1/health/diagnose/jobs, then GET /v1/jobs/{id} every
+        ``--poll-interval`` seconds until it has finished
+
+Both retry a 503 (no server slot), a 429 (shed waiting for a provider
+slot) or a refused connection every ``--poll-interval`` seconds; a gateway timeout is final for a
+synchronous client. Reported per mode: diagnoses completed, rejections
+along the way, gateway timeouts, the longest any single
+connection stayed open, and time to the result.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+import uuid
+from collections import Counter
+from contextlib import redirect_stdout
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.loadtest import ANSWERS, LLM_JSON, percentiles  # noqa: E402
+from benchmarks.stub_servers import llm_app, serve  # noqa: E402
+
+PREMIUM_KEY = "bench-premium"
+# Matches no rule, so the diagnosis is one full LLM call
+COMPLAINT = "merasa tidak enak badan sejak kemarin"
+
+
+async def sync_client(client, n: int, gateway_timeout: float, retry_interval: float, deadline: float):
+    started = time.perf_counter()
+    rejected = 0
+    while time.perf_counter() < deadline:
+        sent = time.perf_counter()
+        try:
+            response = await client.post("/v1/health/diagnose", headers={"x-api-key": PREMIUM_KEY},
+                                         json={"complaint": f"{COMPLAINT} ({n})", "answers": ANSWERS},
+                                         timeout=gateway_timeout)
+        except httpx.TimeoutException:
+            # The gateway gave up; the node may still be working on it
+            return "timeout", None, gateway_timeout, rejected
+        except httpx.TransportError:
+            # Connection refused or reset: the node's accept backlog overflowed
+            response = None
+        if response is not None and response.status_code not in (503, 429):
+            outcome = "ok" if response.status_code == 200 else "failed"
+            return outcome, time.perf_counter() - started, time.perf_counter() - sent, rejected
+        # No server slot, or shed while queued for a provider slot
+        rejected += 1
+        await asyncio.sleep(retry_interval)
+    return "unfinished", None, 0.0, rejected
+
+
+async def job_client(client, n: int, gateway_timeout: float, poll_interval: float, deadline: float):
+    headers = {"x-api-key": PREMIUM_KEY, "x-client-id": f"bench-{n}", "idempotency-key": str(uuid.uuid4())}
+    started = time.perf_counter()
+    longest, rejected, job_id = 0.0, 0, None
+    while time.perf_counter() < deadline:
+        sent = time.perf_counter()
+        try:
+            if job_id is None:
+                # Resubmitting is safe: the idempotency key returns the same job
+                response = await client.post("/v1/health/diagnose/jobs", headers=headers,
+                                             json={"complaint": f"{COMPLAINT} ({n})", "answers": ANSWERS},
+                                             timeout=gateway_timeout)
+            else:
+                response = await client.get(f"/v1/jobs/{job_id}", headers=headers, timeout=gateway_timeout)
+        except httpx.TimeoutException:
+            longest = gateway_timeout
+            await asyncio.sleep(poll_interval)
+            continue
+        except httpx.TransportError:
+            response = None
+        longest = max(longest, time.perf_counter() - sent)
+        if response is None or response.status_code in (503, 429):
+            rejected += 1
+        elif response.status_code not in (200, 202):
+            return "failed", None, longest, rejected
+        else:
+            job = response.json()
+            job_id = job["job_id"]
+            if job["status"] in ("succeeded", "failed"):
+                outcome = "ok" if job["status"] == "succeeded" else "failed"
+                return outcome, time.perf_counter() - started, longest, rejected
+        await asyncio.sleep(poll_interval)
+    return "unfinished", None, longest, rejected
+
+
+async def run_level(app_url, mode: str, clients: int, args):
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(base_url=app_url, limits=limits) as client:
+        started = time.perf_counter()
+        deadline = started + args.max_seconds
+        request = sync_client if mode == "sync" else job_client
+        results = await asyncio.gather(*(
+            request(client, n, args.gateway_timeout, args.poll_interval, deadline) for n in range(clients)
+        ))
+        elapsed = time.perf_counter() - started
+    outcomes = Counter(outcome for outcome, _, _, _ in results)
+    done = [seconds for outcome, seconds, _, _ in results if outcome == "ok"]
+    return outcomes, done, max(held for _, _, held, _ in results), sum(rejected for *_, rejected in results), elapsed
+
+
+async def run_all(app_url, args):
+    async with httpx.AsyncClient(base_url=app_url) as client:
+        while (await client.get("/health/ready")).status_code != 200:
+            await asyncio.sleep(0.05)
+    rows = []
+    for clients in args.clients:
+        for mode in ("sync", "jobs"):
+            outcomes, done, held, rejected, elapsed = await run_level(app_url, mode, clients, args)
+            result = percentiles([seconds * 1000 for seconds in done])
+            rows.append(f"{clients:7d} {mode:<5} {outcomes['ok']:9d} {rejected:8d} {outcomes['timeout']:8d} "
+                        f"{outcomes['failed'] + outcomes['unfinished']:7d} {held:9.1f} "
+                        f"{result.get('p50', 0) / 1000:9.1f} {result.get('p99', 0) / 1000:9.1f} {elapsed:8.1f}")
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, nargs="+", default=[50, 200, 800])
+    parser.add_argument("--llm-latency-ms", type=float, default=10000.0)
+    parser.add_argument("--gateway-timeout", type=float, default=30.0)
+    parser.add_argument("--server-slots", type=int, default=200, help="uvicorn limit_concurrency")
+    parser.add_argument("--provider-slots", type=int, default=100, help="ADMISSION_MAX_CONCURRENCY and JOB_WORKERS")
+    parser.add_argument("--poll-interval", type=float, default=2.0, help="Seconds between polls and retries")
+    parser.add_argument("--max-seconds", type=float, default=600.0, help="Clients give up after this")
+    args = parser.parse_args()
+
+    stub = llm_app(latency_ms=args.llm_latency_ms, jitter_ms=args.llm_latency_ms / 10, reply=LLM_JSON)
+    with serve(stub) as llm_url:
+        os.environ.update(
+            GROQ_BASE_URL=f"{llm_url}/v1", OPENAI_BASE_URL=f"{llm_url}/v1", API_KEY_REQUIRED="bench-free",
+            PREMIUM_API_KEY=PREMIUM_KEY, INDEX_WATCH_INTERVAL="0", ANSWER_CACHE_SIZE="0",
+            LLM_MAX_CONNECTIONS=str(args.provider_slots), JOB_WORKERS=str(args.provider_slots),
+            GROQ_READ_TIMEOUT=str(args.llm_latency_ms / 1000 * 3), LLM_READ_TIMEOUT=str(args.llm_latency_ms / 1000 * 3),
+            RATE_LIMIT_PREMIUM_RPS="0",
+            JOB_QUEUE_MAX=str(max(args.clients) * 2),
+        )
+        print(f"stub provider {args.llm_latency_ms / 1000:.0f} s/call, {args.server_slots} server slots, "
+              f"{args.provider_slots} provider slots, gateway timeout {args.gateway_timeout:.0f} s")
+        # The service logs every request; keep the table readable
+        with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+            import main as app_module
+            with serve(app_module.app, lifespan="on", limit_concurrency=args.server_slots) as app_url:
+                rows = asyncio.run(run_all(app_url, args))
+    print(f"{'clients':>7} {'mode':<5} {'completed':>9} {'rejected':>8} {'timeout':>8} {'failed':>7} "
+          f"{'longest s':>9} {'p50 s':>9} {'p99 s':>9} {'wall s':>8}")
+    print("\n".join(rows))
+
+
+if __name__ == "__main__":
+    main()
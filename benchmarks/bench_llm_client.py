@@ -0,0 +1,81 @@
+"""Requests/sec and p99 of GroqClient: per-call httpx client vs the shared pool.
+
+    python benchmarks/bench_llm_client.py [--requests 500] [--concurrency 20]
+
+Both modes hit a local stub LLM server. Against the real providers the gap
+is larger, since every fresh client also pays a TLS handshake.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.stub_servers import llm_app, serve  # noqa: E402
+from llm_clients import BaseLLMClient, GroqClient  # noqa: E402
+
+
+async def legacy_get_response(client: GroqClient, query: str, context: str) -> str:
+    # What GroqClient did before the shared pool: a new client per call
+    async with httpx.AsyncClient() as http:
+        response = await http.post(
+            client.base_url,
+            headers=client.headers,
+            json={"model": "llama3-8b-8192", "messages": [{"role": "user", "content": query}]},
+        )
+        return response.json()["choices"][0]["message"]["content"]
+
+
+async def measure(call, total: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            await call()
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return total / elapsed, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99) - 1]
+
+
+async def run(args, base_url):
+    os.environ["GROQ_BASE_URL"] = f"{base_url}/v1"
+    client = GroqClient()
+
+    await BaseLLMClient.open_http_client()
+    try:
+        results = {
+            "per-call client": await measure(lambda: legacy_get_response(client, "halo", ""), args.requests, args.concurrency),
+            "pooled client": await measure(lambda: client.get_response("halo", ""), args.requests, args.concurrency),
+        }
+    finally:
+        await BaseLLMClient.close_http_client()
+
+    print(f"{'mode':<16} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    for mode, (rps, p50, p99) in results.items():
+        print(f"{mode:<16} {rps:8.1f} {p50:8.2f} {p99:8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    args = parser.parse_args()
+
+    with serve(llm_app(latency_ms=args.latency_ms, jitter_ms=args.latency_ms / 4)) as base_url:
+        asyncio.run(run(args, base_url))
+
+
+if __name__ == "__main__":
+    main()
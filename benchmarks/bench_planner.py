@@ -0,0 +1,122 @@
+"""Context latency of web-search questions: sequential vs speculative web search.
+
+    [DENSE_RETRIEVAL=1] python benchmarks/bench_planner.py [--copies 400] [--queries 300] [--web-share 0.7]
+
+The bundled chunk store is replicated ``--copies`` times (as a large
+journal library) and loaded into ``main.kb``. A fallback-heavy mix of
+questions (``--web-share`` of them about topics the journals do not cover)
+is resolved with ``HealthKnowledgeBase._resolve_context`` against a stub
+SerpAPI, one at a time, first with SPECULATIVE_SEARCH off (retrieval, then
+the search) and then on (the search starts alongside retrieval when the
+predicted document score is weak). Both use the same strong/weak
+thresholds and deadline, so the contexts agree and only the overlap
+differs. The web-snippet index is off, so every fallback pays a search;
+"local_cancelled" counts searches started speculatively and then dropped
+(the upstream call is still made). The overlap saves at most the retrieval
+time, so the gain grows with retrieval cost: try DENSE_RETRIEVAL=1.
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.bench_web_index import TOPICS  # noqa: E402
+from benchmarks.loadtest import DOCUMENT_QUESTIONS  # noqa: E402
+from benchmarks.stub_servers import serpapi_app, serve  # noqa: E402
+from retrieval.ingest import DEFAULT_STORE_PATH  # noqa: E402
+from retrieval.store import ChunkStore  # noqa: E402
+
+
+def replicate(source: str, target: str, copies: int) -> int:
+    store = ChunkStore(source, read_only=True)
+    try:
+        rows = list(store.iter_chunks())
+    finally:
+        store.close()
+    store = ChunkStore(target)
+    try:
+        for copy in range(copies):
+            chunks = [(seq, seq + 1, text, tokens) for seq, (text, tokens, _) in enumerate(rows)]
+            store.replace_file(f"copy-{copy}.pdf", f"Document: copy-{copy}.pdf", 0.0, 0, str(copy), chunks)
+        return store.signature()[0]
+    finally:
+        store.close()
+
+
+def questions(count: int, web_share: float, seed: int = 0):
+    rng = random.Random(seed)
+    for i in range(count):
+        if rng.random() < web_share:
+            yield f"bolehkah ibu hamil {rng.choice(TOPICS)} di minggu ke-{i}?"
+        else:
+            yield rng.choice(DOCUMENT_QUESTIONS).format(n=i)
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+async def run(kb, asked, stub):
+    import telemetry
+    from models import ModelVersion
+
+    plans_before = dict(telemetry.CONTEXT_PLANS.values)
+    requests_before = stub.state.requests
+    latencies = []
+    for question in asked:
+        started = time.perf_counter()
+        await kb._resolve_context(question, ModelVersion.ITHAI_1)
+        latencies.append((time.perf_counter() - started) * 1000)
+    # Let searches that missed the deadline finish before counting
+    await asyncio.sleep(1.0)
+    plans = {plan[0]: count - plans_before.get(plan, 0) for plan, count in telemetry.CONTEXT_PLANS.values.items()}
+    return latencies, {plan: int(count) for plan, count in plans.items() if count}, stub.state.requests - requests_before
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--copies", type=int, default=400)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--web-share", type=float, default=0.7)
+    parser.add_argument("--serpapi-latency-ms", type=float, default=400.0)
+    args = parser.parse_args()
+
+    asked = list(questions(args.queries, args.web_share))
+    stub = serpapi_app(latency_ms=args.serpapi_latency_ms, jitter_ms=args.serpapi_latency_ms / 5)
+    tmp = tempfile.mkdtemp()
+    try:
+        store_path = str(Path(tmp) / "chunks.db")
+        chunks = replicate(DEFAULT_STORE_PATH, store_path, args.copies)
+        with serve(stub) as url:
+            os.environ.update(SERPAPI_BASE_URL=url, SERPAPI_KEYS="bench", SEARCH_CACHE_TTL="0", WEB_INDEX="0")
+            from main import kb
+            kb.load_store(store_path)
+            kb._rank(kb.documents, asked[0])  # builds the dense index, if enabled, before timing
+
+            async def compare():
+                print(f"{len(asked)} questions ({args.web_share:.0%} off-corpus), {chunks} chunks, "
+                      f"SerpAPI ~{args.serpapi_latency_ms:.0f} ms")
+                print(f"{'mode':<12} {'mean ms':>8} {'p50':>8} {'p95':>8} {'searches':>9}  plans")
+                for name, speculative in [("sequential", False), ("speculative", True)]:
+                    kb.speculative_search = speculative
+                    latencies, plans, searches = await run(kb, asked, stub)
+                    print(f"{name:<12} {statistics.mean(latencies):8.1f} {percentile(latencies, 0.5):8.1f} "
+                          f"{percentile(latencies, 0.95):8.1f} {searches:9d}  {plans}")
+                await kb.search_engine.search_service.close()
+
+            asyncio.run(compare())
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""Chat latency with and without the precomputed answer table, on head-heavy traffic.
+
+    python benchmarks/bench_precompute.py [--requests 1000] [--head-share 0.6] [--top 200]
+
+Synthetic chat traffic asks a few pregnancy topics (nutrition, nausea,
+exercise, warning signs, ...) over and over in different wordings, with
+Zipf-distributed popularity, next to a long tail of one-off document
+questions. The first half is written out as a request log and mined by
+``python -m precompute`` against stub Groq and SerpAPI servers; the
+second half is replayed one request at a time against the app in-process,
+with the answer cache off, once without and once with the answer table.
+Reported: latency percentiles, the share of requests answered in under
+5 ms, and the table's exact and near-duplicate hits. Finally a journal is
+added and reloaded, and the head questions are asked again to check the
+table is no longer used for the changed corpus.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.loadtest import DOCUMENT_QUESTIONS, FREE_KEY, LLM_TEXT, percentiles  # noqa: E402
+from benchmarks.stub_servers import llm_app, serpapi_app, serve  # noqa: E402
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Each topic is asked in several wordings; the first is the most common
+HEAD_TOPICS = [
+    ["makanan apa yang baik untuk ibu hamil", "Makanan apa yg baik untuk ibu hamil?",
+     "makanan yang baik untuk ibu hamil apa saja ya dok", "bumil baiknya makan apa"],
+    ["cara mengatasi mual muntah saat hamil muda", "Gimana cara mengatasi mual muntah saat hamil muda?",
+     "cara mengatasi mual dan muntah hamil muda bun"],
+    ["olahraga yang aman untuk ibu hamil", "Olahraga apa yang aman untuk ibu hamil?",
+     "olahraga yg aman buat ibu hamil"],
+    ["tanda bahaya kehamilan yang harus diwaspadai", "Apa saja tanda bahaya kehamilan yang harus diwaspadai?",
+     "tanda bahaya kehamilan yg harus diwaspadai dok"],
+    ["berapa kebutuhan asam folat ibu hamil", "Berapa kebutuhan asam folat untuk ibu hamil?"],
+    ["apakah ibu hamil boleh minum kopi", "ibu hamil boleh minum kopi ga"],
+    ["penyebab anemia pada ibu hamil", "Apa penyebab anemia pada ibu hamil?"],
+    ["kenaikan berat badan normal selama kehamilan", "berapa kenaikan berat badan normal selama kehamilan"],
+    ["manfaat tablet fe untuk ibu hamil", "apa manfaat tablet fe untuk ibu hamil"],
+    ["cara mengatasi sembelit saat hamil", "Gimana cara mengatasi sembelit saat hamil?"],
+    ["kapan harus periksa kehamilan pertama kali", "kapan periksa kehamilan pertama kali"],
+    ["posisi tidur yang baik untuk ibu hamil", "Posisi tidur yang baik untuk ibu hamil?"],
+]
+
+
+def traffic(count: int, head_share: float, seed: int):
+    """Chat requests: head topics by Zipf popularity (then wording), the rest one-off document questions."""
+    rng = random.Random(seed)
+    topic_weights = [1 / rank for rank in range(1, len(HEAD_TOPICS) + 1)]
+    requests = []
+    for n in range(count):
+        if rng.random() < head_share:
+            wordings = rng.choices(HEAD_TOPICS, topic_weights)[0]
+            question = rng.choices(wordings, [1 / rank for rank in range(1, len(wordings) + 1)])[0]
+        else:
+            question = rng.choice(DOCUMENT_QUESTIONS).format(n=1000 + n)
+        requests.append({"method": "POST", "path": "/v1/health/chat", "key": "free",
+                         "body": {"question": question, "version": "ITHAI-1.0", "useWebSearch": True},
+                         "at": round(n * 0.1, 3)})
+    return requests
+
+
+async def replay(client, requests):
+    latencies = []
+    for request in requests:
+        started = time.perf_counter()
+        response = await client.post(request["path"], headers={"x-api-key": FREE_KEY}, json=request["body"])
+        if response.status_code == 200:
+            latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+async def run(app_module, replayed, head, folder: Path):
+    kb = app_module.kb
+    async with app_module.lifespan(app_module.app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app_module.app), base_url="http://bench",
+                                     timeout=60) as client:
+            while (await client.get("/health/ready")).status_code != 200:
+                await asyncio.sleep(0.05)
+            table = kb.answer_table
+            rows = []
+            for name, answer_table in [("no table", None), ("with table", table)]:
+                kb.answer_table = answer_table
+                before = dict(table.stats())
+                latencies = await replay(client, replayed)
+                after = table.stats()
+                rows.append((name, latencies, {key: after[key] - before[key] for key in ("hits_exact", "hits_similar")}))
+
+            # A new journal changes the corpus version; the table must stop answering
+            shutil.copy(next((ROOT / "data").glob("*/*.pdf")), folder / "new-journal.pdf")
+            await app_module.reloader.reload()
+            before = dict(table.stats())
+            await replay(client, head)
+            after = table.stats()
+            invalidation = {key: after[key] - before[key] for key in ("hits_exact", "hits_similar", "stale")}
+            return rows, invalidation, table.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--head-share", type=float, default=0.6, help="Share of requests asking a head topic")
+    parser.add_argument("--top", type=int, default=200, help="Questions precomputed (python -m precompute --top)")
+    parser.add_argument("--groq-latency-ms", type=float, default=250.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    requests = traffic(args.requests, args.head_share, args.seed)
+    mined, replayed = requests[:len(requests) // 2], requests[len(requests) // 2:]
+    head = [request for request in replayed if request["body"]["question"] in {q for topic in HEAD_TOPICS for q in topic}]
+    tmp = Path(tempfile.mkdtemp())
+    try:
+        folder = tmp / "documents"
+        folder.mkdir()
+        store_path = tmp / "chunks.db"
+        shutil.copy(ROOT / "data" / "index" / "chunks.db", store_path)
+        log = tmp / "requests.jsonl"
+        log.write_text("".join(json.dumps(request) + "\n" for request in mined), encoding="utf-8")
+        groq = llm_app(latency_ms=args.groq_latency_ms, jitter_ms=args.groq_latency_ms / 5, reply=lambda body: LLM_TEXT)
+        with serve(groq) as groq_url, serve(serpapi_app()) as serpapi_url:
+            os.environ.update(
+                GROQ_BASE_URL=f"{groq_url}/v1", OPENAI_BASE_URL=f"{groq_url}/v1", SERPAPI_BASE_URL=serpapi_url,
+                SERPAPI_KEYS="bench", API_KEY_REQUIRED=FREE_KEY, PREMIUM_API_KEY="bench-premium",
+                CHUNK_STORE_PATH=str(store_path), PRECOMPUTED_ANSWERS_PATH=str(tmp / "answers.db"),
+                INDEX_WATCH_DIRS=",".join(["data/documents", "data/sistem-pakar", str(folder)]),
+                INDEX_WATCH_INTERVAL="0", ANSWER_CACHE_SIZE="0", ADMISSION_CONTROL="0",
+            )
+            started = time.perf_counter()
+            job = subprocess.run([sys.executable, "-m", "precompute", "--log", str(log), "--top", str(args.top),
+                                  "--concurrency", "4", "--interval", "0"],
+                                 cwd=ROOT, capture_output=True, text=True, check=True)
+            job_s = time.perf_counter() - started
+            # The service logs every request; keep the table readable
+            with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+                import main as app_module
+                rows, invalidation, stats = asyncio.run(run(app_module, replayed, head, folder))
+
+        print(f"{len(mined)} requests mined, {len(replayed)} replayed ({len(head)} head-topic), "
+              f"Groq stub {args.groq_latency_ms:.0f} ms")
+        print(f"job: {job.stdout.strip().splitlines()[-1]} [{job_s:.1f} s wall]")
+        print(f"{'':<12} {'p50':>8} {'p95':>8} {'p99':>8} {'< 5 ms':>8} {'exact':>7} {'similar':>8}")
+        for name, latencies, hits in rows:
+            chat = percentiles(latencies)
+            fast = sum(latency < 5 for latency in latencies) / max(1, len(latencies))
+            print(f"{name:<12} {chat['p50']:8.1f} {chat['p95']:8.1f} {chat['p99']:8.1f} {fast:8.1%} "
+                  f"{hits['hits_exact']:7d} {hits['hits_similar']:8d}")
+        print(f"after adding a journal: {invalidation['hits_exact'] + invalidation['hits_similar']} table hits, "
+              f"{invalidation['stale']} stale lookups of {len(head)} head questions (table corpus "
+              f"{stats['corpus_version']})")
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Request overhead of the profiling hooks, from not installed to profiling every request.
+
+    python benchmarks/bench_profiling.py [--requests 1000]
+
+Drives the app in-process through httpx's ASGI transport against an instant
+stub LLM, like benchmarks/bench_telemetry.py, wrapping it per mode:
+
+  off             PROFILING unset: no middleware (the default)
+  installed       middleware installed, request not selected
+  watchdog        no middleware, LOOP_BLOCK_MS=100 heartbeat running
+  sampled 1%      PROFILE_SAMPLE_RATE=0.01
+  sampled 100%    every request stack-sampled
+  cProfile 100%   every request with x-profile: 1 (sampler + cProfile)
+
+The modes alternate in rounds to cancel out warm-up and drift.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.stub_servers import llm_app, serve  # noqa: E402
+
+API_KEY = "bench-premium"
+ADMIN_KEY = "bench-admin"
+
+
+async def run(service, requests: int, rounds: int, directory: str):
+    from profiling import LoopWatchdog, Profiler, ProfilingMiddleware
+
+    def wrapped(**options):
+        return ProfilingMiddleware(service.app, Profiler(enabled=True, directory=directory, **options))
+
+    modes = {
+        "off": (service.app, {}),
+        "installed": (wrapped(), {}),
+        "watchdog": (service.app, {}),
+        "sampled 1%": (wrapped(sample_rate=0.01), {}),
+        "sampled 100%": (wrapped(sample_rate=1.0), {}),
+        "cProfile 100%": (wrapped(), {"x-profile": "1", "x-admin-key": ADMIN_KEY}),
+    }
+    timings = {name: [] for name in modes}
+    seq = 0
+    for _ in range(rounds):
+        for name, (app, extra) in modes.items():
+            watchdog = LoopWatchdog(0.1, lambda record: None) if name == "watchdog" else None
+            if watchdog is not None:
+                watchdog.start()
+            headers = {"x-api-key": API_KEY, **extra}
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench",
+                                         timeout=60) as http:
+                start = time.perf_counter()
+                for _ in range(requests // rounds):
+                    seq += 1
+                    body = {"question": f"Apa fitur PregnaAI nomor {seq}?", "version": "ITHAI-1.0",
+                            "useWebSearch": False}
+                    response = await http.post("/v1/health/chat", json=body, headers=headers)
+                    response.raise_for_status()
+                timings[name].append((time.perf_counter() - start) * 1000 / (requests // rounds))
+            if watchdog is not None:
+                watchdog.stop()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=10)
+    args = parser.parse_args()
+
+    with serve(llm_app(latency_ms=0, jitter_ms=0)) as llm_url, tempfile.TemporaryDirectory() as directory:
+        os.environ.update(GROQ_BASE_URL=f"{llm_url}/v1", API_KEY_REQUIRED="bench-free", PREMIUM_API_KEY=API_KEY,
+                          ADMIN_API_KEY=ADMIN_KEY, RATE_LIMIT_PREMIUM_RPS="0", INDEX_WATCH_INTERVAL="0")
+        os.environ.pop("PROFILING", None)
+        # The service logs every request; keep the table readable
+        with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+            import main as service
+
+            async def session():
+                async with service.lifespan(service.app):
+                    return await run(service, args.requests, args.rounds, directory)
+
+            timings = asyncio.run(session())
+
+    off = statistics.median(timings["off"])
+    for name, values in timings.items():
+        value = statistics.median(values)
+        print(f"{name:<14} {value:7.3f} ms/request  ({(value - off) / off * 100:+.2f}%)")
+
+
+if __name__ == "__main__":
+    main()
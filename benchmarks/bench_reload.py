@@ -0,0 +1,166 @@
+"""Chat latency while the document index reloads: idle vs incremental reloads vs full rebuilds.
+
+    python benchmarks/bench_reload.py [--copies 400] [--rps 20] [--duration 20]
+
+A journal library is faked by hard-linking one bundled PDF ``--copies``
+times into a watched folder and replicating the bundled chunk store under
+those paths (with their real mtime and size, so ingestion skips them). The
+app boots in-process on uvicorn, with stub Groq and SerpAPI servers and
+the answer and search caches off, so every request retrieves. Each phase
+sends ``--duration`` seconds of open-loop, web-search-enabled document
+questions, like benchmarks/loadtest.py:
+
+  idle          no reload
+  incremental   back to back: drop a new journal into the folder and
+                POST /v1/admin/reload (extract it in-process, build a
+                segment, merge per INDEX_MAX_SEGMENTS, swap)
+  full rebuild  the same with ?compact=true, which re-reads every chunk
+                (the new journal's too) into one new segment, as
+                reloading without segments would have to
+
+Reload work runs in a thread, so what it costs chat is GIL contention:
+compare p99 and the event-loop lag between phases.
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.loadtest import DOCUMENT_QUESTIONS, FREE_KEY, LLM_TEXT, lag_monitor, percentiles  # noqa: E402
+from benchmarks.stub_servers import llm_app, serpapi_app, serve  # noqa: E402
+from retrieval.store import ChunkStore  # noqa: E402
+
+ROOT = Path(__file__).resolve().parent.parent
+ADMIN_KEY = "bench-admin"
+JOURNALS = sorted((ROOT / "data").glob("*/*.pdf"))
+
+
+def replicate(source: str, target: str, folder: Path, copies: int) -> int:
+    """Hard-link a bundled PDF ``copies`` times into ``folder`` and store the bundled chunks under each link."""
+    store = ChunkStore(source, read_only=True)
+    try:
+        rows = [(seq, seq + 1, text, tokens) for seq, (text, tokens, _) in enumerate(store.iter_chunks())]
+    finally:
+        store.close()
+    store = ChunkStore(target)
+    try:
+        for copy in range(copies):
+            path = folder / f"copy-{copy}.pdf"
+            os.link(JOURNALS[0], path)
+            stat = os.stat(path)
+            store.replace_file(str(path), f"Document: {path.name}", stat.st_mtime, stat.st_size, str(copy), rows)
+        return store.signature()[0]
+    finally:
+        store.close()
+
+
+async def chat_phase(client, rps: float, duration: float, seed: int):
+    rng = random.Random(seed)
+    latencies = []
+    start = time.perf_counter()
+
+    async def one(offset, question):
+        await asyncio.sleep(max(0.0, start + offset - time.perf_counter()))
+        scheduled = start + offset
+        response = await client.post("/v1/health/chat", headers={"x-api-key": FREE_KEY},
+                                     json={"question": question, "version": "ITHAI-1.0", "useWebSearch": True})
+        if response.status_code == 200:
+            latencies.append((time.perf_counter() - scheduled) * 1000)
+
+    arrivals, now = [], 0.0
+    while True:
+        now += rng.expovariate(rps)
+        if now > duration:
+            break
+        arrivals.append((now, rng.choice(DOCUMENT_QUESTIONS).format(n=len(arrivals))))
+    await asyncio.gather(*(one(offset, question) for offset, question in arrivals))
+    return latencies
+
+
+async def reload_loop(client, folder: Path, compact: bool, stop: asyncio.Event):
+    headers = {"x-admin-key": ADMIN_KEY}
+    durations = []
+    while not stop.is_set():
+        new = folder / f"new-{len(list(folder.glob('new-*')))}.pdf"
+        shutil.copy(JOURNALS[1 + len(durations) % (len(JOURNALS) - 1)], new)
+        before = (await client.get("/v1/admin/index", headers=headers)).json()["reloads"]
+        await client.post("/v1/admin/reload", params={"compact": str(compact).lower()}, headers=headers)
+        while True:
+            status = (await client.get("/v1/admin/index", headers=headers)).json()
+            if status["reloads"] > before:
+                break
+            await asyncio.sleep(0.02)
+        durations.append(status["last"]["seconds"])
+    return durations, status["index"]
+
+
+async def run_phases(app_url, loop, args):
+    async with httpx.AsyncClient(base_url=app_url, timeout=60) as client:
+        while (await client.get("/health/ready")).status_code != 200:
+            await asyncio.sleep(0.05)
+        rows = []
+        for name, compact in [("idle", None), ("incremental", False), ("full rebuild", True)]:
+            lag, stop_lag, stop_reload = [], asyncio.Event(), asyncio.Event()
+            monitor = asyncio.run_coroutine_threadsafe(lag_monitor(lag, stop_lag), loop)
+            reloads = asyncio.ensure_future(reload_loop(client, args.folder, compact, stop_reload)) if compact is not None else None
+            latencies = await chat_phase(client, args.rps, args.duration, args.seed)
+            stop_reload.set()
+            loop.call_soon_threadsafe(stop_lag.set)
+            monitor.result(timeout=5)
+            durations, index = await reloads if reloads is not None else ([], None)
+            chat = percentiles(latencies)
+            reload_s = f"{sum(durations) / len(durations):9.2f}" if durations else f"{'-':>9}"
+            segments = [segment["chunks"] for segment in index["segments"]] if index else ""
+            rows.append(f"{name:<14} {len(latencies):5d} {chat['p50']:8.1f} {chat['p95']:8.1f} {chat['p99']:8.1f} "
+                        f"{percentiles(lag)['p99']:8.1f} {len(durations):8d} {reload_s}  {segments}")
+        return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--copies", type=int, default=400)
+    parser.add_argument("--rps", type=float, default=20.0)
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds of chat traffic per phase")
+    parser.add_argument("--groq-latency-ms", type=float, default=250.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    try:
+        args.folder = Path(tmp) / "documents"
+        args.folder.mkdir()
+        store_path = str(Path(tmp) / "chunks.db")
+        chunks = replicate(str(ROOT / "data" / "index" / "chunks.db"), store_path, args.folder, args.copies)
+        groq = llm_app(latency_ms=args.groq_latency_ms, jitter_ms=args.groq_latency_ms / 5, reply=lambda body: LLM_TEXT)
+        with serve(groq) as groq_url, serve(serpapi_app()) as serpapi_url:
+            os.environ.update(
+                GROQ_BASE_URL=f"{groq_url}/v1", OPENAI_BASE_URL=f"{groq_url}/v1", SERPAPI_BASE_URL=serpapi_url,
+                SERPAPI_KEYS="bench", API_KEY_REQUIRED=FREE_KEY, PREMIUM_API_KEY="bench-premium",
+                ADMIN_API_KEY=ADMIN_KEY, CHUNK_STORE_PATH=store_path, INDEX_WATCH_DIRS=str(args.folder),
+                INDEX_WATCH_INTERVAL="0", ANSWER_CACHE_SIZE="0", SEARCH_CACHE_TTL="0", WEB_INDEX="0",
+                ADMISSION_CONTROL="0",
+            )
+            print(f"{chunks} chunks in {args.copies} files, {args.rps:.0f} chat req/s for {args.duration:.0f} s per phase")
+            # The service logs every request; keep the table readable
+            with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+                import main as app_module
+                with serve(app_module.app, lifespan="on") as app_url:
+                    rows = asyncio.run(run_phases(app_url, app_module.app.state.event_loop, args))
+        print(f"{'phase':<14} {'n':>5} {'p50':>8} {'p95':>8} {'p99':>8} {'lag p99':>8} {'reloads':>8} {'reload s':>9}  segments")
+        print("\n".join(rows))
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Per-query latency of BM25Index as the chunk count grows.
+
+    python benchmarks/bench_retrieval.py --sizes 1000,10000,100000,1000000
+
+Synthetic chunks draw words from a Zipf-distributed vocabulary so that a few
+terms are very common and most are rare, like a real journal corpus. For
+small sizes the legacy set-intersection scan is timed as well.
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from itertools import accumulate
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from retrieval.bm25 import BM25Index  # noqa: E402
+
+
+def make_vocabulary(size: int):
+    words = [f"w{i}" for i in range(size)]
+    cum_weights = list(accumulate(1.0 / (rank + 1) for rank in range(size)))
+    return words, cum_weights
+
+
+def legacy_scan(knowledge, query, max_chunks=2):
+    query_words = set(query.lower().split())
+    scored = []
+    for chunk in knowledge:
+        score = len(query_words.intersection(set(chunk.lower().split())))
+        if score > 0:
+            scored.append((score, chunk))
+    scored.sort(reverse=True)
+    return scored[:max_chunks]
+
+
+def run(size, words, cum_weights, queries, doc_len, legacy_limit):
+    rng = random.Random(size)
+    index = BM25Index()
+    knowledge = [] if size <= legacy_limit else None
+
+    start = time.perf_counter()
+    for _ in range(size):
+        tokens = rng.choices(words, cum_weights=cum_weights, k=doc_len)
+        index.add_tokens(tokens)
+        if knowledge is not None:
+            knowledge.append(" ".join(tokens))
+    index.finalize()
+    build = time.perf_counter() - start
+
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        index.search(query, 2)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+
+    legacy_ms = None
+    if knowledge is not None:
+        start = time.perf_counter()
+        for query in queries[:20]:
+            legacy_scan(knowledge, query)
+        legacy_ms = (time.perf_counter() - start) * 1000 / min(20, len(queries))
+
+    return {
+        "chunks": size,
+        "build_s": build,
+        "p50_ms": statistics.median(latencies),
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1],
+        "legacy_ms": legacy_ms,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000,100000,1000000")
+    parser.add_argument("--vocab", type=int, default=50000)
+    parser.add_argument("--doc-len", type=int, default=60)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--legacy-limit", type=int, default=10000)
+    args = parser.parse_args()
+
+    words, cum_weights = make_vocabulary(args.vocab)
+    rng = random.Random(0)
+    queries = [" ".join(rng.choices(words, cum_weights=cum_weights, k=5)) for _ in range(args.queries)]
+
+    print(f"{'chunks':>9} {'build s':>9} {'p50 ms':>8} {'p99 ms':>8} {'legacy ms':>10}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        row = run(size, words, cum_weights, queries, args.doc_len, args.legacy_limit)
+        legacy = f"{row['legacy_ms']:10.2f}" if row["legacy_ms"] is not None else f"{'-':>10}"
+        print(f"{row['chunks']:>9} {row['build_s']:9.2f} {row['p50_ms']:8.3f} {row['p99_ms']:8.3f} {legacy}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""LLMRouter hedging and circuit breaking against stub providers.
+
+    python benchmarks/bench_router.py [--requests 300]
+
+Phase 1: the primary has a heavy tail (``--slow-rate`` of requests take an
+extra ``--slow-ms``); compares a direct client with the hedging router.
+Phase 2: the primary fails every request; shows the breaker opening so the
+primary stops receiving traffic while the secondary serves it.
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.stub_servers import llm_app, serve  # noqa: E402
+from llm_clients import BaseLLMClient, GroqClient  # noqa: E402
+from llm_router import LLMRouter, ProviderState  # noqa: E402
+
+
+async def measure(client, total, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, failures = [], 0
+
+    async def one():
+        nonlocal failures
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await client.get_response("halo", "")
+            except Exception:
+                failures += 1
+                return
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    await asyncio.gather(*(one() for _ in range(total)))
+    latencies.sort()
+    pick = lambda q: latencies[min(len(latencies) - 1, int(len(latencies) * q))] if latencies else float("nan")  # noqa: E731
+    return pick(0.5), pick(0.95), pick(0.99), failures
+
+
+async def run(args, primary_url, secondary_url, primary_stub):
+    await BaseLLMClient.open_http_client()
+    primary = GroqClient(base_url=f"{primary_url}/v1")
+    secondary = GroqClient(base_url=f"{secondary_url}/v1")
+    router = LLMRouter([ProviderState("primary", primary, initial_latency=0.1),
+                        ProviderState("secondary", secondary, initial_latency=0.1)],
+                       min_hedge_delay=0.05)
+
+    print(f"{'mode':<22} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'failed':>7}")
+    for name, client in (("direct primary", primary), ("hedged router", router)):
+        p50, p95, p99, failed = await measure(client, args.requests, args.concurrency)
+        print(f"{name:<22} {p50:8.1f} {p95:8.1f} {p99:8.1f} {failed:7d}")
+    print(f"hedges={router.hedges} hedge_wins={router.hedge_wins}")
+
+    primary_stub.state.config.update(error_rate=1.0, slow_rate=0.0)
+    before = primary_stub.state.requests
+    p50, p95, p99, failed = await measure(router, args.requests, args.concurrency)
+    print(f"{'primary failing':<22} {p50:8.1f} {p95:8.1f} {p99:8.1f} {failed:7d}")
+    print(f"primary received {primary_stub.state.requests - before} of {args.requests} requests; "
+          f"breaker {router.providers[0].state}, fallbacks={router.fallbacks}")
+    await BaseLLMClient.close_http_client()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--slow-rate", type=float, default=0.08)
+    parser.add_argument("--slow-ms", type=float, default=1500.0)
+    args = parser.parse_args()
+
+    primary_stub = llm_app(latency_ms=80, jitter_ms=15, slow_rate=args.slow_rate, slow_ms=args.slow_ms, seed=1)
+    secondary_stub = llm_app(latency_ms=100, jitter_ms=15, seed=2)
+    with serve(primary_stub) as primary_url, serve(secondary_stub) as secondary_url:
+        asyncio.run(run(args, primary_url, secondary_url, primary_stub))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Local rule-engine throughput and how many diagnoses it settles without an LLM.
+
+    python benchmarks/bench_rules.py [--diagnoses 50000]
+
+Check-ins are generated from the rules file itself: one to three symptom
+phrases (some negated) wrapped in filler text, plus answers to the standard
+questions. Timing covers the whole local path, free text in, scored
+assessment out, on one core.
+"""
+import argparse
+import random
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from expert_system.knowledge_base import KnowledgeBase  # noqa: E402
+from expert_system.rule_engine import RuleEngine  # noqa: E402
+
+FILLERS = ["Dok, saya sedang hamil 20 minggu.", "Sejak kemarin", "Bun, mohon bantuannya,",
+           "sudah beberapa hari ini", "rasanya", "kadang-kadang"]
+UNMATCHED = ["merasa tidak enak badan", "khawatir dengan kehamilan saya", "susah tidur dan banyak pikiran"]
+
+
+def make_checkins(kb: KnowledgeBase, count: int, seed: int = 0):
+    rng = random.Random(seed)
+    phrases = [phrase for symptom in kb.symptoms.values() for phrase in symptom["keywords"].get("id", [])]
+    checkins = []
+    for _ in range(count):
+        if rng.random() < 0.1:
+            complaint = rng.choice(UNMATCHED)
+        else:
+            parts = [rng.choice(FILLERS)]
+            for phrase in rng.sample(phrases, rng.randint(1, 3)):
+                parts.append(("tidak ada " if rng.random() < 0.1 else "") + phrase)
+            complaint = " ".join(parts)
+        answers = {
+            "Sudah berapa lama Anda mengalami keluhan ini?": f"{rng.randint(1, 30)} hari",
+            "Apakah keluhan ini mengganggu aktivitas sehari-hari?": rng.choice(["ya", "tidak", "sedikit"]),
+            "Apakah ada riwayat kondisi medis sebelumnya?": rng.choice(["tidak ada", "ya, asma"]),
+        }
+        checkins.append((complaint, answers))
+    return checkins
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--diagnoses", type=int, default=50000)
+    args = parser.parse_args()
+
+    kb = KnowledgeBase(lang="id")
+    kb.load_rules()
+    start = time.perf_counter()
+    engine = RuleEngine.from_knowledge_base(kb)
+    compile_ms = (time.perf_counter() - start) * 1000
+    checkins = make_checkins(kb, args.diagnoses)
+
+    paths = Counter()
+    start = time.perf_counter()
+    for complaint, answers in checkins:
+        assessment = engine.assess(complaint, answers)
+        paths["llm" if not assessment.conditions else "local" if assessment.low_risk else "narrative"] += 1
+    elapsed = time.perf_counter() - start
+
+    print(f"{len(kb.symptoms)} symptoms, {len(kb.conditions)} conditions, {len(kb.rules)} rules "
+          f"(compiled in {compile_ms:.1f} ms)")
+    print(f"{args.diagnoses} diagnoses in {elapsed:.2f} s: {args.diagnoses / elapsed:,.0f}/s, "
+          f"{elapsed * 1e6 / args.diagnoses:.1f} us each")
+    for path, label in (("local", "rules only, no LLM call"), ("narrative", "rules + LLM narrative"),
+                        ("llm", "no rule matched, full LLM")):
+        print(f"  {label:<28} {paths[path] / args.diagnoses:6.1%}")
+
+
+if __name__ == "__main__":
+    main()
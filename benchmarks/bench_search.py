@@ -0,0 +1,67 @@
+"""SearchService against a local fake SerpAPI: caching, single-flight and key rotation.
+
+    python benchmarks/bench_search.py [--requests 400] [--distinct 40]
+
+Fires bursts of concurrent queries drawn from a small pool (duplicates are
+common, as in production) and reports how many upstream calls were made,
+latency, and how calls were spread over the API keys (one key is rejected
+to exercise rotation).
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.stub_servers import serpapi_app, serve  # noqa: E402
+from search_service import SearchService  # noqa: E402
+
+
+async def run(args, base_url, stub):
+    service = SearchService(["key-a", "key-b", "key-c", "key-revoked"], base_url=base_url, max_concurrency=args.concurrency)
+    rng = random.Random(0)
+    pool = [f"pertanyaan {i} kesehatan ibu hamil indonesia" for i in range(args.distinct)]
+    latencies = []
+
+    async def one(query):
+        start = time.perf_counter()
+        await service.organic_results(query, 5, gl="id", hl="id")
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    for _ in range(args.requests // args.burst):
+        await asyncio.gather(*(one(rng.choice(pool)) for _ in range(args.burst)))
+    elapsed = time.perf_counter() - start
+    await service.close()
+
+    latencies.sort()
+    total = len(latencies)
+    print(f"requests            {total}")
+    print(f"upstream calls      {stub.state.requests} ({stub.state.requests / total:.2%} of requests)")
+    print(f"served from cache   {service.cache_hits}")
+    print(f"coalesced in flight {service.coalesced}")
+    print(f"latency p50/p99     {statistics.median(latencies):.1f} / {latencies[int(total * 0.99) - 1]:.1f} ms")
+    print(f"wall time           {elapsed:.2f}s")
+    print(f"calls per key       {dict(sorted(stub.state.keys.items()))}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--burst", type=int, default=20)
+    parser.add_argument("--distinct", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    args = parser.parse_args()
+
+    stub = serpapi_app(latency_ms=args.latency_ms, rejected_keys={"key-revoked"})
+    with serve(stub) as base_url:
+        asyncio.run(run(args, base_url, stub))
+
+
+if __name__ == "__main__":
+    main()
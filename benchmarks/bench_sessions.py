@@ -0,0 +1,152 @@
+"""Questions, round trips and LLM tokens per completed diagnosis: sessions vs one-shot.
+
+    python benchmarks/bench_sessions.py [--patients 2000]
+
+Each simulated patient has a hidden set of symptoms taken from one rule in
+the rules file (its premises plus, sometimes, an unrelated symptom) and
+mentions only one of them in the complaint. The one-shot flow fetches the
+five standard questions and posts all answers at once; the session flow
+answers one adaptive question per round trip, "ya" exactly when the asked
+symptom is hidden. Recall is the share of conditions the rules derive from
+the full hidden set that the finished diagnosis reports. The LLM is an
+in-process stub that counts calls and prompt tokens (~4 characters each).
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from cache import TTLCache  # noqa: E402
+from expert_system.inference_engine import InferenceEngine  # noqa: E402
+from expert_system.knowledge_base import KnowledgeBase  # noqa: E402
+from expert_system.sessions import SessionStore  # noqa: E402
+
+ANALYSIS = {
+    "health_score": 70,
+    "severity_level": "Sedang",
+    "urgency_level": "Sedang",
+    "possible_conditions": ["Keluhan umum kehamilan"],
+    "recommendations": ["Istirahat cukup", "Periksa ke bidan bila berlanjut"],
+}
+
+
+class CountingLLM:
+    def __init__(self):
+        self.calls = 0
+        self.tokens = 0
+
+    async def get_response(self, query: str, context: str, json_mode: bool = False) -> str:
+        self.calls += 1
+        self.tokens += (len(query) + len(context)) // 4
+        if '"recommendations": ["rekomendasi 1"' in query and "health_score" not in query:
+            return json.dumps({"recommendations": ANALYSIS["recommendations"]})
+        return json.dumps(ANALYSIS)
+
+
+def make_patients(kb: KnowledgeBase, count: int, seed: int = 0):
+    rng = random.Random(seed)
+    symptoms = [name for name, data in kb.symptoms.items() if data["keywords"].get("id")]
+    rules = [rule for rule in kb.rules if all(fact in kb.symptoms for fact in rule.get("all", []) + rule.get("any", []))]
+    patients = []
+    for _ in range(count):
+        rule = rng.choice(rules)
+        hidden = set(rule.get("all", []))
+        if rule.get("any"):
+            hidden.add(rng.choice(rule["any"]))
+        if rng.random() < 0.3:
+            hidden.add(rng.choice(symptoms))
+        mentioned = rng.choice(sorted(name for name in hidden if name in symptoms))
+        complaint = f"Dok, saya sedang hamil dan {rng.choice(kb.symptoms[mentioned]['keywords']['id'])}"
+        patients.append((complaint, hidden))
+    return patients
+
+
+def standard_answers(engine: InferenceEngine, hidden):
+    answer_facts = engine.kb.answer_facts
+    answers = {}
+    for question in engine.standard_questions:
+        fact = answer_facts.get(question)
+        if fact:
+            answers[question] = "ya" if fact in hidden else "tidak"
+        else:
+            answers[question] = "3 hari" if "persistent" not in hidden else "3 minggu"
+    return answers
+
+
+def recall(engine: InferenceEngine, diagnosis, hidden):
+    truth = {engine.rule_engine.name(name) for name, _ in engine.rule_engine.evaluate(hidden).conditions}
+    return len(truth & set(diagnosis.possible_conditions)) / len(truth) if truth else 1.0
+
+
+async def one_shot(engine: InferenceEngine, patients):
+    totals = dict(questions=0, round_trips=0, bytes=0, recall=0.0)
+    for complaint, hidden in patients:
+        body = {"complaint": complaint}
+        await engine.diagnose(complaint)
+        totals["bytes"] += len(json.dumps(body))
+        body["answers"] = standard_answers(engine, hidden)
+        diagnosis = await engine.diagnose(complaint, body["answers"])
+        totals["bytes"] += len(json.dumps(body))
+        totals["questions"] += len(body["answers"])
+        totals["round_trips"] += 2
+        totals["recall"] += recall(engine, diagnosis, hidden)
+    return totals
+
+
+async def sessions(engine: InferenceEngine, patients):
+    totals = dict(questions=0, round_trips=0, bytes=0, recall=0.0)
+    answer_facts = engine.kb.answer_facts
+    for complaint, hidden in patients:
+        diagnosis = await engine.start_session(complaint)
+        totals["bytes"] += len(json.dumps({"complaint": complaint}))
+        totals["round_trips"] += 1
+        while not diagnosis.completed:
+            key = diagnosis.pending_key
+            if key.startswith("symptom:"):
+                answer = "ya" if key[len("symptom:"):] in hidden else "tidak"
+            else:
+                fact = answer_facts.get(diagnosis.pending_question)
+                answer = "ya" if fact in hidden else "tidak" if fact else "3 hari"
+            diagnosis = await engine.answer_session(diagnosis.session_id, answer)
+            totals["bytes"] += len(json.dumps({"answer": answer}))
+            totals["round_trips"] += 1
+            totals["questions"] += 1
+        totals["recall"] += recall(engine, diagnosis, hidden)
+    return totals
+
+
+async def run(args):
+    kb = KnowledgeBase(lang="id")
+    kb.load_rules()
+    patients = make_patients(kb, args.patients)
+    print(f"{args.patients} simulated patients, at most {args.max_questions} session questions each\n")
+    print(f"{'flow':<10} {'questions':>9} {'round trips':>11} {'bytes up':>8} {'LLM calls':>9} "
+          f"{'prompt tokens':>13} {'recall':>7} {'ms':>6}")
+    for name, flow in (("one-shot", one_shot), ("session", sessions)):
+        llm = CountingLLM()
+        engine = InferenceEngine(kb, llm, sessions=SessionStore(TTLCache(args.patients, 600)),
+                                 max_questions=args.max_questions)
+        start = time.perf_counter()
+        totals = await flow(engine, patients)
+        elapsed = time.perf_counter() - start
+        n = args.patients
+        print(f"{name:<10} {totals['questions'] / n:9.2f} {totals['round_trips'] / n:11.2f} "
+              f"{totals['bytes'] / n:8.0f} {llm.calls / n:9.2f} {llm.tokens / n:13.0f} "
+              f"{totals['recall'] / n:7.1%} {elapsed * 1000 / n:6.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--patients", type=int, default=2000)
+    parser.add_argument("--max-questions", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
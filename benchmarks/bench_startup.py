@@ -0,0 +1,144 @@
+"""Time to first request, time to ready and per-worker memory of `uvicorn main:app --workers N`.
+
+    python benchmarks/bench_startup.py [--copies 200] [--workers 2]
+
+The bundled chunk store is replicated ``--copies`` times into a throw-away
+store to stand in for a full journal library. Each mode boots the service
+in a fresh process tree and polls it:
+
+  blocking, no snapshot   the old behaviour: every worker builds its BM25
+                          index before it accepts a connection
+  background, no snapshot liveness and small talk right away; each worker
+                          still builds a private index
+  background + mmap       workers map the shared BM25 snapshot
+
+"first response" is /health/live answering, "ready" is /health/ready
+returning 200. RSS counts shared pages in every worker; PSS splits them
+between the processes sharing them, so its sum is the real footprint.
+"""
+import argparse
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from retrieval.bm25 import snapshot_path  # noqa: E402
+from retrieval.ingest import DEFAULT_STORE_PATH, build_bm25_snapshot  # noqa: E402
+from retrieval.store import ChunkStore  # noqa: E402
+
+ROOT = Path(__file__).resolve().parent.parent
+MODES = [
+    ("blocking, no snapshot", {"STARTUP_WARMUP": "blocking", "BM25_SNAPSHOT": "0"}),
+    ("background, no snapshot", {"BM25_SNAPSHOT": "0"}),
+    ("background + mmap", {}),
+]
+
+
+def replicate(source: str, target: str, copies: int):
+    rows = []
+    store = ChunkStore(source, read_only=True)
+    try:
+        for seq, (text, tokens, _) in enumerate(store.iter_chunks()):
+            rows.append((seq * 1000, seq * 1000 + len(text), text, tokens))
+    finally:
+        store.close()
+    store = ChunkStore(target)
+    try:
+        for copy in range(copies):
+            store.replace_file(f"copy-{copy}.pdf", f"Document: copy-{copy}.pdf", 0.0, 0, str(copy), rows)
+        build_bm25_snapshot(store, snapshot_path(target))
+        return store.signature()[0]
+    finally:
+        store.close()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def memory_kb(pid: int):
+    values = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as file:
+            for line in file:
+                key, _, rest = line.partition(":")
+                if key in ("Rss", "Pss"):
+                    values[key] = int(rest.split()[0])
+    except OSError:
+        pass
+    return values
+
+
+def children(pid: int):
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as file:
+            return [int(child) for child in file.read().split()]
+    except OSError:
+        return []
+
+
+def boot(env, workers: int, timeout: float):
+    port = free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--workers", str(workers),
+         "--log-level", "warning"],
+        cwd=ROOT, env={**os.environ, **env}, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    first = ready = None
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=1.0) as client:
+            while time.perf_counter() - started < timeout and ready is None:
+                try:
+                    if first is None and client.get("/health/live").status_code == 200:
+                        first = time.perf_counter() - started
+                    if first is not None and client.get("/health/ready").status_code == 200:
+                        ready = time.perf_counter() - started
+                except httpx.HTTPError:
+                    pass
+                time.sleep(0.01)
+        # Let every worker finish warming before measuring memory
+        time.sleep(1.0)
+        pids = children(process.pid) or [process.pid]
+        usage = [memory_kb(pid) for pid in pids]
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+    return first, ready, usage
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--copies", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    try:
+        store_path = str(Path(tmp) / "chunks.db")
+        chunks = replicate(DEFAULT_STORE_PATH, store_path, args.copies)
+        print(f"{chunks} chunks, {args.workers} workers")
+        print(f"{'mode':<26} {'first response':>14} {'ready':>8} {'RSS/worker':>11} {'PSS total':>10}")
+        for name, env in MODES:
+            first, ready, usage = boot({"CHUNK_STORE_PATH": store_path, **env}, args.workers, args.timeout)
+            rss = [item.get("Rss", 0) for item in usage]
+            pss = sum(item.get("Pss", 0) for item in usage)
+            print(f"{name:<26} {first or float('nan'):13.2f}s {ready or float('nan'):7.2f}s "
+                  f"{sum(rss) / max(len(rss), 1) / 1024:9.1f}MB {pss / 1024:8.1f}MB")
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Time-to-first-token of /v1/health/chat/stream vs the blocking /v1/health/chat.
+
+    python benchmarks/bench_streaming.py [--requests 20]
+
+Runs the real app against a stub LLM that takes --latency-ms to the first
+token and --token-delay-ms per following word. Every request asks a new
+question and the answer cache is off, so each one reaches the LLM.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.stub_servers import llm_app, serve  # noqa: E402
+
+API_KEY = "bench-key"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument("--token-delay-ms", type=float, default=20.0)
+    parser.add_argument("--words", type=int, default=80)
+    args = parser.parse_args()
+
+    reply = " ".join(f"kata{i}" for i in range(args.words))
+    stub = llm_app(latency_ms=args.latency_ms, jitter_ms=0, reply=reply, token_delay_ms=args.token_delay_ms)
+    with serve(stub) as llm_url:
+        os.environ.update(GROQ_BASE_URL=f"{llm_url}/v1", API_KEY_REQUIRED=API_KEY, ANSWER_CACHE_SIZE="0",
+                          PRECOMPUTED_ANSWERS="0", RATE_LIMIT_FREE_RPS="0", INDEX_WATCH_INTERVAL="0")
+        os.environ.pop("ANSWER_CACHE_DB", None)
+        import main as service
+
+        with serve(service.app) as app_url, httpx.Client(base_url=app_url, timeout=60) as http:
+            headers = {"x-api-key": API_KEY}
+
+            def body(n: int):
+                return {"question": f"Apa saja fitur PregnaAI nomor {n}?", "version": "ITHAI-1.0", "useWebSearch": False}
+
+            blocking = []
+            for n in range(args.requests):
+                start = time.perf_counter()
+                http.post("/v1/health/chat", json=body(n), headers=headers).raise_for_status()
+                blocking.append((time.perf_counter() - start) * 1000)
+
+            first_token = []
+            for n in range(args.requests, 2 * args.requests):
+                start = time.perf_counter()
+                with http.stream("POST", "/v1/health/chat/stream", json=body(n), headers=headers) as response:
+                    for line in response.iter_lines():
+                        if line == "event: delta":
+                            first_token.append((time.perf_counter() - start) * 1000)
+                            break
+
+    print(f"blocking /chat     first byte of answer p50 {statistics.median(blocking):8.1f} ms")
+    print(f"streaming /stream  first token          p50 {statistics.median(first_token):8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Request overhead of tracing and metrics (TELEMETRY_ENABLED on vs off).
+
+    python benchmarks/bench_telemetry.py [--requests 2000]
+
+Drives the app in-process through httpx's ASGI transport against an instant
+stub LLM, so the difference between the two runs is the telemetry itself
+rather than network noise. Every question is unique to bypass the answer
+cache; the runs alternate in rounds to cancel out warm-up and drift.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.stub_servers import llm_app, serve  # noqa: E402
+
+API_KEY = "bench-key"
+
+
+async def run(service, requests: int, rounds: int):
+    import telemetry
+
+    transport = httpx.ASGITransport(app=service.app)
+    headers = {"x-api-key": API_KEY}
+    timings = {True: [], False: []}
+    seq = 0
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as http:
+        for _ in range(rounds):
+            for enabled in (False, True):
+                telemetry.ENABLED = enabled
+                start = time.perf_counter()
+                for _ in range(requests // rounds):
+                    seq += 1
+                    body = {"question": f"Apa fitur PregnaAI nomor {seq}?", "version": "ITHAI-1.0",
+                            "useWebSearch": False}
+                    response = await http.post("/v1/health/chat", json=body, headers=headers)
+                    response.raise_for_status()
+                timings[enabled].append((time.perf_counter() - start) * 1000 / (requests // rounds))
+        metrics = await http.get("/metrics")
+    return timings, metrics.text
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=10)
+    args = parser.parse_args()
+
+    with serve(llm_app(latency_ms=0, jitter_ms=0)) as llm_url:
+        os.environ.update(GROQ_BASE_URL=f"{llm_url}/v1", API_KEY_REQUIRED=API_KEY)
+        import main as service
+
+        async def session():
+            async with service.lifespan(service.app):
+                return await run(service, args.requests, args.rounds)
+
+        timings, metrics = asyncio.run(session())
+
+    off = statistics.median(timings[False])
+    on = statistics.median(timings[True])
+    print(f"telemetry off  {off:7.3f} ms/request")
+    print(f"telemetry on   {on:7.3f} ms/request  ({(on - off) / off * 100:+.2f}%)")
+    series = sum(1 for line in metrics.splitlines() if line and not line.startswith("#"))
+    print(f"/metrics exposes {series} series")
+
+
+if __name__ == "__main__":
+    main()
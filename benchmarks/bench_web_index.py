@@ -0,0 +1,94 @@
+"""SerpAPI calls per 1k web-search questions, with and without the web-snippet index.
+
+    python benchmarks/bench_web_index.py [--queries 1000] [--topics 30]
+
+Questions are drawn from ``--topics`` topics with Zipf popularity, each
+asked in several phrasings and with varying week/trimester numbers, and
+resolved through ``HealthKnowledgeBase._resolve_context`` (no documents
+loaded, so every question takes the web path) against a stub SerpAPI.
+"search cache" is the existing exact-query cache alone; "web index" adds
+the snippet index. A hit is "wrong" when any snippet it returned was
+fetched for a different topic. The stub's snippets repeat the search
+query, so real snippets will cover fewer questions than this.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.stub_servers import serpapi_app, serve  # noqa: E402
+
+TOPICS = [
+    "minum kopi", "minum teh", "makan nanas", "makan durian", "minum jamu", "naik pesawat", "pijat perut",
+    "berenang", "makan sushi", "minum soda", "mewarnai rambut", "vaksin influenza", "vaksin covid",
+    "minum parasetamol", "tidur telentang", "berhubungan intim", "makan pedas", "minum air kelapa",
+    "makan daging kambing", "makan telur setengah matang", "yoga", "naik motor", "memakai sepatu hak tinggi",
+    "sauna", "makan mie instan", "minum susu kedelai", "makan keju", "makan ikan tuna",
+    "memakai skincare retinol", "puasa ramadhan",
+]
+TEMPLATES = [
+    "apakah boleh {topic} saat hamil", "bolehkah ibu hamil {topic}?",
+    "amankah {topic} untuk ibu hamil trimester {trimester}", "{topic} saat hamil {week} minggu",
+]
+
+
+def questions(count: int, topics: int, seed: int = 0):
+    rng = random.Random(seed)
+    chosen = TOPICS[:topics]
+    weights = [1 / rank for rank in range(1, len(chosen) + 1)]
+    for _ in range(count):
+        topic = rng.choices(chosen, weights)[0]
+        template = rng.choice(TEMPLATES)
+        yield topic, template.format(topic=topic, trimester=rng.randint(1, 3), week=rng.randint(4, 40))
+
+
+async def run(kb, stub, asked):
+    from models import ModelVersion
+
+    before = stub.state.requests
+    link_topics, hits, wrong = {}, 0, 0
+    for topic, question in asked:
+        index_hits = kb.web_index.hits if kb.web_index is not None else 0
+        _, _, sources, _ = await kb._resolve_context(question, ModelVersion.ITHAI_1)
+        if kb.web_index is not None and kb.web_index.hits > index_hits:
+            hits += 1
+            wrong += any(link_topics.get(source) != topic for source in sources)
+        else:
+            for source in sources:
+                link_topics[source] = topic
+    return stub.state.requests - before, hits, wrong
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--topics", type=int, default=len(TOPICS))
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    asked = list(questions(args.queries, args.topics, args.seed))
+    stub = serpapi_app(latency_ms=0.0, jitter_ms=0.0)
+    with serve(stub) as url:
+        os.environ.update(SERPAPI_BASE_URL=url, SERPAPI_KEYS="bench")
+        from main import kb
+        from retrieval.web_index import WebSnippetIndex
+
+        async def compare():
+            print(f"{len(asked)} questions over {args.topics} topics")
+            print(f"{'mode':<26} {'SerpAPI calls':>13} {'per 1k':>7} {'index hits':>10} {'wrong':>6}")
+            for name, web_index in [("search cache", None), ("search cache + web index", WebSnippetIndex())]:
+                kb.search_engine.search_service.cache.clear()
+                kb.web_index = web_index
+                calls, hits, wrong = await run(kb, stub, asked)
+                print(f"{name:<26} {calls:13d} {calls * 1000 / len(asked):7.0f} {hits:10d} {wrong:6d}")
+            await kb.search_engine.search_service.close()
+
+        asyncio.run(compare())
+
+
+if __name__ == "__main__":
+    main()
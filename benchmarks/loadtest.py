@@ -0,0 +1,357 @@
+"""Replay chat and diagnose traffic against the service at a target rate.
+
+    python benchmarks/loadtest.py [--rps 20] [--duration 30] [--traffic FILE]
+                                  [--output results.json] [--compare baseline.json]
+
+The app (main.py) boots in-process on uvicorn, in its own thread and event
+loop, with stub Groq, OpenAI and SerpAPI servers whose latency is a gaussian
+plus a slow tail. Requests are sent open-loop: each one starts at its
+scheduled arrival time whether or not earlier ones have finished, and its
+latency is measured from that time, so a server that falls behind shows
+its queueing instead of slowing the load down. A monitor on the app's loop
+measures how late a 10 ms timer fires (event-loop lag): anything blocking
+the loop, in main.py or a client, shows up there.
+
+Traffic is JSONL, one request per line:
+
+    {"method": "POST", "path": "/v1/health/chat", "key": "free", "at": 0.25,
+     "body": {"question": "...", "version": "ITHAI-1.0", "useWebSearch": true}}
+
+``key`` is "free" or "premium"; ``at`` (seconds from start) is optional and
+only used with --recorded-timing. Without --traffic a synthetic mix is
+generated (see MIX); --write-traffic saves it for replay.
+
+Results are written as sorted, indented JSON keyed by "METHOD path
+[version]", so two runs diff cleanly; --compare prints the change against
+a previous result and exits non-zero when p95 latency or the error rate of
+any endpoint regressed by more than --tolerance.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from contextlib import redirect_stdout
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.stub_servers import llm_app, serpapi_app, serve  # noqa: E402
+
+FREE_KEY = "loadtest-free"
+PREMIUM_KEY = "loadtest-premium"
+SCHEMA_VERSION = 1
+
+SMALL_TALK = ["halo", "selamat pagi", "terima kasih banyak", "apa kabar?", "sampai jumpa"]
+PLATFORM_QUESTIONS = [
+    "fitur apa saja yang ada di aplikasi ini?", "bagaimana cara konsultasi dengan doctor?",
+    "bisa ingatkan jadwal checkup lewat whatsapp?", "apa itu AI diagnosis?",
+    "bagaimana mencatat nutrition harian?", "exercise apa yang aman?",
+]
+DOCUMENT_QUESTIONS = [
+    "berapa kebutuhan kalori ibu hamil trimester {n}", "asam folat untuk ibu hamil minggu ke-{n}",
+    "makanan yang mengandung zat besi untuk mencegah anemia ({n})", "kebutuhan protein kehamilan bulan ke-{n}",
+    "status gizi ibu hamil diukur dengan LILA {n} cm", "konsumsi tablet fe {n} kali seminggu",
+]
+WEB_QUESTIONS = [
+    "apakah boleh minum kopi saat hamil {n} minggu", "vaksin apa yang aman untuk ibu hamil ({n})",
+    "bolehkah naik pesawat di usia kehamilan {n} minggu",
+]
+COMPLAINTS = [
+    "sakit kepala hebat dan pandangan kabur", "mual dan muntah setiap pagi", "keluar flek darah sedikit",
+    "kaki bengkak dan pusing", "merasa tidak enak badan sejak kemarin", "nyeri punggung bawah",
+]
+ANSWERS = {
+    "Sudah berapa lama Anda mengalami keluhan ini?": "3 hari",
+    "Apakah keluhan ini mengganggu aktivitas sehari-hari?": "sedikit",
+    "Apakah ada riwayat kondisi medis sebelumnya?": "tidak ada",
+}
+
+# (weight, builder(rng, n) -> request), built to exercise every path of main.py
+MIX = [
+    (0.15, lambda rng, n: _chat(rng.choice(SMALL_TALK), "ITHAI-1.0", False)),
+    (0.15, lambda rng, n: _chat(rng.choice(PLATFORM_QUESTIONS), "ITHAI-1.0", False)),
+    (0.20, lambda rng, n: _chat(rng.choice(DOCUMENT_QUESTIONS).format(n=n), "ITHAI-1.0", True)),
+    (0.10, lambda rng, n: _chat(rng.choice(WEB_QUESTIONS).format(n=n), "ITHAI-1.0", True)),
+    (0.10, lambda rng, n: _chat(rng.choice(DOCUMENT_QUESTIONS).format(n=n), "ITHAI-2.0", True)),
+    (0.10, lambda rng, n: _chat(rng.choice(DOCUMENT_QUESTIONS).format(n=n), "ITHAI-1.0", True, stream=True)),
+    (0.15, lambda rng, n: {"method": "POST", "path": "/v1/health/diagnose", "key": "premium",
+                           "body": {"complaint": f"{rng.choice(COMPLAINTS)} ({n})", "answers": ANSWERS}}),
+    (0.05, lambda rng, n: {"method": "POST", "path": "/v1/health/diagnose/session", "key": "premium",
+                           "body": {"complaint": rng.choice(COMPLAINTS)}}),
+]
+
+LLM_TEXT = ("Ibu hamil dianjurkan makan gizi seimbang, cukup minum air putih, istirahat cukup, "
+            "dan rutin memeriksakan kehamilan ke bidan atau dokter. Jika keluhan berlanjut, segera konsultasi.")
+LLM_JSON = json.dumps({
+    "health_score": 72, "severity_level": "Sedang", "urgency_level": "Sedang",
+    "possible_conditions": ["Kelelahan"], "recommendations": ["Istirahat cukup", "Minum air putih"],
+})
+
+
+def _chat(question, version, web, stream=False):
+    path = "/v1/health/chat/stream" if stream else "/v1/health/chat"
+    return {"method": "POST", "path": path, "key": "premium" if version == "ITHAI-2.0" else "free",
+            "body": {"question": question, "version": version, "useWebSearch": web}}
+
+
+def synthetic_traffic(count: int, seed: int = 0):
+    rng = random.Random(seed)
+    weights = [weight for weight, _ in MIX]
+    return [rng.choices(MIX, weights)[0][1](rng, rng.randint(1, 40)) for _ in range(count)]
+
+
+def load_traffic(path: str):
+    with open(path, encoding="utf-8") as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def label(request) -> str:
+    body = request.get("body") or {}
+    version = body.get("version", "ITHAI-1.0") if "question" in body else "-"
+    return f"{request['method']} {request['path']} [{version}]"
+
+
+def schedule(requests, rps, recorded, duration, seed):
+    """Arrival offsets: recorded ``at`` values, or a Poisson process at ``rps``."""
+    if recorded:
+        return [(float(request.get("at", 0.0)), request) for request in requests if request.get("at", 0.0) <= duration]
+    rng = random.Random(seed)
+    arrivals, now, i = [], 0.0, 0
+    while requests:
+        now += rng.expovariate(rps)
+        if now > duration:
+            break
+        arrivals.append((now, requests[i % len(requests)]))
+        i += 1
+    return arrivals
+
+
+def percentiles(values):
+    if not values:
+        return {}
+    values = sorted(values)
+    pick = lambda q: values[min(len(values) - 1, int(len(values) * q))]  # noqa: E731
+    return {"p50": round(pick(0.50), 2), "p95": round(pick(0.95), 2), "p99": round(pick(0.99), 2),
+            "max": round(values[-1], 2), "mean": round(sum(values) / len(values), 2)}
+
+
+async def lag_monitor(samples, stop: asyncio.Event, interval: float = 0.01):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, loop.time() - expected) * 1000)
+
+
+async def replay(base_url, arrivals, timeout):
+    keys = {"free": FREE_KEY, "premium": PREMIUM_KEY}
+    results = []
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=200)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=timeout) as client:
+        start = time.perf_counter()
+
+        async def one(offset, request):
+            delay = start + offset - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            scheduled = start + offset
+            first_byte = None
+            try:
+                async with client.stream(request["method"], request["path"], json=request.get("body"),
+                                         headers={"x-api-key": keys.get(request.get("key"), FREE_KEY)}) as response:
+                    async for _ in response.aiter_raw():
+                        if first_byte is None:
+                            first_byte = time.perf_counter()
+                    status = response.status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            done = time.perf_counter()
+            results.append({
+                "label": label(request), "status": status, "latency_ms": (done - scheduled) * 1000,
+                "ttfb_ms": ((first_byte or done) - scheduled) * 1000, "done": done - start,
+            })
+
+        await asyncio.gather(*(one(offset, request) for offset, request in arrivals))
+        elapsed = time.perf_counter() - start
+    return results, elapsed
+
+
+def summarize(results, elapsed):
+    endpoints = {}
+    for name in sorted({result["label"] for result in results}):
+        rows = [result for result in results if result["label"] == name]
+        ok = [row for row in rows if row["status"] == 200]
+        status = {}
+        for row in rows:
+            status[str(row["status"])] = status.get(str(row["status"]), 0) + 1
+        endpoints[name] = {
+            "requests": len(rows),
+            "errors": len(rows) - len(ok),
+            "error_rate": round((len(rows) - len(ok)) / len(rows), 4),
+            "status": status,
+            "throughput_rps": round(len(ok) / elapsed, 2),
+            "latency_ms": percentiles([row["latency_ms"] for row in ok]),
+            "ttfb_ms": percentiles([row["ttfb_ms"] for row in ok]),
+        }
+    ok = sum(endpoint["requests"] - endpoint["errors"] for endpoint in endpoints.values())
+    return endpoints, {
+        "requests": len(results),
+        "errors": len(results) - ok,
+        "elapsed_s": round(elapsed, 2),
+        "throughput_rps": round(ok / elapsed, 2),
+        "latency_ms": percentiles([result["latency_ms"] for result in results if result["status"] == 200]),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=Path(__file__).resolve().parent).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def print_report(report):
+    total = report["total"]
+    print(f"{total['requests']} requests in {total['elapsed_s']} s, {total['throughput_rps']} ok/s, "
+          f"{total['errors']} errors; event-loop lag p99 {report['event_loop_lag_ms'].get('p99')} ms, "
+          f"max {report['event_loop_lag_ms'].get('max')} ms")
+    print(f"\n{'endpoint':<52} {'n':>5} {'err':>4} {'rps':>6} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for name, endpoint in report["endpoints"].items():
+        latency = endpoint["latency_ms"]
+        print(f"{name:<52} {endpoint['requests']:5d} {endpoint['errors']:4d} {endpoint['throughput_rps']:6.2f} "
+              f"{latency.get('p50', float('nan')):8.1f} {latency.get('p95', float('nan')):8.1f} "
+              f"{latency.get('p99', float('nan')):8.1f}")
+
+
+def compare(report, baseline, tolerance, min_delta_ms):
+    """Print per-endpoint changes; True if anything regressed beyond ``tolerance``.
+
+    A p95 increase also has to exceed ``min_delta_ms``, so jitter on fast,
+    rarely hit endpoints is not reported as a regression.
+    """
+    regressed = False
+    print(f"\nvs {baseline.get('git_commit')} ({baseline.get('created')}):")
+    print(f"{'endpoint':<52} {'p95 before':>10} {'p95 after':>10} {'change':>7} {'err before':>10} {'err after':>9}")
+    for name, endpoint in report["endpoints"].items():
+        before = baseline["endpoints"].get(name)
+        if before is None or not before["latency_ms"] or not endpoint["latency_ms"]:
+            print(f"{name:<52} {'new':>10}")
+            continue
+        p95_before, p95_after = before["latency_ms"]["p95"], endpoint["latency_ms"]["p95"]
+        change = p95_after / p95_before - 1 if p95_before else 0.0
+        slower = change > tolerance and p95_after - p95_before > min_delta_ms
+        worse = slower or endpoint["error_rate"] > before["error_rate"] + tolerance / 10
+        regressed |= worse
+        print(f"{name:<52} {p95_before:10.1f} {p95_after:10.1f} {change:+7.0%} {before['error_rate']:10.2%} "
+              f"{endpoint['error_rate']:9.2%}{'  REGRESSION' if worse else ''}")
+    lag_before = baseline.get("event_loop_lag_ms", {}).get("p99")
+    lag_after = report["event_loop_lag_ms"].get("p99")
+    if lag_before is not None and lag_after is not None:
+        print(f"event-loop lag p99 {lag_before} -> {lag_after} ms")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rps", type=float, default=20.0)
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds of arrivals to send")
+    parser.add_argument("--traffic", help="JSONL requests to replay (default: synthetic mix)")
+    parser.add_argument("--recorded-timing", action="store_true", help="Use the `at` offsets in --traffic")
+    parser.add_argument("--write-traffic", help="Save the synthetic mix as JSONL and exit")
+    parser.add_argument("--output", help="Write results JSON here")
+    parser.add_argument("--compare", help="Previous results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed relative p95 increase")
+    parser.add_argument("--min-delta-ms", type=float, default=50.0, help="Ignore p95 increases smaller than this")
+    parser.add_argument("--groq-latency-ms", type=float, default=250.0)
+    parser.add_argument("--openai-latency-ms", type=float, default=900.0)
+    parser.add_argument("--serpapi-latency-ms", type=float, default=400.0)
+    parser.add_argument("--slow-rate", type=float, default=0.02, help="Share of upstream calls in the slow tail")
+    parser.add_argument("--slow-ms", type=float, default=2000.0)
+    parser.add_argument("--token-delay-ms", type=float, default=5.0, help="Per-word delay of streamed replies")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the answer and search caches")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true", help="Keep the service's own log output")
+    args = parser.parse_args()
+
+    if args.write_traffic:
+        with open(args.write_traffic, "w", encoding="utf-8") as file:
+            for i, request in enumerate(synthetic_traffic(int(args.rps * args.duration), args.seed)):
+                file.write(json.dumps({**request, "at": round(i / args.rps, 3)}, ensure_ascii=False) + "\n")
+        print(f"wrote {int(args.rps * args.duration)} requests to {args.write_traffic}")
+        return
+
+    requests = load_traffic(args.traffic) if args.traffic else synthetic_traffic(int(args.rps * args.duration) + 1, args.seed)
+    arrivals = schedule(requests, args.rps, args.recorded_timing, args.duration, args.seed)
+
+    def reply(body):
+        return LLM_JSON if body.get("response_format") else LLM_TEXT
+
+    profiles = {
+        "groq": dict(latency_ms=args.groq_latency_ms, jitter_ms=args.groq_latency_ms / 5),
+        "openai": dict(latency_ms=args.openai_latency_ms, jitter_ms=args.openai_latency_ms / 5),
+        "serpapi": dict(latency_ms=args.serpapi_latency_ms, jitter_ms=args.serpapi_latency_ms / 5),
+    }
+    tail = dict(slow_rate=args.slow_rate, slow_ms=args.slow_ms)
+    groq = llm_app(**profiles["groq"], **tail, reply=reply, token_delay_ms=args.token_delay_ms, seed=args.seed)
+    openai = llm_app(**profiles["openai"], **tail, reply=reply, token_delay_ms=args.token_delay_ms, seed=args.seed + 1)
+    serpapi = serpapi_app(**profiles["serpapi"], seed=args.seed + 2)
+    serpapi.state.config.update(tail)
+
+    with serve(groq) as groq_url, serve(openai) as openai_url, serve(serpapi) as serpapi_url:
+        os.environ.update(
+            GROQ_BASE_URL=f"{groq_url}/v1", OPENAI_BASE_URL=f"{openai_url}/v1", SERPAPI_BASE_URL=serpapi_url,
+            SERPAPI_KEYS="loadtest", API_KEY_REQUIRED=FREE_KEY, PREMIUM_API_KEY=PREMIUM_KEY,
+        )
+        if args.no_cache:
+            os.environ.update(ANSWER_CACHE_SIZE="0", SEARCH_CACHE_TTL="0")
+        with open(os.devnull, "w") as devnull, redirect_stdout(sys.stdout if args.verbose else devnull):
+            import main
+            with serve(main.app, lifespan="on") as app_url:
+                loop = main.app.state.event_loop
+                lag_samples, stop = [], asyncio.Event()
+                monitor = asyncio.run_coroutine_threadsafe(lag_monitor(lag_samples, stop), loop)
+                results, elapsed = asyncio.run(replay(app_url, arrivals, args.timeout))
+                loop.call_soon_threadsafe(stop.set)
+                monitor.result(timeout=5)
+
+    endpoints, total = summarize(results, elapsed)
+    report = {
+        "schema": SCHEMA_VERSION,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "config": {
+            "rps": args.rps, "duration_s": args.duration, "traffic": args.traffic or "synthetic",
+            "recorded_timing": args.recorded_timing, "no_cache": args.no_cache, "seed": args.seed,
+            "upstream": {name: {**profile, **tail} for name, profile in profiles.items()},
+        },
+        "upstream_requests": {"groq": groq.state.requests, "openai": openai.state.requests,
+                              "serpapi": serpapi.state.requests},
+        "total": total,
+        "endpoints": endpoints,
+        "event_loop_lag_ms": percentiles(lag_samples),
+    }
+    print_report(report)
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2, sort_keys=True)
+            file.write("\n")
+        print(f"\nresults -> {args.output}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            baseline = json.load(file)
+        if compare(report, baseline, args.tolerance, args.min_delta_ms):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""Local stand-ins for the external providers, for benchmarks and load tests.
+
+Each factory returns an ASGI app whose behaviour lives in ``app.state.config``
+and can be changed while it is serving; ``serve`` runs an app with uvicorn in
+a background thread and yields its base URL.
+"""
+import asyncio
+import json
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+async def _simulate(config: dict, rng: random.Random):
+    latency = max(0.0, rng.gauss(config["latency_ms"], config["jitter_ms"])) / 1000
+    if rng.random() < config.get("slow_rate", 0.0):
+        latency += config["slow_ms"] / 1000
+    await asyncio.sleep(latency)
+    if rng.random() < config["error_rate"]:
+        return JSONResponse({"error": {"message": "stub failure"}}, status_code=config["error_status"])
+    return None
+
+
+def llm_app(latency_ms: float = 50.0, jitter_ms: float = 10.0, error_rate: float = 0.0,
+            error_status: int = 500, reply: str = "Jawaban uji dari stub LLM.",
+            token_delay_ms: float = 0.0, slow_rate: float = 0.0, slow_ms: float = 0.0,
+            seed: int = 0) -> FastAPI:
+    """OpenAI/Groq-compatible ``POST /v1/chat/completions``, including ``stream: true``.
+
+    ``latency_ms`` is the time to the first token; a streamed reply then
+    emits one word every ``token_delay_ms`` (a non-streamed one waits for all
+    of them). A ``slow_rate`` fraction of requests takes an extra
+    ``slow_ms`` to model a heavy latency tail. ``reply`` may also be a
+    callable taking the request body, to vary the completion per request.
+    """
+    app = FastAPI()
+    app.state.config = {
+        "latency_ms": latency_ms, "jitter_ms": jitter_ms, "error_rate": error_rate,
+        "error_status": error_status, "reply": reply, "token_delay_ms": token_delay_ms,
+        "slow_rate": slow_rate, "slow_ms": slow_ms,
+    }
+    app.state.requests = 0
+    rng = random.Random(seed)
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        app.state.requests += 1
+        failure = await _simulate(app.state.config, rng)
+        if failure is not None:
+            return failure
+
+        config = app.state.config
+        reply = config["reply"](body) if callable(config["reply"]) else config["reply"]
+        words = reply.split(" ")
+        if body.get("stream"):
+            async def chunks():
+                for i, word in enumerate(words):
+                    if i:
+                        await asyncio.sleep(config["token_delay_ms"] / 1000)
+                    content = word if not i else " " + word
+                    delta = {"choices": [{"index": 0, "delta": {"content": content}}]}
+                    yield f"data: {json.dumps(delta)}\n\n"
+                yield "data: [DONE]\n\n"
+            return StreamingResponse(chunks(), media_type="text/event-stream")
+
+        await asyncio.sleep(config["token_delay_ms"] * (len(words) - 1) / 1000)
+        return {
+            "id": "stub",
+            "model": body.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}}],
+        }
+
+    return app
+
+
+def serpapi_app(latency_ms: float = 300.0, jitter_ms: float = 50.0, error_rate: float = 0.0,
+                error_status: int = 500, rejected_keys=(), seed: int = 0) -> FastAPI:
+    """SerpAPI-compatible ``GET /search.json``; keys in ``rejected_keys`` get a 401.
+
+    ``app.state.requests`` counts upstream hits and ``app.state.keys`` how
+    often each key was used.
+    """
+    app = FastAPI()
+    app.state.config = {
+        "latency_ms": latency_ms, "jitter_ms": jitter_ms, "error_rate": error_rate,
+        "error_status": error_status, "rejected_keys": set(rejected_keys),
+    }
+    app.state.requests = 0
+    app.state.keys = {}
+    rng = random.Random(seed)
+
+    @app.get("/search.json")
+    async def search(q: str, api_key: str = "", num: int = 5):
+        app.state.requests += 1
+        app.state.keys[api_key] = app.state.keys.get(api_key, 0) + 1
+        if api_key in app.state.config["rejected_keys"]:
+            return JSONResponse({"error": "Invalid API key."}, status_code=401)
+        failure = await _simulate(app.state.config, rng)
+        if failure is not None:
+            return failure
+        return {
+            "search_metadata": {"status": "Success"},
+            "organic_results": [
+                {
+                    "position": i + 1,
+                    "title": f"Hasil {i + 1}: {q}",
+                    "snippet": f"Ringkasan tentang {q} dari sumber kesehatan {i + 1}.",
+                    "link": f"https://example.org/{abs(hash(q)) % 10000}/{i + 1}",
+                }
+                for i in range(num)
+            ],
+        }
+
+    return app
+
+
+@contextmanager
+def serve(app, host: str = "127.0.0.1", port: int = 0, lifespan: str = "off", **config):
+    """Run ``app`` in a background thread; yields ``http://host:port``.
+
+    The thread's event loop is left on ``app.state.event_loop``, so callers
+    can schedule coroutines (e.g. a loop-lag monitor) next to the app.
+    Extra keyword arguments go to ``uvicorn.Config`` (e.g. ``limit_concurrency``).
+    """
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning", lifespan=lifespan,
+                                           **config))
+    loop = asyncio.new_event_loop()
+    app.state.event_loop = loop
+    thread = threading.Thread(target=loop.run_until_complete, args=(server.serve(),), daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    bound_port = server.servers[0].sockets[0].getsockname()[1]
+    try:
+        yield f"http://{host}:{bound_port}"
+    finally:
+        server.should_exit = True
+        thread.join(timeout=5)
@@ -0,0 +1,178 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from retrieval.text import normalize
+
+
+class TTLCache:
+    """In-memory LRU cache whose entries also expire after ``ttl`` seconds."""
+
+    def __init__(self, max_size: int = 1024, ttl: float = 3600.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: "OrderedDict[Any, tuple[float, Any]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key) -> bool:
+        return self.get(key) is not None
+
+    def get(self, key, default=None):
+        item = self._data.get(key)
+        if item is None:
+            return default
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value, ttl: Optional[float] = None):
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        item = self._data.pop(key, None)
+        return default if item is None else item[1]
+
+    def clear(self):
+        self._data.clear()
+
+
+class SQLiteCache:
+    """Shared JSON key/value tier in a local SQLite file, so every worker on a
+    host sees the others' entries. Expired rows are dropped lazily."""
+
+    def __init__(self, path: str, ttl: float = 3600.0):
+        self.ttl = ttl
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=5, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT value FROM cache WHERE key = ? AND expires_at >= ?", (key, time.time())
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), expires_at),
+            )
+            self._writes += 1
+            if self._writes % 500 == 0:
+                self.conn.execute("DELETE FROM cache WHERE expires_at < ?", (time.time(),))
+
+    def recent(self, limit: int):
+        """Up to ``limit`` live ``(key, value)`` pairs, most recently written first."""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT key, value FROM cache WHERE expires_at >= ? ORDER BY expires_at DESC LIMIT ?",
+                (time.time(), limit),
+            ).fetchall()
+        return [(key, json.loads(value)) for key, value in rows]
+
+    def close(self):
+        self.conn.close()
+
+
+class AnswerCache:
+    """LLM answer cache in front of the provider clients.
+
+    Keyed on normalized question + model version + web-search flag + a
+    fingerprint of the prompt context, so an answer is only reused when the
+    same model would have seen the same evidence. Hits are looked up in the
+    memory tier first, then in the optional shared tier. Shared-tier reads
+    and writes can wait on another worker's write lock, so they run in a
+    thread rather than on the event loop.
+    """
+
+    def __init__(self, memory: TTLCache, shared: Optional[SQLiteCache] = None):
+        self.memory = memory
+        self.shared = shared
+        self.hits_memory = 0
+        self.hits_shared = 0
+        self.misses = 0
+        self.saved_latency_seconds = 0.0
+
+    @classmethod
+    def from_env(cls) -> "AnswerCache":
+        """ANSWER_CACHE_SIZE / ANSWER_CACHE_TTL size the memory tier; setting
+        ANSWER_CACHE_DB to a file path enables the shared SQLite tier."""
+        ttl = float(os.getenv("ANSWER_CACHE_TTL", 6 * 3600))
+        memory = TTLCache(int(os.getenv("ANSWER_CACHE_SIZE", 2048)), ttl)
+        shared_path = os.getenv("ANSWER_CACHE_DB")
+        return cls(memory, SQLiteCache(shared_path, ttl) if shared_path else None)
+
+    @staticmethod
+    def make_key(query: str, model_version: str, use_web_search: bool, context: str) -> str:
+        context_fingerprint = hashlib.sha1(context.encode("utf-8")).hexdigest()
+        raw = f"{normalize(query)}\x1f{model_version}\x1f{int(use_web_search)}\x1f{context_fingerprint}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[str]:
+        entry = self.memory.get(key)
+        if entry is not None:
+            self.hits_memory += 1
+        elif self.shared is not None:
+            entry = await asyncio.to_thread(self.shared.get, key)
+            if entry is not None:
+                self.hits_shared += 1
+                self.memory.set(key, entry)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.saved_latency_seconds += entry["latency"]
+        return entry["answer"]
+
+    async def set(self, key: str, answer: str, provider_latency: float):
+        entry = {"answer": answer, "latency": provider_latency}
+        self.memory.set(key, entry)
+        if self.shared is not None:
+            await asyncio.to_thread(self.shared.set, key, entry)
+
+    def warm(self, limit: Optional[int] = None) -> int:
+        """Fill the memory tier from the shared tier's newest entries; returns how many."""
+        if self.shared is None:
+            return 0
+        entries = self.shared.recent(self.memory.max_size if limit is None else limit)
+        # Oldest first, so the newest end up most recently used
+        for key, entry in reversed(entries):
+            self.memory.set(key, entry)
+        return len(entries)
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.hits_memory + self.hits_shared + self.misses
+        return (self.hits_memory + self.hits_shared) / lookups if lookups else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "hits_memory": self.hits_memory,
+            "hits_shared": self.hits_shared,
+            "misses": self.misses,
+            "hit_ratio": round(self.hit_ratio, 4),
+            "saved_provider_latency_seconds": round(self.saved_latency_seconds, 3),
+            "memory_entries": len(self.memory),
+        }
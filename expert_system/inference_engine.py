@@ -1,8 +1,31 @@
+import asyncio
 import json
+import re
+from .json_extract import extract_json_object
 from .knowledge_base import KnowledgeBase, Diagnosis
-from typing import Dict, List
+from .rule_engine import Assessment, RuleEngine, RuleState, is_affirmative
+import telemetry
+from telemetry import span
+from typing import Dict, List, Optional, Tuple
+
+def _as_list(value) -> List[str]:
+    if isinstance(value, list):
+        return [str(item) for item in value]
+    return [str(value)] if value else []
 
 class InteractiveDiagnosis:
+    """One diagnosis; in a session it also carries the rule state and the
+    question being asked. Slotted, since thousands of sessions stay live."""
+
+    __slots__ = ("initial_complaint", "symptoms", "answers", "health_score", "severity_level",
+                 "urgency_level", "risk_factors", "possible_conditions", "recommendations",
+                 "session_id", "facts", "asked", "pending_key", "pending_question", "completed",
+                 "rule_state")
+
+    RESULT_FIELDS = ("initial_complaint", "symptoms", "answers", "health_score", "severity_level",
+                     "urgency_level", "risk_factors", "possible_conditions", "recommendations")
+    STATE_FIELDS = RESULT_FIELDS + ("session_id", "facts", "asked", "pending_key", "pending_question", "completed")
+
     def __init__(self, initial_complaint: str, symptoms: List[str] = None, answers: Dict[str, str] = None):
         self.initial_complaint = initial_complaint
         self.symptoms = symptoms or []
@@ -13,11 +36,43 @@ class InteractiveDiagnosis:
         self.risk_factors = []
         self.possible_conditions = []
         self.recommendations = []
+        self.session_id: Optional[str] = None
+        self.facts: List[str] = []  # facts asserted so far, to rebuild rule_state
+        self.asked: List[str] = []
+        self.pending_key: Optional[str] = None
+        self.pending_question: Optional[str] = None
+        self.completed = False
+        self.rule_state: Optional[RuleState] = None
+
+    def to_dict(self, max_questions: int = 0) -> Dict:
+        result = {field: getattr(self, field) for field in self.RESULT_FIELDS}
+        if self.session_id is not None:
+            result.update(
+                session_id=self.session_id,
+                completed=self.completed,
+                next_question=self.pending_question,
+                questions_asked=len(self.asked),
+                progress=1.0 if self.completed else round(len(self.asked) / max(max_questions, 1), 2),
+            )
+        return result
+
+    def to_state(self) -> Dict:
+        return {field: getattr(self, field) for field in self.STATE_FIELDS}
+
+    @classmethod
+    def from_state(cls, state: Dict) -> "InteractiveDiagnosis":
+        diagnosis = cls(state["initial_complaint"])
+        for field in cls.STATE_FIELDS:
+            setattr(diagnosis, field, state[field])
+        return diagnosis
 
 class InferenceEngine:
-    def __init__(self, knowledge_base: KnowledgeBase, llm_client):
+    def __init__(self, knowledge_base: KnowledgeBase, llm_client, sessions=None, max_questions: int = 5):
         self.kb = knowledge_base
         self.llm = llm_client
+        self.sessions = sessions
+        self.max_questions = max_questions
+        self.compile_rules()
         
         # Add standard questions to reduce API calls
         self.standard_questions = [
@@ -37,7 +92,74 @@ class InferenceEngine:
             "progress": 0
         }
 
+    def compile_rules(self):
+        """(Re)build the rule network after the knowledge base changed."""
+        self.rule_engine = RuleEngine.from_knowledge_base(self.kb)
+
     async def analyze_answers(self, diagnosis: InteractiveDiagnosis) -> InteractiveDiagnosis:
+        """Score locally with the rule engine; the LLM only writes the narrative.
+
+        When the rules recognise a condition, health_score, severity, urgency
+        and possible conditions come from the rule engine. Low-risk cases are
+        answered from the rules file alone; the rest ask the LLM for the
+        recommendations only. Complaints no rule matches get the full LLM
+        analysis.
+        """
+        with span("rules"):
+            assessment = self.rule_engine.assess(diagnosis.initial_complaint, diagnosis.answers)
+        if not assessment.conditions:
+            telemetry.DIAGNOSIS_PATHS.inc("llm")
+            return await self._analyze_with_llm(diagnosis)
+        return await self._complete_from_rules(diagnosis, assessment)
+
+    def _apply_assessment(self, diagnosis: InteractiveDiagnosis, assessment: Assessment):
+        diagnosis.symptoms = assessment.symptoms
+        diagnosis.health_score = assessment.health_score
+        diagnosis.severity_level = assessment.severity_level
+        diagnosis.urgency_level = assessment.urgency_level
+        diagnosis.risk_factors = [self.rule_engine.name(fact) for fact in assessment.red_flags]
+        diagnosis.possible_conditions = [self.rule_engine.name(name) for name, _ in assessment.conditions]
+
+    async def _complete_from_rules(self, diagnosis: InteractiveDiagnosis, assessment: Assessment) -> InteractiveDiagnosis:
+        self._apply_assessment(diagnosis, assessment)
+        diagnosis.recommendations = self.rule_engine.recommendations(assessment)
+        if assessment.low_risk:
+            telemetry.DIAGNOSIS_PATHS.inc("local")
+            return diagnosis
+
+        telemetry.DIAGNOSIS_PATHS.inc("narrative")
+        narrative = await self._narrative_recommendations(diagnosis)
+        if narrative:
+            # Keep the rule engine's emergency advice in front of the narrative
+            urgent = diagnosis.recommendations[:1] if assessment.red_flags else []
+            diagnosis.recommendations = urgent + narrative
+        return diagnosis
+
+    async def _narrative_recommendations(self, diagnosis: InteractiveDiagnosis) -> List[str]:
+        prompt = f"""\
+Anda adalah asisten kesehatan kehamilan yang hanya membalas dalam format JSON.
+Keluhan: "{diagnosis.initial_complaint[:200]}". Jawaban: {str(diagnosis.answers)[:300]}
+Hasil penilaian (jangan diubah): skor kesehatan {diagnosis.health_score}/100, \
+keparahan {diagnosis.severity_level}, urgensi {diagnosis.urgency_level}.
+Kemungkinan kondisi: {", ".join(diagnosis.possible_conditions)}.
+Tulis 3-5 rekomendasi singkat, spesifik, dan aman untuk ibu hamil, hanya dengan struktur ini:
+{{"recommendations": ["rekomendasi 1", "rekomendasi 2"]}}
+"""
+        try:
+            with span("llm"):
+                response = await self.llm.get_response(prompt, "", json_mode=True)
+        except Exception as e:
+            print(f"Narrative LLM error, using rule recommendations: {e}")
+            return []
+        with span("json_parse"):
+            analysis = extract_json_object(response)
+        if not isinstance(analysis, dict) or not analysis.get("recommendations"):
+            telemetry.DIAGNOSIS_PARSES.inc("failed")
+            return []
+        telemetry.DIAGNOSIS_PARSES.inc("ok")
+        return _as_list(analysis["recommendations"])
+
+    async def _analyze_with_llm(self, diagnosis: InteractiveDiagnosis) -> InteractiveDiagnosis:
         context = f"Keluhan: {diagnosis.initial_complaint[:200]}. Jawaban: {str(diagnosis.answers)[:300]}"
         
         # Force strict JSON
@@ -55,12 +177,13 @@ Format JSON yang ketat, hanya balas dengan struktur ini:
     "recommendations": ["rekomendasi 1", "rekomendasi 2"]
 }}
 """
-        response = await self.llm.get_response(prompt, "")
-        print("Raw LLM response:", response)
+        with span("llm"):
+            response = await self.llm.get_response(prompt, "", json_mode=True)
 
         # If response is empty
         if not response.strip():
             print("Warning: Empty response from LLM.")
+            telemetry.DIAGNOSIS_PARSES.inc("empty")
             diagnosis.health_score = 50
             diagnosis.severity_level = "Ringan"
             diagnosis.urgency_level = "Rendah"
@@ -68,21 +191,20 @@ Format JSON yang ketat, hanya balas dengan struktur ini:
             diagnosis.recommendations = ["Silakan periksa koneksi atau coba lagi"]
             return diagnosis
 
-        # Try to parse as JSON
+        # Recover the JSON object even from fenced, chatty or truncated output
         try:
-            analysis = json.loads(response)
-            diagnosis.health_score = analysis["health_score"]
-            diagnosis.severity_level = analysis["severity_level"]
-            diagnosis.urgency_level = analysis["urgency_level"]
-            diagnosis.risk_factors = analysis.get("risk_factors", [])
-            diagnosis.possible_conditions = analysis["possible_conditions"]
-            diagnosis.recommendations = analysis["recommendations"]
+            with span("json_parse"):
+                try:
+                    analysis, outcome = json.loads(response), "ok"
+                except ValueError:
+                    analysis, outcome = extract_json_object(response), "recovered"
+                if not isinstance(analysis, dict):
+                    raise ValueError("no JSON object in response")
+                self._apply_analysis(diagnosis, analysis)
+            telemetry.DIAGNOSIS_PARSES.inc(outcome)
         except Exception as e:
             print(f"Error parsing analysis: {e}")
-
-            # Attempt minimal text-based parsing (optional)
-            # Example: parse lines for numeric health_score
-            # or fallback to basic diagnosis
+            telemetry.DIAGNOSIS_PARSES.inc("failed")
             diagnosis.health_score = 50
             diagnosis.severity_level = "Ringan"
             diagnosis.urgency_level = "Rendah"
@@ -91,6 +213,22 @@ Format JSON yang ketat, hanya balas dengan struktur ini:
         
         return diagnosis
 
+    @staticmethod
+    def _apply_analysis(diagnosis: InteractiveDiagnosis, analysis: Dict):
+        score = analysis["health_score"]
+        if isinstance(score, str):
+            # "80", "80/100", "skor 80"
+            match = re.search(r"\d+(?:\.\d+)?", score)
+            if match is None:
+                raise ValueError(f"health_score is not a number: {score!r}")
+            score = match.group()
+        diagnosis.health_score = max(0, min(100, int(float(score))))
+        diagnosis.severity_level = str(analysis["severity_level"])
+        diagnosis.urgency_level = str(analysis["urgency_level"])
+        diagnosis.risk_factors = _as_list(analysis.get("risk_factors", []))
+        diagnosis.possible_conditions = _as_list(analysis["possible_conditions"])
+        diagnosis.recommendations = _as_list(analysis["recommendations"])
+
     async def diagnose(self, complaint: str, answers: Dict[str, str] = None) -> InteractiveDiagnosis:
         diagnosis = InteractiveDiagnosis(complaint)
         
@@ -102,3 +240,94 @@ Format JSON yang ketat, hanya balas dengan struktur ini:
         diagnosis.answers = answers
         diagnosis = await self.analyze_answers(diagnosis)
         return diagnosis
+
+    async def diagnose_batch(self, requests: List[Dict], concurrency: int = 8) -> List:
+        """Diagnose many check-ins at once, at most ``concurrency`` LLM calls in flight.
+
+        Results keep the input order; a check-in that fails yields
+        ``{"error": ...}`` instead of failing the whole batch.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one(request: Dict):
+            async with semaphore:
+                try:
+                    return await self.diagnose(request["complaint"], request.get("answers"))
+                except Exception as e:
+                    return {"error": str(e)}
+
+        return await asyncio.gather(*(one(request) for request in requests))
+
+    # Interactive sessions: one question per round trip, chosen from the
+    # rules that the facts so far have partially matched.
+
+    async def start_session(self, complaint: str) -> InteractiveDiagnosis:
+        diagnosis = InteractiveDiagnosis(complaint)
+        diagnosis.session_id = self.sessions.new_id()
+        diagnosis.rule_state = self.rule_engine.new_state()
+        with span("rules"):
+            assessment = self._add_facts(diagnosis, self.rule_engine.detect_symptoms(complaint))
+        await self._advance(diagnosis, assessment)
+        return diagnosis
+
+    async def answer_session(self, session_id: str, answer: str) -> Optional[InteractiveDiagnosis]:
+        """Apply the answer to the pending question; None if the session expired."""
+        diagnosis = await self.sessions.get(session_id)
+        if diagnosis is None:
+            return None
+        if diagnosis.completed:
+            return diagnosis
+        if diagnosis.rule_state is None:
+            # Restored from the shared tier: replay the asserted facts once
+            diagnosis.rule_state = self.rule_engine.new_state()
+            self.rule_engine.add_facts(diagnosis.rule_state, diagnosis.facts)
+
+        question = diagnosis.pending_question
+        diagnosis.answers[question] = answer
+        with span("rules"):
+            facts = self.rule_engine.facts_from_answers({question: answer})
+            if diagnosis.pending_key.startswith("symptom:") and is_affirmative(answer):
+                facts.add(diagnosis.pending_key[len("symptom:"):])
+            assessment = self._add_facts(diagnosis, facts)
+        await self._advance(diagnosis, assessment)
+        return diagnosis
+
+    def _add_facts(self, diagnosis: InteractiveDiagnosis, facts) -> Assessment:
+        """Chain only the new facts and re-score from the running totals."""
+        new = [fact for fact in facts if fact not in diagnosis.facts]
+        diagnosis.facts.extend(new)
+        self.rule_engine.add_facts(diagnosis.rule_state, new)
+        assessment = self.rule_engine.summarize(diagnosis.rule_state)
+        self._apply_assessment(diagnosis, assessment)
+        return assessment
+
+    def _next_question(self, diagnosis: InteractiveDiagnosis, assessment: Assessment) -> Optional[Tuple[str, str]]:
+        if assessment.urgency_level == "Tinggi" or len(diagnosis.asked) >= self.max_questions:
+            # Urgent findings end the interview: the answer is "go now", not more questions
+            return None
+        asked_symptoms = [key[len("symptom:"):] for key in diagnosis.asked if key.startswith("symptom:")]
+        symptom = self.rule_engine.next_symptom(diagnosis.rule_state, asked_symptoms)
+        if symptom is not None:
+            return f"symptom:{symptom}", self.rule_engine.question(symptom)
+        if assessment.conditions:
+            return None
+        # Nothing recognised yet: fall back to the standard questions
+        for i, question in enumerate(self.standard_questions):
+            if f"standard:{i}" not in diagnosis.asked:
+                return f"standard:{i}", question
+        return None
+
+    async def _advance(self, diagnosis: InteractiveDiagnosis, assessment: Assessment):
+        question = self._next_question(diagnosis, assessment)
+        if question is not None:
+            diagnosis.pending_key, diagnosis.pending_question = question
+            diagnosis.asked.append(diagnosis.pending_key)
+        else:
+            diagnosis.pending_key = diagnosis.pending_question = None
+            diagnosis.completed = True
+            if assessment.conditions:
+                await self._complete_from_rules(diagnosis, assessment)
+            else:
+                telemetry.DIAGNOSIS_PATHS.inc("llm")
+                await self._analyze_with_llm(diagnosis)
+        await self.sessions.save(diagnosis)
@@ -0,0 +1,99 @@
+import json
+import re
+from typing import Any, Dict, List, Optional
+
+# Repairs for the usual LLM slips, tried only when strict parsing fails
+_TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+_PY_LITERALS_RE = re.compile(r"\b(True|False|None)\b")
+_SMART_QUOTES = str.maketrans({"“": '"', "”": '"', "‘": "'", "’": "'"})
+_PY_TO_JSON = {"True": "true", "False": "false", "None": "null"}
+
+
+def _loads_lenient(candidate: str) -> Optional[Any]:
+    try:
+        return json.loads(candidate)
+    except ValueError:
+        pass
+    repaired = candidate.translate(_SMART_QUOTES)
+    repaired = _TRAILING_COMMA_RE.sub(r"\1", repaired)
+    repaired = _PY_LITERALS_RE.sub(lambda m: _PY_TO_JSON[m.group(1)], repaired)
+    try:
+        return json.loads(repaired, strict=False)
+    except ValueError:
+        return None
+
+
+class JSONObjectExtractor:
+    """Incrementally finds the first complete JSON object in LLM output.
+
+    ``feed`` text as it arrives (a whole response or stream deltas); it
+    tracks brace depth outside of strings, so code fences, a chatty preamble
+    ("Berikut hasil analisis: ...") or text after the object are skipped
+    without re-scanning. A balanced candidate that still fails to parse
+    after light repair (trailing commas, Python literals, smart quotes) is
+    dropped and scanning resumes after its opening brace. ``close`` salvages
+    an object cut off by the token limit by closing what is still open.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.result: Optional[Dict[str, Any]] = None
+        self._pos = 0
+        self._start = -1
+        self._open: List[str] = []
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, text: str) -> Optional[Dict[str, Any]]:
+        if self.result is not None:
+            return self.result
+        self.buffer += text
+        buffer = self.buffer
+        while self._pos < len(buffer):
+            char = buffer[self._pos]
+            self._pos += 1
+            if self._start < 0:
+                if char == "{":
+                    self._start, self._open = self._pos - 1, ["}"]
+                continue
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == "{":
+                self._open.append("}")
+            elif char == "[":
+                self._open.append("]")
+            elif char in "}]":
+                self._open.pop()
+                if not self._open:
+                    parsed = _loads_lenient(buffer[self._start:self._pos])
+                    if isinstance(parsed, dict):
+                        self.result = parsed
+                        return parsed
+                    self._pos, self._start = self._start + 1, -1
+        return None
+
+    def close(self) -> Optional[Dict[str, Any]]:
+        """End of input: the parsed object, completing a truncated one if possible."""
+        if self.result is not None or self._start < 0:
+            return self.result
+        tail = self.buffer[self._start:]
+        if self._in_string:
+            tail += '"'
+        parsed = _loads_lenient(tail.rstrip().rstrip(",") + "".join(reversed(self._open)))
+        if isinstance(parsed, dict):
+            self.result = parsed
+        return self.result
+
+
+def extract_json_object(text: str) -> Optional[Dict[str, Any]]:
+    """The first JSON object embedded in ``text``, or None."""
+    extractor = JSONObjectExtractor()
+    extractor.feed(text)
+    return extractor.close()
@@ -1,6 +1,11 @@
 from dataclasses import dataclass
 from typing import Dict, List
 import json
+import os
+from pathlib import Path
+from search_service import SearchService
+
+DEFAULT_RULES_PATH = os.getenv("EXPERT_RULES_PATH", str(Path(__file__).with_name("rules.json")))
 
 @dataclass
 class Diagnosis:
@@ -10,11 +15,26 @@ class Diagnosis:
     recommendations: List[str]
 
 class KnowledgeBase:
-    def __init__(self, lang: str = 'en', serpapi_key: str = None):
+    def __init__(self, lang: str = 'en', search_service: SearchService = None):
         self.lang = lang
-        self.serpapi_key = serpapi_key
+        self.search_service = search_service
         self.symptoms = {}
         self.conditions = {}
+        self.rules = []
+        self.scoring = {}
+        self.answer_facts = {}
+
+    def load_rules(self, path: str = DEFAULT_RULES_PATH):
+        """Load symptoms, conditions and symptom->condition rules from a JSON rules file"""
+        with open(path, encoding='utf-8') as file:
+            data = json.load(file)
+        for id, symptom in data['symptoms'].items():
+            self.add_symptom(id, symptom)
+        for id, condition in data['conditions'].items():
+            self.add_condition(id, condition)
+        self.rules.extend(data['rules'])
+        self.scoring.update(data.get('scoring', {}))
+        self.answer_facts.update(data.get('answer_facts', {}))
     
     def add_symptom(self, id: str, data: Dict):
         self.symptoms[id] = data
@@ -24,26 +44,18 @@ class KnowledgeBase:
         
     async def get_medical_info(self, query: str) -> Dict:
         """Get medical information from SerpAPI"""
-        if not self.serpapi_key:
+        if self.search_service is None or not self.search_service.api_keys:
             print("Warning: No SERPAPI key provided")
             return {}
             
         try:
-            from serpapi import GoogleSearch
-            search = GoogleSearch({
+            return await self.search_service.search_raw({
+                "engine": "google",
                 "q": f"{query} kehamilan gejala",
-                "api_key": self.serpapi_key,
                 "gl": "id",
                 "hl": "id",
                 "num": 5  # Limit results
             })
-            
-            results = search.get_dict()
-            if "error" in results:
-                print(f"SERPAPI error: {results['error']}")
-                return {}
-                
-            return results
         except Exception as e:
             print(f"Search error: {e}")
             return {}
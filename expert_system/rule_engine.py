@@ -0,0 +1,295 @@
+import re
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from retrieval.text import normalize, stem
+
+SEVERITY_LEVELS = ("Ringan", "Sedang", "Berat")
+URGENCY_LEVELS = ("Rendah", "Sedang", "Tinggi")
+
+NEGATIONS = frozenset("tidak tak nggak gak enggak ngga belum bukan tanpa no not never without".split())
+AFFIRMATIVE = frozenset("ya iya iyaa yes betul benar ada pernah sudah sering kadang lumayan cukup".split())
+
+_DURATION_RE = re.compile(r"(\d+)\s*(hari|minggu|bulan|day|week|month)")
+_DURATION_DAYS = {"hari": 1, "day": 1, "minggu": 7, "week": 7, "bulan": 30, "month": 30}
+
+
+def _stems(text: str) -> List[str]:
+    return [stem(word) for word in normalize(text).split()]
+
+
+def _duration_days(text: str) -> Optional[int]:
+    match = _DURATION_RE.search(text.lower())
+    if match is None:
+        return None
+    return int(match.group(1)) * _DURATION_DAYS[match.group(2)]
+
+
+def is_affirmative(answer: str) -> bool:
+    """"ya, sering" -> True; "tidak", "belum pernah" -> False."""
+    words = normalize(answer).split()
+    return bool(words) and words[0] in AFFIRMATIVE and not NEGATIONS.intersection(words[:3])
+
+
+def _bits(mask: int) -> List[int]:
+    bits = []
+    while mask:
+        low = mask & -mask
+        bits.append(low)
+        mask ^= low
+    return bits
+
+
+class Assessment(NamedTuple):
+    symptoms: List[str]
+    conditions: List[Tuple[str, float]]
+    health_score: int
+    severity_level: str
+    urgency_level: str
+    red_flags: List[str]
+    low_risk: bool
+
+
+class RuleState:
+    """Incremental forward-chaining state of one diagnosis."""
+
+    __slots__ = ("known", "asserted", "fired", "confidence", "penalty")
+
+    def __init__(self):
+        self.known = 0  # asserted and derived facts
+        self.asserted = 0  # facts from the user's complaint/answers
+        self.fired = 0  # rule indexes that have fired
+        self.confidence: Dict[str, float] = {}
+        self.penalty = 0.0
+
+
+class RuleEngine:
+    """Forward-chaining symptom -> condition rules, compiled to bitsets.
+
+    Every symptom and condition is a fact with its own bit. A rule fires when
+    all of its ``all`` facts and at least one of its ``any`` facts are known;
+    its conclusion becomes a fact too, so rules chain (preeclampsia +
+    seizure -> eclampsia). Rules are indexed by premise, so a new fact only
+    re-checks the rules that mention it, and each check is two integer ANDs.
+
+    Free text is mapped to symptoms by stemmed keyword phrases from the
+    rules file, skipping phrases preceded by a negation ("tidak ada
+    perdarahan").
+    """
+
+    def __init__(self, symptoms: Dict[str, Dict], conditions: Dict[str, Dict], rules: List[Dict],
+                 scoring: Optional[Dict] = None, answer_facts: Optional[Dict[str, str]] = None,
+                 lang: str = "id"):
+        self.symptoms = symptoms
+        self.conditions = conditions
+        self.lang = lang
+        scoring = scoring or {}
+        self.points_per_weight = scoring.get("points_per_weight", 6)
+        self.min_score = scoring.get("min_score", 5)
+        self.low_risk_min_score = scoring.get("low_risk_min_score", 75)
+        self.answer_facts = answer_facts or {}
+
+        self.facts = list(symptoms) + [name for name in conditions if name not in symptoms]
+        self.bit = {name: 1 << i for i, name in enumerate(self.facts)}
+        self._names = {bit: name for name, bit in self.bit.items()}
+        self._weights = {self.bit[name]: data.get("weight", 1.0) for name, data in symptoms.items()}
+        self._symptom_mask = sum(self.bit[name] for name in symptoms)
+        self._red_flags = 0
+        for name, data in symptoms.items():
+            if data.get("red_flag"):
+                self._red_flags |= self.bit[name]
+
+        # (all_mask, any_mask, conclusion_bit, conclusion, confidence)
+        self._rules: List[Tuple[int, int, int, str, float]] = []
+        self._rules_by_fact: Dict[int, List[int]] = {}
+        for rule in rules:
+            all_mask = self._mask(rule.get("all", ()), rule)
+            any_mask = self._mask(rule.get("any", ()), rule)
+            conclusion = rule["then"]
+            if conclusion not in self.bit:
+                raise ValueError(f"Rule {rule.get('id')!r} concludes unknown condition {conclusion!r}")
+            index = len(self._rules)
+            self._rules.append((all_mask, any_mask, self.bit[conclusion], conclusion, rule.get("confidence", 1.0)))
+            for bit in _bits(all_mask | any_mask):
+                self._rules_by_fact.setdefault(bit, []).append(index)
+
+        # first stem -> [(phrase stems, symptom)], longest phrase first
+        self._phrases: Dict[str, List[Tuple[Tuple[str, ...], str]]] = {}
+        for name, data in symptoms.items():
+            for phrases in data.get("keywords", {}).values():
+                for phrase in phrases:
+                    stems = tuple(_stems(phrase))
+                    if stems:
+                        self._phrases.setdefault(stems[0], []).append((stems, name))
+        for candidates in self._phrases.values():
+            candidates.sort(key=lambda item: len(item[0]), reverse=True)
+
+    def _mask(self, names: Iterable[str], rule: Dict) -> int:
+        mask = 0
+        for name in names:
+            if name not in self.bit:
+                raise ValueError(f"Rule {rule.get('id')!r} references unknown fact {name!r}")
+            mask |= self.bit[name]
+        return mask
+
+    @classmethod
+    def from_knowledge_base(cls, kb) -> "RuleEngine":
+        return cls(kb.symptoms, kb.conditions, kb.rules, kb.scoring, kb.answer_facts, kb.lang)
+
+    def detect_symptoms(self, text: str) -> Set[str]:
+        words = normalize(text).split()
+        stems = [stem(word) for word in words]
+        found = set()
+        i = 0
+        while i < len(stems):
+            for phrase, name in self._phrases.get(stems[i], ()):
+                if tuple(stems[i:i + len(phrase)]) == phrase:
+                    if not NEGATIONS.intersection(words[max(0, i - 2):i]):
+                        found.add(name)
+                    i += len(phrase) - 1
+                    break
+            i += 1
+        return found
+
+    def facts_from_answers(self, answers: Dict[str, str]) -> Set[str]:
+        facts = set()
+        for question, answer in answers.items():
+            answer = str(answer)
+            facts |= self.detect_symptoms(answer)
+            fact = self.answer_facts.get(question)
+            if fact and is_affirmative(answer):
+                facts.add(fact)
+            days = _duration_days(answer)
+            if days is not None and days >= 14 and "persistent" in self.bit:
+                facts.add("persistent")
+        return facts
+
+    def new_state(self) -> "RuleState":
+        return RuleState()
+
+    def add_facts(self, state: "RuleState", names: Iterable[str]) -> List[str]:
+        """Assert facts and chain forward from them only; returns the new facts.
+
+        Earlier facts are never re-examined: only rules indexed under a new
+        fact are checked, and the score penalty is updated by the delta.
+        """
+        agenda = []
+        for name in names:
+            bit = self.bit.get(name, 0)
+            if bit and not state.known & bit:
+                state.known |= bit
+                state.asserted |= bit
+                state.penalty += self._weights.get(bit, 0.0) * self.points_per_weight
+                agenda.append(bit)
+        added = list(agenda)
+        while agenda:
+            for index in self._rules_by_fact.get(agenda.pop(), ()):
+                if state.fired >> index & 1:
+                    continue
+                all_mask, any_mask, conclusion_bit, conclusion, rule_confidence = self._rules[index]
+                if state.known & all_mask != all_mask or (any_mask and not state.known & any_mask):
+                    continue
+                state.fired |= 1 << index
+                previous = state.confidence.get(conclusion, 0.0)
+                if rule_confidence > previous:
+                    state.confidence[conclusion] = rule_confidence
+                    state.penalty += self.conditions[conclusion].get("penalty", 0) * (rule_confidence - previous)
+                if not state.known & conclusion_bit:
+                    state.known |= conclusion_bit
+                    agenda.append(conclusion_bit)
+                    added.append(conclusion_bit)
+        return [self._names[bit] for bit in added]
+
+    def summarize(self, state: "RuleState") -> Assessment:
+        severity = urgency = 0
+        for name in state.confidence:
+            condition = self.conditions[name]
+            severity = max(severity, SEVERITY_LEVELS.index(condition["severity"]))
+            urgency = max(urgency, URGENCY_LEVELS.index(condition["urgency"]))
+        score = int(round(max(self.min_score, min(100, 100 - state.penalty))))
+        severity = max(severity, 2 if score < 50 else 1 if score < 75 else 0)
+        symptoms = _bits(state.asserted)
+        red_flags = [self._names[bit] for bit in symptoms if bit & self._red_flags]
+        if red_flags:
+            urgency = 2
+
+        return Assessment(
+            symptoms=[self._names[bit] for bit in symptoms],
+            conditions=sorted(state.confidence.items(), key=lambda item: self._rank(item), reverse=True),
+            health_score=score,
+            severity_level=SEVERITY_LEVELS[severity],
+            urgency_level=URGENCY_LEVELS[urgency],
+            red_flags=red_flags,
+            low_risk=severity == 0 and urgency == 0 and score >= self.low_risk_min_score,
+        )
+
+    def evaluate(self, facts: Iterable[str]) -> Assessment:
+        state = self.new_state()
+        self.add_facts(state, facts)
+        return self.summarize(state)
+
+    def next_symptom(self, state: "RuleState", exclude: Iterable[str] = ()) -> Optional[str]:
+        """The unasked symptom whose answer could move the assessment most.
+
+        Looks only at rules that already share a premise with a known fact
+        and have not fired; each missing symptom premise is worth the rule's
+        expected penalty (condition penalty x confidence) split over the
+        premises still missing, plus the symptom's own weight.
+        """
+        excluded = state.known
+        for name in exclude:
+            excluded |= self.bit.get(name, 0)
+        gains: Dict[int, float] = {}
+        seen = 0
+        for bit in _bits(state.known):
+            for index in self._rules_by_fact.get(bit, ()):
+                if state.fired >> index & 1 or seen >> index & 1:
+                    continue
+                seen |= 1 << index
+                all_mask, any_mask, _, conclusion, rule_confidence = self._rules[index]
+                missing_all = all_mask & ~state.known
+                missing_any = any_mask & ~state.known if any_mask and not state.known & any_mask else 0
+                if (missing_all | missing_any) & ~self._symptom_mask:
+                    continue  # needs a derived condition first
+                count = len(_bits(missing_all)) + (1 if missing_any else 0)
+                expected = self.conditions[conclusion].get("penalty", 0) * rule_confidence / count
+                for candidate in _bits((missing_all | missing_any) & ~excluded):
+                    gain = expected + self._weights.get(candidate, 0.0) * self.points_per_weight
+                    if gain > gains.get(candidate, 0.0):
+                        gains[candidate] = gain
+        if not gains:
+            return None
+        return self._names[max(gains, key=gains.get)]
+
+    def question(self, symptom: str) -> str:
+        name = self.name(symptom).lower()
+        if self.lang == "en":
+            return f"Are you also experiencing {name}?"
+        return f"Apakah Anda juga mengalami {name}?"
+
+    def _rank(self, item: Tuple[str, float]) -> float:
+        name, value = item
+        return self.conditions[name].get("penalty", 0) * value
+
+    def assess(self, complaint: str, answers: Optional[Dict[str, str]] = None) -> Assessment:
+        """One-shot assessment of a complaint and its answers."""
+        facts = self.detect_symptoms(complaint)
+        if answers:
+            facts |= self.facts_from_answers(answers)
+        return self.evaluate(facts)
+
+    def name(self, fact: str) -> str:
+        data = self.symptoms.get(fact) or self.conditions[fact]
+        return data["name"].get(self.lang) or data["name"]["id"]
+
+    def recommendations(self, assessment: Assessment, limit: int = 5) -> List[str]:
+        recommendations: List[str] = []
+        for name, _ in assessment.conditions:
+            by_lang = self.conditions[name].get("recommendations", {})
+            for text in by_lang.get(self.lang) or by_lang.get("id", []):
+                if text not in recommendations:
+                    recommendations.append(text)
+        if assessment.red_flags and self.lang == "id":
+            recommendations.insert(0, "Segera hubungi dokter, bidan, atau IGD terdekat")
+        elif assessment.red_flags:
+            recommendations.insert(0, "Contact your doctor, midwife or the nearest emergency room now")
+        return recommendations[:limit]
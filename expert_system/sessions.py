@@ -0,0 +1,62 @@
+import asyncio
+import json
+import os
+import uuid
+from typing import Dict, Optional
+
+from cache import SQLiteCache, TTLCache
+
+from .inference_engine import InteractiveDiagnosis
+
+
+class SessionStore:
+    """Live interactive-diagnosis sessions.
+
+    Sessions are held as objects in an LRU/TTL memory tier. With a SQLite
+    file configured, every update is also written through as a snapshot, so
+    a session survives a restart or continues on another worker. The
+    snapshot is then the source of truth: the memory copy is only reused
+    while it still matches, since another worker may have advanced the
+    session since. A restored session rebuilds its rule state from its
+    facts on the next answer. SQLite reads and writes run in a worker
+    thread, so a busy database file never stalls the event loop.
+    """
+
+    def __init__(self, memory: TTLCache, shared: Optional[SQLiteCache] = None):
+        self.memory = memory
+        self.shared = shared
+
+    @classmethod
+    def from_env(cls) -> "SessionStore":
+        """DIAGNOSIS_SESSION_SIZE / DIAGNOSIS_SESSION_TTL size the memory tier;
+        DIAGNOSIS_SESSION_DB enables SQLite persistence."""
+        ttl = float(os.getenv("DIAGNOSIS_SESSION_TTL", 1800))
+        memory = TTLCache(int(os.getenv("DIAGNOSIS_SESSION_SIZE", 10000)), ttl)
+        shared_path = os.getenv("DIAGNOSIS_SESSION_DB")
+        return cls(memory, SQLiteCache(shared_path, ttl) if shared_path else None)
+
+    @staticmethod
+    def new_id() -> str:
+        return uuid.uuid4().hex
+
+    async def get(self, session_id: str) -> Optional[InteractiveDiagnosis]:
+        diagnosis = self.memory.get(session_id)
+        if self.shared is None:
+            return diagnosis
+        state = await asyncio.to_thread(self.shared.get, session_id)
+        if state is None:
+            return diagnosis
+        # Keep the local copy (and its rule state) only if no other worker moved on
+        if diagnosis is None or json.loads(json.dumps(diagnosis.to_state())) != state:
+            diagnosis = InteractiveDiagnosis.from_state(state)
+            self.memory.set(session_id, diagnosis)
+        return diagnosis
+
+    async def save(self, diagnosis: InteractiveDiagnosis):
+        self.memory.set(diagnosis.session_id, diagnosis)
+        if self.shared is not None:
+            # Snapshot taken here, before another request can change the session
+            await asyncio.to_thread(self.shared.set, diagnosis.session_id, diagnosis.to_state())
+
+    def stats(self) -> Dict:
+        return {"live_sessions": len(self.memory), "persistent": self.shared is not None}
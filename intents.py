@@ -0,0 +1,206 @@
+import re
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from retrieval.text import normalize
+
+# intent -> lang -> trigger phrases. "*" phrases are language neutral and
+# answered in Indonesian unless another phrase in the message says otherwise.
+INTENT_PHRASES: Dict[str, Dict[str, List[str]]] = {
+    "greeting": {
+        "id": ["halo", "hai", "hay", "hallo", "helo", "hei", "hey", "selamat pagi", "selamat siang",
+               "selamat sore", "selamat malam", "pagi", "siang", "sore", "malam",
+               "assalamualaikum", "assalamu alaikum", "permisi", "salam"],
+        "en": ["hi", "hello", "good morning", "good afternoon", "good evening", "greetings", "hi there",
+               "hello there"],
+    },
+    "thanks": {
+        "id": ["terima kasih", "terimakasih", "makasih", "trima kasih", "trimakasih", "thx", "tq",
+               "terima kasih banyak", "makasih banyak", "matur nuwun", "hatur nuhun"],
+        "en": ["thanks", "thank you", "thank you so much", "thanks a lot", "many thanks", "thank u",
+               "ty", "thanks so much"],
+    },
+    "goodbye": {
+        "id": ["sampai jumpa", "dadah", "dah", "sampai nanti", "sampai ketemu", "selamat tinggal",
+               "pamit", "pamit dulu", "saya pamit", "aku pamit", "duluan ya"],
+        "en": ["bye", "goodbye", "bye bye", "see you", "see you later", "see ya", "good bye",
+               "take care", "good night"],
+    },
+    "identity": {
+        "id": ["siapa kamu", "kamu siapa", "anda siapa", "siapa anda", "ini siapa", "kamu itu apa",
+               "kamu apa", "kamu robot", "kamu bot", "apakah kamu robot", "apakah kamu manusia",
+               "kamu manusia", "apa itu pregnaai", "pregnaai itu apa", "nama kamu siapa", "siapa namamu"],
+        "en": ["who are you", "what are you", "are you a bot", "are you a robot", "are you human",
+               "what is pregnaai", "what is your name", "what's your name"],
+    },
+    "capabilities": {
+        "id": ["apa yang bisa kamu lakukan", "kamu bisa apa", "bisa apa saja", "bisa bantu apa",
+               "bisa bantu apa saja", "apa saja yang bisa kamu bantu", "apa yang bisa dibantu",
+               "fitur apa saja", "apa saja fiturnya", "bantuan", "tolong bantu", "bisa bantu saya",
+               "cara pakai", "cara menggunakan aplikasi ini"],
+        "en": ["what can you do", "how can you help", "what can you help with", "help", "help me",
+               "can you help me", "what are your features", "how does this work"],
+    },
+    "acknowledge": {
+        "*": ["ok", "oke", "okay", "okey", "okei", "sip", "siap", "mantap", "noted"],
+        "id": ["baik", "baiklah", "iya", "oh begitu", "oh gitu", "begitu ya", "gitu ya",
+               "paham", "mengerti", "sudah paham", "sudah jelas", "jelas"],
+        "en": ["alright", "got it", "i see", "understood", "sure", "cool", "great", "nice", "yes"],
+    },
+}
+
+# Words that carry no intent of their own (address terms, particles,
+# punctuation-like fillers); they neither count for nor against a match.
+FILLER_WORDS = frozenset("""
+kak kakak dok dokter min admin bun bunda sis gan mba mbak mas bu ibu pak
+ya yaa yah nih deh dong sih kok loh lho kan ah oh eh wah nah yuk aja
+pregnaai pregna ithai bot ai
+sayang semua juga lagi banyak sekali sangat infonya jawabannya penjelasannya bantuannya
+all again there everyone very much so
+""".split())
+
+RESPONSES: Dict[str, Dict[str, str]] = {
+    "greeting": {
+        "id": ("{salutation}! Saya PregnaAI, asisten AI yang siap membantu Anda seputar kehamilan. "
+               "Saya dapat memberikan informasi tentang kesehatan ibu hamil, memberikan saran nutrisi, "
+               "dan menjawab pertanyaan umum seputar kehamilan. Apa yang ingin Anda ketahui?"),
+        "en": ("{salutation}! I'm PregnaAI, an AI assistant here to help with your pregnancy. "
+               "I can share information about maternal health, give nutrition tips, "
+               "and answer general pregnancy questions. What would you like to know?"),
+    },
+    "thanks": {
+        "id": ("Sama-sama! Senang bisa membantu Anda. Jangan ragu untuk bertanya lagi jika "
+               "Anda memiliki pertanyaan lain seputar kehamilan."),
+        "en": ("You're welcome! Glad I could help. Feel free to ask again if you have "
+               "any other questions about your pregnancy."),
+    },
+    "goodbye": {
+        "id": ("Sampai jumpa! Jaga kesehatan Anda dan bayi. Jangan lupa untuk rutin "
+               "melakukan pemeriksaan dan mengisi DailyCheckup Anda."),
+        "en": ("Goodbye! Take care of yourself and your baby. Don't forget your regular "
+               "check-ups and to fill in your DailyCheckup."),
+    },
+    "identity": {
+        "id": ("Saya PregnaAI, asisten AI dari platform PregnaAI untuk ibu hamil. Saya bukan dokter, "
+               "tetapi saya dapat membantu menjawab pertanyaan seputar kehamilan, nutrisi, dan fitur "
+               "platform. Untuk kondisi medis, selalu konsultasikan dengan dokter atau bidan Anda."),
+        "en": ("I'm PregnaAI, the AI assistant of the PregnaAI platform for expecting mothers. I'm not "
+               "a doctor, but I can help with questions about pregnancy, nutrition and the platform's "
+               "features. For medical conditions, always consult your doctor or midwife."),
+    },
+    "capabilities": {
+        "id": ("Saya dapat membantu Anda dengan:\n"
+               "- Informasi kesehatan kehamilan dan nutrisi ibu hamil\n"
+               "- Pemantauan harian lewat DailyCheckup\n"
+               "- Pengingat jadwal pemeriksaan dan konsultasi dengan dokter\n"
+               "- Rekomendasi produk kesehatan kehamilan\n"
+               "Aktifkan pencarian web untuk jawaban medis yang lebih lengkap. Apa yang ingin Anda tanyakan?"),
+        "en": ("I can help you with:\n"
+               "- Pregnancy health and prenatal nutrition information\n"
+               "- Daily monitoring through DailyCheckup\n"
+               "- Check-up reminders and doctor consultations\n"
+               "- Pregnancy health product recommendations\n"
+               "Enable web search for more complete medical answers. What would you like to ask?"),
+    },
+    "acknowledge": {
+        "id": "Baik! Jika ada hal lain seputar kehamilan yang ingin Anda tanyakan, silakan saja.",
+        "en": "Alright! If there's anything else about your pregnancy you'd like to ask, just let me know.",
+    },
+}
+
+DEFAULT_SALUTATION = {"id": "Halo", "en": "Hello"}
+
+_REPEATS_RE = re.compile(r"(.)\1{2,}")
+
+
+def _words(text: str) -> List[str]:
+    # "haiii", "makasihhh" -> "hai", "makasih"
+    return _REPEATS_RE.sub(r"\1", normalize(text)).split()
+
+
+class Intent(NamedTuple):
+    name: str
+    lang: str
+    confidence: float
+    phrase: str
+
+
+class IntentClassifier:
+    """Keyword classifier for small-talk intents that never need an LLM.
+
+    Trigger phrases are compiled once into a word trie; a message is scanned
+    left to right taking the longest phrase at each position. Confidence is
+    the share of the message's words covered by phrases or fillers, so
+    "halo kak" is a greeting (1.0) while "halo, saya mual sejak kemarin" is
+    not (0.2) and goes to the normal answer path.
+    """
+
+    def __init__(self, phrases: Dict[str, Dict[str, List[str]]] = INTENT_PHRASES,
+                 responses: Dict[str, Dict[str, str]] = RESPONSES,
+                 fillers=FILLER_WORDS, min_confidence: float = 0.75):
+        self.responses = responses
+        self.fillers = frozenset(fillers)
+        self.min_confidence = min_confidence
+        self._trie: Dict = {}
+        for intent, by_lang in phrases.items():
+            for lang, triggers in by_lang.items():
+                for phrase in triggers:
+                    node = self._trie
+                    for word in _words(phrase):
+                        node = node.setdefault(word, {})
+                    node[None] = (intent, lang, phrase)
+
+    def _longest_match(self, words: List[str], start: int) -> Tuple[int, Optional[Tuple[str, str, str]]]:
+        node, end, found = self._trie, start, None
+        for i in range(start, len(words)):
+            node = node.get(words[i])
+            if node is None:
+                break
+            if None in node:
+                end, found = i + 1, node[None]
+        return end, found
+
+    def classify(self, text: str) -> Optional[Intent]:
+        """Best intent for ``text`` with its confidence, or None if no phrase matched."""
+        words = _words(text)
+        if not words:
+            return None
+        covered = 0
+        weights: Dict[str, int] = {}
+        first_phrase: Dict[str, str] = {}
+        langs: Dict[str, int] = {}
+        i = 0
+        while i < len(words):
+            end, found = self._longest_match(words, i)
+            if found is None:
+                covered += words[i] in self.fillers
+                i += 1
+                continue
+            intent, lang, phrase = found
+            length = end - i
+            covered += length
+            # Later intents win ties: "makasih, sampai jumpa" is a goodbye
+            weights[intent] = weights.get(intent, 0) + length
+            weights[intent] = weights.pop(intent)
+            first_phrase.setdefault(intent, phrase)
+            if lang != "*":
+                langs[lang] = langs.get(lang, 0) + length
+            i = end
+        if not weights:
+            return None
+        best = max(reversed(list(weights)), key=weights.get)
+        lang = max(langs, key=langs.get) if langs else "id"
+        return Intent(best, lang, covered / len(words), first_phrase[best])
+
+    def respond(self, intent: Intent) -> str:
+        template = self.responses[intent.name][intent.lang]
+        salutation = DEFAULT_SALUTATION[intent.lang]
+        if intent.phrase.startswith(("selamat", "good", "assalam")):
+            salutation = intent.phrase.capitalize()
+        return template.format(salutation=salutation)
+
+    def answer(self, text: str) -> Optional[str]:
+        """Canned/templated reply if ``text`` is confidently small talk, else None."""
+        intent = self.classify(text)
+        if intent is None or intent.confidence < self.min_confidence:
+            return None
+        return self.respond(intent)
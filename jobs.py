@@ -0,0 +1,461 @@
+"""Background jobs: accept a slow request now, hand out its result later.
+
+ITHAI-2.0 chat and diagnosis can spend tens of seconds waiting on a
+provider; run synchronously they hold a connection (and a gateway timeout)
+for all of it. Submitted as a job they return a job id at once, and a
+bounded pool of async workers drains the queue, premium jobs first, with
+the submitter's admission tier. Transient failures (429, 5xx, timeouts)
+are retried with exponential backoff; an ``Idempotency-Key`` makes a
+resubmission return the job it already created.
+
+Free-tier apps share one API key, so jobs and idempotency keys belong to
+the key together with the caller's ``X-Client-Id`` (e.g. an install or
+user id), and idempotency keys must be long enough to be unique (a UUID).
+
+Jobs live in memory. With JOB_QUEUE_DB set every change is also written
+to SQLite, so results can be fetched from any worker process and jobs of
+a worker that died (its lease expired) are picked up by another.
+"""
+import asyncio
+import hashlib
+import itertools
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+import telemetry
+from admission import FREE, PREMIUM, current_tier
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+FINISHED = (SUCCEEDED, FAILED)
+TIER_PRIORITY = {PREMIUM: 0, FREE: 1}
+# Statuses worth another attempt: rate limited / shed, provider or gateway errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Shorter keys ("1", "checkin") would collide between callers of one API key
+MIN_IDEMPOTENCY_KEY = 16
+
+Handler = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+
+def owner_of(api_key: str, client_id: Optional[str] = None) -> str:
+    """Jobs are visible to the key and client id that submitted them; only a digest is stored."""
+    return hashlib.sha256(f"{api_key}\x1f{client_id or ''}".encode("utf-8")).hexdigest()[:16]
+
+
+def _fingerprint(kind: str, payload: Dict) -> str:
+    return hashlib.sha256(f"{kind}\x1f{json.dumps(payload, sort_keys=True)}".encode("utf-8")).hexdigest()[:16]
+
+
+class Job:
+    __slots__ = ("id", "kind", "owner", "tier", "payload", "fingerprint", "idempotency_key",
+                 "status", "attempts", "result", "error", "created", "updated")
+
+    COLUMNS = __slots__
+
+    def __init__(self, kind: str, owner: str, tier: str, payload: Dict, idempotency_key: Optional[str] = None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.owner = owner
+        self.tier = tier
+        self.payload = payload
+        self.fingerprint = _fingerprint(kind, payload)
+        self.idempotency_key = idempotency_key
+        self.status = QUEUED
+        self.attempts = 0
+        self.result = None
+        self.error: Optional[str] = None
+        self.created = self.updated = time.time()
+
+    @classmethod
+    def from_row(cls, row: Tuple) -> "Job":
+        job = cls.__new__(cls)
+        for column, value in zip(cls.COLUMNS, row):
+            setattr(job, column, json.loads(value) if column in ("payload", "result") and value is not None else value)
+        return job
+
+    def to_row(self) -> Tuple:
+        return tuple(
+            json.dumps(getattr(self, column), ensure_ascii=False) if column in ("payload", "result") else getattr(self, column)
+            for column in self.COLUMNS
+        )
+
+    def to_dict(self) -> Dict:
+        job = {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "attempts": self.attempts,
+            "created": self.created,
+            "updated": self.updated,
+        }
+        if self.status == SUCCEEDED:
+            job["result"] = self.result
+        elif self.status == FAILED:
+            job["error"] = self.error
+        return job
+
+
+class SQLiteJobStore:
+    """Jobs shared by the worker processes of a node.
+
+    A process holds a lease on the unfinished jobs it runs and renews it
+    while alive; jobs whose lease ran out are claimed by whichever worker
+    looks first.
+    """
+
+    def __init__(self, path: str, lease: float = 60.0):
+        self.lease = lease
+        self.conn = sqlite3.connect(path, timeout=5, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        columns = ", ".join(Job.COLUMNS)
+        self.conn.execute(
+            f"CREATE TABLE IF NOT EXISTS jobs ({columns}, worker TEXT, lease_until REAL, PRIMARY KEY (id))"
+        )
+        self.conn.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS jobs_idempotency ON jobs (owner, idempotency_key)"
+            " WHERE idempotency_key IS NOT NULL"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS jobs_lease ON jobs (status, lease_until)")
+        self.conn.commit()
+        self._lock = threading.Lock()
+        self._select = f"SELECT {columns} FROM jobs"
+
+    def insert(self, job: Job, worker: str) -> bool:
+        """False if the owner already has a job under this idempotency key."""
+        with self._lock, self.conn:
+            cursor = self.conn.execute(
+                f"INSERT OR IGNORE INTO jobs VALUES ({', '.join('?' * (len(Job.COLUMNS) + 2))})",
+                job.to_row() + (worker, time.time() + self.lease),
+            )
+        return cursor.rowcount == 1
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            row = self.conn.execute(f"{self._select} WHERE id = ?", (job_id,)).fetchone()
+        return Job.from_row(row) if row else None
+
+    def find(self, owner: str, idempotency_key: str) -> Optional[Job]:
+        with self._lock:
+            row = self.conn.execute(
+                f"{self._select} WHERE owner = ? AND idempotency_key = ?", (owner, idempotency_key)
+            ).fetchone()
+        return Job.from_row(row) if row else None
+
+    def update(self, job: Job):
+        with self._lock, self.conn:
+            self.conn.execute(
+                "UPDATE jobs SET status = ?, attempts = ?, result = ?, error = ?, updated = ? WHERE id = ?",
+                (job.status, job.attempts, json.dumps(job.result, ensure_ascii=False), job.error, job.updated, job.id),
+            )
+
+    def renew(self, worker: str):
+        with self._lock, self.conn:
+            self.conn.execute(
+                "UPDATE jobs SET lease_until = ? WHERE worker = ? AND status IN (?, ?)",
+                (time.time() + self.lease, worker, QUEUED, RUNNING),
+            )
+
+    def claim_expired(self, worker: str, limit: int) -> List[Job]:
+        """Take over unfinished jobs whose worker stopped renewing its lease."""
+        now = time.time()
+        claimed = []
+        with self._lock:
+            ids = [row[0] for row in self.conn.execute(
+                "SELECT id FROM jobs WHERE status IN (?, ?) AND lease_until < ? LIMIT ?", (QUEUED, RUNNING, now, limit)
+            )]
+            for job_id in ids:
+                with self.conn:
+                    cursor = self.conn.execute(
+                        "UPDATE jobs SET worker = ?, lease_until = ?, status = ? WHERE id = ? AND lease_until < ?",
+                        (worker, now + self.lease, QUEUED, job_id, now),
+                    )
+                if cursor.rowcount == 1:
+                    claimed.append(Job.from_row(self.conn.execute(f"{self._select} WHERE id = ?", (job_id,)).fetchone()))
+        return claimed
+
+    def purge(self, before: float) -> int:
+        with self._lock, self.conn:
+            return self.conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND updated < ?", (SUCCEEDED, FAILED, before)
+            ).rowcount
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+class JobQueue:
+    def __init__(self, workers: int = 8, max_attempts: int = 3, retry_backoff: float = 1.0,
+                 timeout: float = 120.0, ttl: float = 3600.0, max_pending: int = 1000,
+                 store: Optional[SQLiteJobStore] = None):
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.timeout = timeout
+        self.ttl = ttl
+        self.max_pending = max_pending
+        self.store = store
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._handlers: Dict[str, Handler] = {}
+        self._jobs: Dict[str, Job] = {}
+        self._by_key: Dict[Tuple[str, str], str] = {}
+        # Set (and replaced) whenever the job changes, for waiters
+        self._changed: Dict[str, asyncio.Event] = {}
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._seq = itertools.count()
+        self._tasks: List[asyncio.Task] = []
+        self.pending = 0
+        self.running = 0
+        self.retried = 0
+
+    @classmethod
+    def from_env(cls) -> "JobQueue":
+        """JOB_WORKERS jobs run at once; JOB_MAX_ATTEMPTS, JOB_RETRY_BACKOFF
+        (seconds, doubled per attempt) and JOB_TIMEOUT (per attempt) bound
+        retries; JOB_QUEUE_MAX unfinished jobs are accepted before 429;
+        results are kept JOB_RESULT_TTL seconds. JOB_QUEUE_DB enables SQLite
+        (JOB_LEASE seconds until another worker takes over a job)."""
+        path = os.getenv("JOB_QUEUE_DB")
+        return cls(
+            workers=int(os.getenv("JOB_WORKERS", 8)),
+            max_attempts=int(os.getenv("JOB_MAX_ATTEMPTS", 3)),
+            retry_backoff=float(os.getenv("JOB_RETRY_BACKOFF", 1.0)),
+            timeout=float(os.getenv("JOB_TIMEOUT", 120)),
+            ttl=float(os.getenv("JOB_RESULT_TTL", 3600)),
+            max_pending=int(os.getenv("JOB_QUEUE_MAX", 1000)),
+            store=SQLiteJobStore(path, float(os.getenv("JOB_LEASE", 60))) if path else None,
+        )
+
+    def register(self, kind: str, handler: Handler):
+        """``handler(payload)`` returns the job's (JSON-serializable) result."""
+        self._handlers[kind] = handler
+
+    async def submit(self, kind: str, payload: Dict, api_key: str, tier: str,
+                     idempotency_key: Optional[str] = None, client_id: Optional[str] = None) -> Tuple[Job, bool]:
+        """Queue a job; returns it and whether it is new (False: an earlier submission with this key)."""
+        owner = owner_of(api_key, client_id)
+        if idempotency_key:
+            if len(idempotency_key) < MIN_IDEMPOTENCY_KEY:
+                raise HTTPException(status_code=400,
+                                    detail=f"Idempotency-Key must be at least {MIN_IDEMPOTENCY_KEY} characters, e.g. a UUID")
+            existing = await self._find(owner, idempotency_key)
+            if existing is not None:
+                self._check_same(existing, kind, payload)
+                return existing, False
+        if self.pending >= self.max_pending:
+            telemetry.ADMISSION_REJECTIONS.inc(tier, "jobs")
+            raise HTTPException(status_code=429, detail="Too many jobs queued, please retry later",
+                                headers={"Retry-After": "5"})
+
+        job = Job(kind, owner, tier, payload, idempotency_key)
+        if self.store is not None and not await asyncio.to_thread(self.store.insert, job, self.worker_id):
+            # Another worker process took the key first
+            existing = await asyncio.to_thread(self.store.find, owner, idempotency_key)
+            self._check_same(existing, kind, payload)
+            return existing, False
+        self._jobs[job.id] = job
+        if idempotency_key:
+            self._by_key[(owner, idempotency_key)] = job.id
+        self.pending += 1
+        self._enqueue(job)
+        return job, True
+
+    async def _find(self, owner: str, idempotency_key: str) -> Optional[Job]:
+        job_id = self._by_key.get((owner, idempotency_key))
+        if job_id is not None and job_id in self._jobs:
+            return self._jobs[job_id]
+        if self.store is None:
+            return None
+        return await asyncio.to_thread(self.store.find, owner, idempotency_key)
+
+    @staticmethod
+    def _check_same(job: Job, kind: str, payload: Dict):
+        if job.fingerprint != _fingerprint(kind, payload):
+            raise HTTPException(status_code=409, detail="Idempotency-Key was already used for a different request")
+
+    async def get(self, job_id: str, api_key: str, client_id: Optional[str] = None) -> Optional[Job]:
+        job = self._jobs.get(job_id)
+        if job is None and self.store is not None:
+            job = await asyncio.to_thread(self.store.get, job_id)
+        if job is None or job.owner != owner_of(api_key, client_id):
+            return None
+        return job
+
+    async def wait(self, job_id: str, api_key: str, timeout: float, client_id: Optional[str] = None) -> Optional[Job]:
+        """The job once it changes (or finishes), or as it is after ``timeout`` seconds."""
+        job = await self.get(job_id, api_key, client_id)
+        if job is None or job.status in FINISHED or timeout <= 0:
+            return job
+        status, attempts = job.status, job.attempts
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if job_id in self._jobs:
+                try:
+                    await asyncio.wait_for(self._event(job_id).wait(), deadline - time.monotonic())
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                # Run by another worker process: poll the shared store
+                await asyncio.sleep(min(0.5, max(0.0, deadline - time.monotonic())))
+            job = await self.get(job_id, api_key, client_id)
+            if job is None or (job.status, job.attempts) != (status, attempts):
+                break
+        return job
+
+    async def follow(self, job_id: str, api_key: str, timeout: float,
+                     client_id: Optional[str] = None) -> AsyncIterator[Job]:
+        """Yield the job now and after every change, until it finishes or ``timeout`` passes."""
+        deadline = time.monotonic() + timeout
+        job = await self.get(job_id, api_key, client_id)
+        while job is not None:
+            yield job
+            if job.status in FINISHED or time.monotonic() >= deadline:
+                return
+            job = await self.wait(job_id, api_key, deadline - time.monotonic(), client_id)
+
+    def _event(self, job_id: str) -> asyncio.Event:
+        event = self._changed.get(job_id)
+        if event is None:
+            event = self._changed[job_id] = asyncio.Event()
+        return event
+
+    async def _changed_now(self, job: Job):
+        job.updated = time.time()
+        if self.store is not None:
+            # The write can wait on another process's lock: keep it off the loop
+            await asyncio.to_thread(self.store.update, job)
+        event = self._changed.pop(job.id, None)
+        if event is not None:
+            event.set()
+
+    def _enqueue(self, job: Job, delay: float = 0.0):
+        entry = (TIER_PRIORITY.get(job.tier, 1), next(self._seq), job.id)
+        if self._queue is None:
+            return  # picked up by start()
+        if delay > 0:
+            asyncio.get_running_loop().call_later(delay, self._queue.put_nowait, entry)
+        else:
+            self._queue.put_nowait(entry)
+
+    def _retry_delay(self, job: Job, error: Exception) -> Optional[float]:
+        """Seconds until the next attempt, or None if the failure is final."""
+        status = getattr(error, "status_code", None)
+        transient = status in RETRY_STATUSES if status is not None else isinstance(
+            error, (asyncio.TimeoutError, ConnectionError)
+        )
+        if not transient or job.attempts >= self.max_attempts:
+            return None
+        delay = self.retry_backoff * 2 ** (job.attempts - 1)
+        retry_after = (getattr(error, "headers", None) or {}).get("Retry-After")
+        return max(delay, float(retry_after)) if retry_after else delay
+
+    async def _run(self, job: Job):
+        handler = self._handlers.get(job.kind)
+        job.status = RUNNING
+        job.attempts += 1
+        self.running += 1
+        await self._changed_now(job)
+        telemetry.JOB_WAIT.observe(time.time() - job.created, job.kind)
+        # Provider calls are admitted at the submitter's tier
+        current_tier.set(job.tier)
+        try:
+            if handler is None:
+                raise ValueError(f"Unknown job kind: {job.kind}")
+            job.result = await asyncio.wait_for(handler(job.payload), self.timeout)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            delay = self._retry_delay(job, e)
+            detail = getattr(e, "detail", None) or str(e) or type(e).__name__
+            if delay is not None:
+                print(f"Job {job.id} ({job.kind}) attempt {job.attempts} failed, retrying in {delay:.1f}s: {detail}")
+                self.retried += 1
+                job.status, job.error = QUEUED, detail
+                await self._changed_now(job)
+                self._enqueue(job, delay)
+                return
+            print(f"Job {job.id} ({job.kind}) failed: {detail}")
+            job.status, job.error = FAILED, detail
+        else:
+            job.status, job.error = SUCCEEDED, None
+        finally:
+            self.running -= 1
+        self.pending -= 1
+        telemetry.JOBS.inc(job.kind, job.status)
+        await self._changed_now(job)
+
+    async def _worker(self):
+        while True:
+            _, _, job_id = await self._queue.get()
+            job = self._jobs.get(job_id)
+            if job is not None and job.status == QUEUED:
+                await self._run(job)
+
+    async def _maintain(self):
+        """Renew leases, take over orphaned jobs and drop expired results."""
+        interval = min(self.store.lease / 3 if self.store is not None else 60.0, self.ttl)
+        while True:
+            now = time.time()
+            for job_id, job in list(self._jobs.items()):
+                if job.status in FINISHED and job.updated < now - self.ttl:
+                    del self._jobs[job_id]
+                    self._changed.pop(job_id, None)
+                    if job.idempotency_key:
+                        self._by_key.pop((job.owner, job.idempotency_key), None)
+            if self.store is not None:
+                for job in await asyncio.to_thread(self._maintain_store, now):
+                    self._jobs[job.id] = job
+                    if job.idempotency_key:
+                        self._by_key[(job.owner, job.idempotency_key)] = job.id
+                    self.pending += 1
+                    self._enqueue(job)
+            await asyncio.sleep(interval)
+
+    def _maintain_store(self, now: float) -> List[Job]:
+        self.store.renew(self.worker_id)
+        self.store.purge(now - self.ttl)
+        return self.store.claim_expired(self.worker_id, max(0, self.max_pending - self.pending))
+
+    def start(self, after: Optional[asyncio.Task] = None):
+        """Start the workers; they take jobs once ``after`` (the start-up warm-up) has finished."""
+        self._queue = asyncio.PriorityQueue()
+        for job in self._jobs.values():
+            if job.status == QUEUED:
+                self._enqueue(job)
+
+        async def run_after(coroutine):
+            if after is not None:
+                await asyncio.wait({after})
+            await coroutine
+
+        self._tasks = [asyncio.create_task(run_after(self._worker())) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(run_after(self._maintain())))
+
+    async def stop(self):
+        """Cancel the workers; with a store, their unfinished jobs resume elsewhere once the lease expires."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self.store is not None:
+            self.store.close()
+
+    def stats(self) -> Dict:
+        return {
+            "workers": self.workers,
+            "pending": self.pending,
+            "running": self.running,
+            "queued": self.pending - self.running,
+            "retried": self.retried,
+            "kept": len(self._jobs),
+            "persistent": self.store is not None,
+        }
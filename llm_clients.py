@@ -1,23 +1,115 @@
 from abc import ABC, abstractmethod
+import json
 import os
+from typing import AsyncIterator, Dict, Optional
 import httpx
 from fastapi import HTTPException
 
+try:
+    import h2  # noqa: F401  (enables HTTP/2 in httpx)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, default))
+
+
 class BaseLLMClient(ABC):
+    # One pooled client shared by every provider: keep-alive connections and
+    # TLS sessions are reused across requests instead of a handshake per call.
+    _http: Optional[httpx.AsyncClient] = None
+    # OpenAI-style `response_format: json_object`; LLM_JSON_MODE=0 for
+    # endpoints/models that reject it
+    json_mode_supported = os.getenv("LLM_JSON_MODE", "1") != "0"
+
+    @classmethod
+    def build_http_client(cls) -> httpx.AsyncClient:
+        limits = httpx.Limits(
+            max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", 100)),
+            max_keepalive_connections=int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", 20)),
+            keepalive_expiry=_env_float("LLM_KEEPALIVE_EXPIRY", 30.0),
+        )
+        timeout = httpx.Timeout(
+            connect=_env_float("LLM_CONNECT_TIMEOUT", 5.0),
+            read=_env_float("LLM_READ_TIMEOUT", 60.0),
+            write=_env_float("LLM_WRITE_TIMEOUT", 10.0),
+            pool=_env_float("LLM_POOL_TIMEOUT", 5.0),
+        )
+        http2 = HTTP2_AVAILABLE and os.getenv("LLM_HTTP2", "1") != "0"
+        return httpx.AsyncClient(limits=limits, timeout=timeout, http2=http2)
+
+    @classmethod
+    async def open_http_client(cls):
+        if BaseLLMClient._http is None or BaseLLMClient._http.is_closed:
+            BaseLLMClient._http = cls.build_http_client()
+
+    @classmethod
+    async def close_http_client(cls):
+        if BaseLLMClient._http is not None:
+            await BaseLLMClient._http.aclose()
+            BaseLLMClient._http = None
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        # Opened by the app lifespan; created lazily for scripts that skip it
+        if BaseLLMClient._http is None or BaseLLMClient._http.is_closed:
+            BaseLLMClient._http = self.build_http_client()
+        return BaseLLMClient._http
+
+    @abstractmethod
+    async def get_response(self, query: str, context: str, json_mode: bool = False) -> str:
+        """Complete ``query``; ``json_mode`` asks the provider for a single JSON object."""
+
     @abstractmethod
-    async def get_response(self, query: str, context: str) -> str:
-        pass
+    def stream_response(self, query: str, context: str) -> AsyncIterator[str]:
+        """Yield the completion as text deltas while the provider generates it."""
+
+    def _json_payload(self, payload: Dict, json_mode: bool) -> Dict:
+        if json_mode and self.json_mode_supported:
+            return {**payload, "response_format": {"type": "json_object"}}
+        return payload
+
+    async def _stream_completion(self, payload: Dict, timeout=None) -> AsyncIterator[str]:
+        # OpenAI-compatible SSE: `data: {json}` lines terminated by `data: [DONE]`
+        async with self.http.stream(
+            "POST",
+            self.base_url,
+            headers=self.headers,
+            json={**payload, "stream": True},
+            timeout=timeout or self.http.timeout,
+        ) as response:
+            if response.status_code != 200:
+                await response.aread()
+                raise HTTPException(status_code=response.status_code, detail="Error processing request")
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                delta = json.loads(data)["choices"][0].get("delta", {}).get("content")
+                if delta:
+                    yield delta
 
 class GroqClient(BaseLLMClient):
-    def __init__(self):
+    def __init__(self, model: str = "llama3-8b-8192", base_url: Optional[str] = None):
         self.api_key = os.getenv("GROQ_API_KEY")
-        self.base_url = "https://api.groq.com/openai/v1/chat/completions"
+        self.model = model
+        self.base_url = (base_url or os.getenv("GROQ_BASE_URL", "https://api.groq.com/openai/v1")) + "/chat/completions"
         self.headers = {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {self.api_key}"
         }
-    
-    async def get_response(self, query: str, context: str) -> str:
+        self.timeout = httpx.Timeout(
+            connect=_env_float("LLM_CONNECT_TIMEOUT", 5.0),
+            read=_env_float("GROQ_READ_TIMEOUT", 20.0),
+            write=_env_float("LLM_WRITE_TIMEOUT", 10.0),
+            pool=_env_float("LLM_POOL_TIMEOUT", 5.0),
+        )
+
+    def _build_payload(self, query: str, context: str) -> Dict:
         messages = [
             {
                 "role": "system",
@@ -36,74 +128,96 @@ class GroqClient(BaseLLMClient):
                 "content": query
             }
         ]
+        return {
+            "model": self.model,
+            "messages": messages,
+            "temperature": 0.3
+        }
+    
+    async def get_response(self, query: str, context: str, json_mode: bool = False) -> str:
+        response = await self.http.post(
+            self.base_url,
+            headers=self.headers,
+            json=self._json_payload(self._build_payload(query, context), json_mode),
+            timeout=self.timeout
+        )
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                self.base_url,
-                headers=self.headers,
-                json={
-                    "model": "llama3-8b-8192",
-                    "messages": messages,
-                    "temperature": 0.3
-                }
-            )
+        if response.status_code != 200:
+            raise HTTPException(status_code=response.status_code, detail="Error processing request")
             
-            if response.status_code != 200:
-                raise HTTPException(status_code=response.status_code, detail="Error processing request")
-                
-            return response.json()["choices"][0]["message"]["content"]
+        return response.json()["choices"][0]["message"]["content"]
+
+    async def stream_response(self, query: str, context: str) -> AsyncIterator[str]:
+        async for delta in self._stream_completion(self._build_payload(query, context), self.timeout):
+            yield delta
 
 class GPT4Client(BaseLLMClient):
     def __init__(self):
         self.api_key = os.getenv("OPENAI_API_KEY")
-        self.base_url = "https://api.openai.com/v1/chat/completions"
+        self.model = "gpt-4-turbo-preview"
+        self.base_url = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1") + "/chat/completions"
         self.headers = {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {self.api_key}"
         }
+        self.timeout = httpx.Timeout(
+            connect=_env_float("LLM_CONNECT_TIMEOUT", 5.0),
+            read=_env_float("OPENAI_READ_TIMEOUT", 30.0),
+            write=_env_float("LLM_WRITE_TIMEOUT", 10.0),
+            pool=_env_float("LLM_POOL_TIMEOUT", 5.0),
+        )
+
+    def _build_payload(self, query: str, context: str) -> Dict:
+        messages = [
+            {
+                "role": "system",
+                "content": (
+                    "Anda adalah asisten kesehatan premium yang berfokus pada kesejahteraan fisik dan mental. "
+                    "Spesialisasi anda mencakup:\n"
+                    "1. Kesehatan mental dan manajemen stress\n"
+                    "2. Pemantauan kesehatan real-time dan gaya hidup sehat\n"
+                    "3. Pencegahan penyakit dan perawatan kesehatan preventif\n"
+                    "4. Panduan aktivitas fisik dan nutrisi\n\n"
+                    "Berikan jawaban komprehensif dalam Bahasa Indonesia yang mudah dipahami. "
+                    "Gunakan konteks dokumen sebagai referensi utama dan tambahkan wawasan medis "
+                    "terkini jika relevan.\n\n"
+                    f"Konteks: {context}"
+                )
+            },
+            {
+                "role": "user",
+                "content": query
+            }
+        ]
+        return {
+            "model": self.model,
+            "messages": messages,
+            "temperature": 0.3
+        }
     
-    async def get_response(self, query: str, context: str) -> str:
+    async def get_response(self, query: str, context: str, json_mode: bool = False) -> str:
         try:
-            messages = [
-                {
-                    "role": "system",
-                    "content": (
-                        "Anda adalah asisten kesehatan premium yang berfokus pada kesejahteraan fisik dan mental. "
-                        "Spesialisasi anda mencakup:\n"
-                        "1. Kesehatan mental dan manajemen stress\n"
-                        "2. Pemantauan kesehatan real-time dan gaya hidup sehat\n"
-                        "3. Pencegahan penyakit dan perawatan kesehatan preventif\n"
-                        "4. Panduan aktivitas fisik dan nutrisi\n\n"
-                        "Berikan jawaban komprehensif dalam Bahasa Indonesia yang mudah dipahami. "
-                        "Gunakan konteks dokumen sebagai referensi utama dan tambahkan wawasan medis "
-                        "terkini jika relevan.\n\n"
-                        f"Konteks: {context}"
-                    )
-                },
-                {
-                    "role": "user",
-                    "content": query
-                }
-            ]
+            response = await self.http.post(
+                self.base_url,
+                headers=self.headers,
+                json=self._json_payload(self._build_payload(query, context), json_mode),
+                timeout=self.timeout
+            )
             
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    self.base_url,
-                    headers=self.headers,
-                    json={
-                        "model": "gpt-4-turbo-preview",
-                        "messages": messages,
-                        "temperature": 0.3
-                    },
-                    timeout=30.0
-                )
+            if response.status_code != 200:
+                error_detail = response.json().get('error', {}).get('message', 'Unknown error')
+                print(f"OpenAI API Error: {error_detail}")
+                raise HTTPException(status_code=response.status_code, detail=f"OpenAI API Error: {error_detail}")
                 
-                if response.status_code != 200:
-                    error_detail = response.json().get('error', {}).get('message', 'Unknown error')
-                    print(f"OpenAI API Error: {error_detail}")
-                    raise HTTPException(status_code=response.status_code, detail=f"OpenAI API Error: {error_detail}")
-                    
-                return response.json()["choices"][0]["message"]["content"]
+            return response.json()["choices"][0]["message"]["content"]
+        except Exception as e:
+            print(f"GPT4Client Error: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"Error processing request: {str(e)}")
+
+    async def stream_response(self, query: str, context: str) -> AsyncIterator[str]:
+        try:
+            async for delta in self._stream_completion(self._build_payload(query, context), self.timeout):
+                yield delta
         except Exception as e:
             print(f"GPT4Client Error: {str(e)}")
             raise HTTPException(status_code=500, detail=f"Error processing request: {str(e)}")
@@ -0,0 +1,288 @@
+import asyncio
+import os
+import time
+from collections import deque
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+import httpx
+from fastapi import HTTPException
+
+import telemetry
+from admission import AdmissionController
+from llm_clients import BaseLLMClient, GPT4Client, GroqClient
+
+
+def is_provider_fault(error: BaseException) -> bool:
+    """Whether ``error`` says the provider is unhealthy (5xx, timeout, connection
+    error) rather than that it rejected this request (4xx, e.g. json_mode)."""
+    if isinstance(error, HTTPException):
+        return error.status_code >= 500
+    return isinstance(error, (httpx.TransportError, asyncio.TimeoutError))
+
+
+class ProviderState:
+    """Latency/error tracking and circuit breaker for one provider.
+
+    The breaker opens after ``failure_threshold`` consecutive failures or
+    when the error-rate EWMA exceeds ``error_rate_threshold``; after
+    ``open_seconds`` a single half-open trial request decides whether it
+    closes again. Only provider faults (``is_provider_fault``) count as
+    failures.
+    """
+
+    def __init__(self, name: str, client: BaseLLMClient, initial_latency: float = 2.0,
+                 failure_threshold: int = 5, error_rate_threshold: float = 0.5,
+                 open_seconds: float = 30.0, alpha: float = 0.2):
+        self.name = name
+        self.client = client
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.error_rate_threshold = error_rate_threshold
+        self.open_seconds = open_seconds
+        self.ewma_latency = initial_latency
+        self.error_rate = 0.0
+        self.latencies = deque(maxlen=200)
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_inflight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.open_seconds else "open"
+
+    def available(self) -> bool:
+        state = self.state
+        return state == "closed" or (state == "half-open" and not self.trial_inflight)
+
+    def begin(self):
+        self.requests += 1
+        if self.opened_at is not None:
+            self.trial_inflight = True
+
+    def release(self):
+        """Request abandoned (lost a hedge race or caller went away)."""
+        self.trial_inflight = False
+
+    def record_success(self, latency: Optional[float]):
+        if latency is not None:
+            self.latencies.append(latency)
+            self.ewma_latency += self.alpha * (latency - self.ewma_latency)
+        self.error_rate *= 1 - self.alpha
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trial_inflight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.consecutive_failures += 1
+        self.error_rate += self.alpha * (1 - self.error_rate)
+        self.trial_inflight = False
+        if (self.opened_at is not None
+                or self.consecutive_failures >= self.failure_threshold
+                or (self.requests >= 10 and self.error_rate > self.error_rate_threshold)):
+            self.opened_at = time.monotonic()
+
+    def quantile(self, q: float) -> float:
+        if len(self.latencies) < 20:
+            return self.ewma_latency * 2
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+    def stats(self) -> Dict:
+        return {
+            "state": self.state,
+            "requests": self.requests,
+            "failures": self.failures,
+            "error_rate_ewma": round(self.error_rate, 4),
+            "latency_ewma_ms": round(self.ewma_latency * 1000, 1),
+            "latency_p95_ms": round(self.quantile(0.95) * 1000, 1),
+        }
+
+
+class LLMRouter(BaseLLMClient):
+    """Routes one tier's requests over its providers, in preference order.
+
+    The first available provider gets the request. If it has not answered
+    after its observed p95 latency (clamped to ``[min_hedge_delay,
+    max_hedge_delay]``), the same request is hedged to the next available
+    provider and whichever answers first wins; the other call is cancelled.
+    A failure falls back to the next provider immediately; so does a 4xx,
+    which another provider may accept, but it does not count against the
+    breaker. Providers whose breaker is open are skipped, so a degraded one
+    stops taking slots.
+
+    Only providers the tier is entitled to belong in a router: the free tier
+    never hedges onto the premium model.
+
+    With an ``admission`` controller each request (hedges and fallbacks
+    included) first holds one of its provider-call slots, queued by the
+    caller's tier.
+    """
+
+    def __init__(self, providers: List[ProviderState], name: str = "", hedge_quantile: float = 0.95,
+                 min_hedge_delay: float = 0.5, max_hedge_delay: float = 10.0,
+                 admission: Optional[AdmissionController] = None):
+        self.providers = providers
+        self.name = name
+        self.admission = admission
+        self.hedge_quantile = hedge_quantile
+        self.min_hedge_delay = min_hedge_delay
+        self.max_hedge_delay = max_hedge_delay
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.fallbacks = 0
+
+    def hedge_delay(self, state: ProviderState) -> float:
+        return min(self.max_hedge_delay, max(self.min_hedge_delay, state.quantile(self.hedge_quantile)))
+
+    async def _call(self, state: ProviderState, query: str, context: str, json_mode: bool = False) -> str:
+        state.begin()
+        started = time.perf_counter()
+        try:
+            response = await state.client.get_response(query, context, json_mode)
+        except asyncio.CancelledError:
+            state.release()
+            raise
+        except Exception as e:
+            if is_provider_fault(e):
+                state.record_failure()
+            else:
+                state.release()
+            telemetry.LLM_LATENCY.observe(time.perf_counter() - started, self.name, state.name, "error")
+            raise
+        elapsed = time.perf_counter() - started
+        state.record_success(elapsed)
+        telemetry.LLM_LATENCY.observe(elapsed, self.name, state.name, "ok")
+        return response
+
+    def _event(self, event: str):
+        telemetry.LLM_EVENTS.inc(self.name, event)
+
+    def _candidates(self) -> List[ProviderState]:
+        candidates = [state for state in self.providers if state.available()]
+        if not candidates:
+            raise HTTPException(status_code=503, detail="All LLM providers are temporarily unavailable")
+        return candidates
+
+    async def get_response(self, query: str, context: str, json_mode: bool = False) -> str:
+        if self.admission is None:
+            return await self._route(query, context, json_mode)
+        async with self.admission.slot():
+            return await self._route(query, context, json_mode)
+
+    async def _route(self, query: str, context: str, json_mode: bool) -> str:
+        primary, *backups = self._candidates()
+        tasks = {asyncio.ensure_future(self._call(primary, query, context, json_mode)): primary}
+        timeout = self.hedge_delay(primary) if backups else None
+        error: Optional[BaseException] = None
+        hedged = False
+
+        try:
+            while tasks:
+                done, _ = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # Primary is slower than its p95: hedge to the next provider
+                    self.hedges += 1
+                    self._event("hedge")
+                    hedged = True
+                    state = backups.pop(0)
+                    tasks[asyncio.ensure_future(self._call(state, query, context, json_mode))] = state
+                    timeout = None
+                    continue
+
+                for task in done:
+                    state = tasks.pop(task)
+                    if task.exception() is None:
+                        if hedged and state is not primary:
+                            self.hedge_wins += 1
+                            self._event("hedge_win")
+                        return task.result()
+                    error = task.exception()
+                    print(f"LLM provider {state.name} failed: {error}")
+
+                if not tasks and backups:
+                    self.fallbacks += 1
+                    self._event("fallback")
+                    state = backups.pop(0)
+                    tasks[asyncio.ensure_future(self._call(state, query, context, json_mode))] = state
+                    timeout = None
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def stream_response(self, query: str, context: str) -> AsyncIterator[str]:
+        if self.admission is None:
+            async for delta in self._stream(query, context):
+                yield delta
+            return
+        async with self.admission.slot():
+            async for delta in self._stream(query, context):
+                yield delta
+
+    async def _stream(self, query: str, context: str) -> AsyncIterator[str]:
+        # A stream cannot be hedged once tokens are out, so only fall back
+        # when a provider fails before its first token.
+        error: Optional[BaseException] = None
+        for state in self._candidates():
+            if error is not None:
+                self.fallbacks += 1
+                self._event("fallback")
+            state.begin()
+            streamed = False
+            try:
+                async for delta in state.client.stream_response(query, context):
+                    streamed = True
+                    yield delta
+            except (GeneratorExit, asyncio.CancelledError):
+                # The consumer closed the stream, or its task was cancelled
+                # (an SSE client disconnecting): free a half-open trial
+                state.release()
+                raise
+            except Exception as e:
+                if is_provider_fault(e):
+                    state.record_failure()
+                else:
+                    state.release()
+                if streamed:
+                    raise
+                print(f"LLM provider {state.name} failed: {e}")
+                error = e
+                continue
+            state.record_success(None)
+            return
+        raise error
+
+    def stats(self) -> Dict:
+        return {
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "fallbacks": self.fallbacks,
+            "providers": {state.name: state.stats() for state in self.providers},
+        }
+
+
+def build_tier_routers(groq_client: GroqClient, gpt4_client: GPT4Client,
+                       free_name: str = "ITHAI-1.0", premium_name: str = "ITHAI-2.0",
+                       admission: Optional[AdmissionController] = None) -> Tuple[LLMRouter, LLMRouter]:
+    """Routers for ITHAI-1.0 (free) and ITHAI-2.0 (premium).
+
+    The free tier only ever uses Groq models: the default one plus, if
+    GROQ_FALLBACK_MODEL is set, a second Groq model to hedge/fall back to;
+    without it the free tier has nothing to hedge to, which is logged.
+    The premium tier prefers GPT-4 and hedges/falls back to Groq. Groq's
+    health state is shared by both tiers, and so is ``admission``.
+    """
+    groq = ProviderState("groq", groq_client, initial_latency=1.0)
+    free = [groq]
+    fallback_model = os.getenv("GROQ_FALLBACK_MODEL")
+    if fallback_model:
+        free.append(ProviderState(f"groq:{fallback_model}", GroqClient(fallback_model), initial_latency=1.0))
+    else:
+        print(f"GROQ_FALLBACK_MODEL not set: {free_name} has a single provider, so no hedging or fallback")
+    premium = [ProviderState("openai", gpt4_client, initial_latency=5.0), groq]
+    return LLMRouter(free, free_name, admission=admission), LLMRouter(premium, premium_name, admission=admission)
@@ -1,27 +1,75 @@
 from fastapi import FastAPI, HTTPException, Header
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+import json
 import os
-from typing import List, Optional, Dict
+import time
+from typing import AsyncIterator, List, Optional, Dict
 from pathlib import Path
-import PyPDF2
-import docx
 from dotenv import load_dotenv
-from serpapi import GoogleSearch
 import asyncio
+from contextlib import asynccontextmanager
 from models import HealthQuery, HealthResponse, ModelVersion
-from llm_clients import GroqClient, GPT4Client
+from llm_clients import BaseLLMClient, GroqClient, GPT4Client
+from llm_router import build_tier_routers
+from admission import FREE, PREMIUM, AdmissionController, current_tier
+from cache import AnswerCache
+from precompute import AnswerTable
+from retrieval.bm25 import BM25Index, snapshot_path
+from retrieval.chunking import make_chunker
+from retrieval.context import Passage, SectionedContext, build_context, context_budget
+from retrieval.dense import DenseIndex, HashedNgramEmbedder, dense_enabled, dense_path, hybrid_merge
+from retrieval.ingest import DEFAULT_STORE_PATH, iter_docx_paragraphs, iter_pdf_pages
+from retrieval.segments import DocumentIndex, Segment
+from retrieval.store import ChunkStore
+from retrieval.text import count_tokens, defer_encoding, load_encoding
+from retrieval.web_index import WebSnippetIndex
+from search_service import SearchService
+from intents import IntentClassifier
+from warmup import PROCESS_STARTED, Warmup
+from reloader import DocumentReloader
+from jobs import FINISHED, JobQueue
+from profiling import Profiler, ProfilingMiddleware
+import telemetry
+from telemetry import span
 from expert_system.knowledge_base import KnowledgeBase
-from expert_system.inference_engine import InferenceEngine
+from expert_system.inference_engine import InferenceEngine, InteractiveDiagnosis
+from expert_system.sessions import SessionStore
 from pydantic import BaseModel
-import re  # Add this import at the top
 
 
 load_dotenv()
-print("Loaded API Keys:")
-print(f"Required API Key: {os.getenv('API_KEY_REQUIRED')}")
-print(f"Premium API Key: {os.getenv('PREMIUM_API_KEY')}")
+print(f"API keys configured: required={bool(os.getenv('API_KEY_REQUIRED'))}, premium={bool(os.getenv('PREMIUM_API_KEY'))}")
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await BaseLLMClient.open_http_client()
+    profiler.start()
+    # Indexes and caches load in the background while the server already
+    # answers; STARTUP_WARMUP=blocking holds traffic until they are loaded
+    warmup.start()
+    if os.getenv("STARTUP_WARMUP") == "blocking":
+        await warmup.wait()
+    # New and changed documents are picked up once the store has loaded
+    reloader.start(after=warmup.task)
+    jobs.start(after=warmup.task)
+    yield
+    await jobs.stop()
+    await reloader.stop()
+    await warmup.stop()
+    await BaseLLMClient.close_http_client()
+    await search_service.close()
+    profiler.stop()
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(telemetry.TelemetryMiddleware)
+
+# Opt-in profiling (PROFILING=1) and event-loop stall logging (LOOP_BLOCK_MS);
+# the middleware is not installed at all otherwise
+profiler = Profiler.from_env()
+if profiler.enabled:
+    app.add_middleware(ProfilingMiddleware, profiler=profiler)
 
 # CORS setup
 app.add_middleware(
@@ -33,37 +81,21 @@ app.add_middleware(
 )
 
 class SearchEngine:
-    def __init__(self):
+    def __init__(self, search_service: SearchService):
         self.max_results = 5
-        self.api_keys = [
-            os.getenv("SERPAPI_KEY_1", ""),
-        ]
-        self.current_key_index = 0
-    
-    def _get_next_api_key(self):
-        self.current_key_index = (self.current_key_index + 1) % len(self.api_keys)
-        return self.api_keys[self.current_key_index]
+        self.search_service = search_service
 
     async def search(self, query: str) -> List[Dict[str, str]]:
         try:
-            params = {
-                "engine": "google",
-                "q": query,
-                "api_key": self._get_next_api_key(),
-                "num": self.max_results,
-                "gl": "id",  # Set region to Indonesia
-                "hl": "id"   # Set language to Indonesian
-            }
-            
-            loop = asyncio.get_event_loop()
-            search = await loop.run_in_executor(None, lambda: GoogleSearch(params).get_dict())
-            
-            if "error" in search:
-                print(f"Search error: {search['error']}")
-                return []
+            organic_results = await self.search_service.organic_results(
+                query,
+                self.max_results,
+                gl="id",  # Set region to Indonesia
+                hl="id"   # Set language to Indonesian
+            )
             
             results = []
-            for result in search.get("organic_results", [])[:self.max_results]:
+            for result in organic_results:
                 results.append({
                     "title": result.get("title", ""),
                     "body": result.get("snippet", ""),
@@ -78,165 +110,343 @@ class SearchEngine:
         formatted_results = "\n".join([f"{result['title']}\n{result['body']}\n{result['link']}" for result in results])
         return formatted_results
 
+NO_CONTEXT_ANSWER = "Maaf, informasi yang Anda tanyakan tidak tersedia dalam dokumen referensi kami maupun sumber online."
+
+async def _single_delta(text: str) -> AsyncIterator[str]:
+    yield text
+
 class HealthKnowledgeBase:
-    def __init__(self):
-        self.knowledge = []
-        self.sources = {}
-        self.search_engine = SearchEngine()
+    def __init__(self, search_service: Optional[SearchService] = None,
+                 admission: Optional[AdmissionController] = None):
+        # Swapped as a whole on reload; a request reads one DocumentIndex throughout
+        self.documents = DocumentIndex()
+        # Optional dense retrieval (DENSE_RETRIEVAL=1, needs numpy), fused with BM25
+        self.embedder = HashedNgramEmbedder() if dense_enabled() else None
+        self.dense_quantize = os.getenv("DENSE_QUANTIZE") == "int8"
+        self.answer_cache = AnswerCache.from_env()
+        # Answers to the most frequent questions, mined offline by ``python -m precompute``
+        self.answer_table = AnswerTable.from_env()
+        self.intents = IntentClassifier(min_confidence=float(os.getenv("INTENT_MIN_CONFIDENCE", 0.75)))
+        self.search_engine = SearchEngine(search_service or SearchService.from_env())
+        # Web results from earlier questions, searched before paying for SerpAPI again
+        self.web_index = WebSnippetIndex.from_env()
         self.groq_client = GroqClient()
         self.gpt4_client = GPT4Client()
+        self.free_router, self.premium_router = build_tier_routers(
+            self.groq_client, self.gpt4_client, admission=admission
+        )
+        # Retrieved context is packed into a token budget per tier; a router's
+        # budget must fit every model it may hedge or fall back to
+        self.context_budgets = {
+            ModelVersion.ITHAI_1: self._router_budget(self.free_router),
+            ModelVersion.ITHAI_2: self._router_budget(self.premium_router),
+        }
+        self.retrieval_candidates = int(os.getenv("RETRIEVAL_CANDIDATES", 8))
+        self.min_score_ratio = float(os.getenv("RETRIEVAL_MIN_SCORE_RATIO", 0.6))
+        # Best BM25 score at which documents answer alone (strong), or still
+        # count next to web results (min); web results merged with weak hits
+        # must arrive within WEB_SEARCH_DEADLINE seconds
+        self.local_strong_score = float(os.getenv("LOCAL_STRONG_SCORE", 8.0))
+        self.local_min_score = float(os.getenv("LOCAL_MIN_SCORE", 3.0))
+        # With dense retrieval, a chunk at least this cosine-similar also
+        # counts: paraphrases share few exact terms with the question
+        self.local_min_dense = float(os.getenv("LOCAL_MIN_DENSE", 0.25))
+        self.web_search_deadline = float(os.getenv("WEB_SEARCH_DEADLINE", 1.5))
+        # Start the web search alongside retrieval when the predicted score
+        # (BM25 upper bound x observed top/bound ratio) is weak
+        self.speculative_search = os.getenv("SPECULATIVE_SEARCH", "1") != "0"
+        self.score_ratio = 0.6
+        # CHUNKING=sentences: token-sized sentence chunks with overlap (CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS)
+        self.chunker = make_chunker(
+            os.getenv("CHUNKING", "words"),
+            max_tokens=int(os.getenv("CHUNK_TOKENS", 256)),
+            overlap_tokens=int(os.getenv("CHUNK_OVERLAP_TOKENS", 48))
+        )
+        # Only the platform sections a conversational query touches are sent (PLATFORM_CONTEXT=full sends all)
+        self.platform_context = SectionedContext(WEBSITE_CONTEXT)
+        self.full_platform_context = os.getenv("PLATFORM_CONTEXT") == "full"
+
+    @staticmethod
+    def _router_budget(router) -> int:
+        return min(context_budget(state.client.model) for state in router.providers)
         
     def load_pdf(self, pdf_path: str):
         pdf_name = Path(pdf_path).name
-        with open(pdf_path, 'rb') as file:
-            reader = PyPDF2.PdfReader(file)
-            text = ""
-            for page in reader.pages:
-                text += page.extract_text() + "\n"
-            
-            chunks = self._chunk_text(text)
-            for chunk in chunks:
-                self.knowledge.append(chunk)
-                self.sources[chunk] = f"Document: {pdf_name}"
+        self._add_chunks([chunk for _, _, chunk in self.chunker(iter_pdf_pages(pdf_path))], f"Document: {pdf_name}")
     
     def load_docx(self, docx_path: str):
         doc_name = Path(docx_path).name
-        doc = docx.Document(docx_path)
-        text = "\n".join([paragraph.text for paragraph in doc.paragraphs])
-        
-        chunks = self._chunk_text(text)
-        for chunk in chunks:
-            self.knowledge.append(chunk)
-            self.sources[chunk] = f"Document: {doc_name}"
+        self._add_chunks([chunk for _, _, chunk in self.chunker(iter_docx_paragraphs(docx_path))], f"Document: {doc_name}")
+
+    def load_store(self, store_path: str, progress=None):
+        """Load chunks pre-extracted by `python -m retrieval.ingest` (read-only).
+
+        The BM25 index is memory-mapped from its snapshot next to the store
+        when one matches the store's contents, so workers share it; otherwise
+        it is built from the stored tokens and the snapshot is (re)written.
+        Everything is built aside as one segment and swapped in at the end,
+        so searches running meanwhile see either the old documents or the
+        new ones. Later changes are read by ``DocumentReloader``.
+        """
+        store = ChunkStore(store_path, read_only=True)
+        try:
+            signature = store.signature()
+            use_snapshot = os.getenv("BM25_SNAPSHOT", "1") != "0"
+            index = BM25Index.load(snapshot_path(store_path), signature) if use_snapshot else None
+            mapped = index is not None
+            report = (lambda **detail: progress(**detail, of=signature[0])) if progress is not None else None
+            segment = Segment.read(store, index=index, progress=report)
+        finally:
+            store.close()
+        if use_snapshot and not mapped:
+            try:
+                segment.index.save(snapshot_path(store_path), signature)
+            except OSError as e:
+                print(f"Could not write BM25 snapshot: {e}")
+        if self.embedder is not None:
+            # Prebuilt by `python -m retrieval.ingest --dense`; memory-mapped.
+            # A matrix from before a later ingest would map rows to the wrong
+            # chunks, so then it is built here, before the first search
+            dense = DenseIndex.load(dense_path(store_path), signature)
+            if dense is not None:
+                self.embedder.idf = dense.idf
+                segment.dense = dense
+        documents = DocumentIndex([segment])
+        if self.embedder is not None:
+            documents.build_dense(self.embedder, self.dense_quantize)
+        self.documents = documents
+        if progress is not None:
+            progress(chunks=len(segment), of=signature[0], bm25="mmap" if mapped else "built")
+
+    def _add_chunks(self, chunks: List[str], source: str):
+        documents = self.documents
+        segment = Segment.pinned_chunks(chunks, source)
+        self.documents = DocumentIndex(documents.segments + (segment,), documents.dead + (frozenset(),))
     
-    def _chunk_text(self, text: str, chunk_size: int = 1000):
-        words = text.split()
-        chunks = []
-        current_chunk = []
-        current_size = 0
+    def _chunk_text(self, text: str):
+        return [chunk for _, _, chunk in self.chunker([text])]
+    
+    def find_relevant_context(self, query: str, token_budget: Optional[int] = None) -> tuple[str, List[str]]:
+        """Best passages for ``query``, deduped and packed into ``token_budget`` tokens"""
+        if token_budget is None:
+            token_budget = self.context_budgets[ModelVersion.ITHAI_1]
+        documents = self.documents
+        ranked, _, _ = self._rank(documents, query)
+        context, sources, _ = self._document_context(documents, ranked, token_budget)
+        return context, sources
+
+    def _rank(self, documents: DocumentIndex, query: str) -> tuple[List[tuple[int, float]], float, float]:
+        """Ranked chunk ids for ``query``, and how well the documents cover it:
+        the best BM25 score and the best dense cosine (0 without dense retrieval)"""
+        lexical = documents.search(query, 50 if self.embedder is not None else self.retrieval_candidates)
+        if self.embedder is None:
+            return lexical, lexical[0][1] if lexical else 0.0, 0.0
+        dense = documents.dense_search(self.embedder, query, 50, quantize=self.dense_quantize)
+        ranked = self._hybrid_search(query, self.retrieval_candidates, lexical, dense)
+        return ranked, lexical[0][1] if lexical else 0.0, dense[0][1] if dense else 0.0
+
+    def _document_context(self, documents: DocumentIndex, ranked: List[tuple[int, float]], budget: int) -> tuple[str, List[str], int]:
+        # Only the top candidates' text is decoded
+        passages = []
+        for doc_id, score in ranked:
+            chunk = documents[doc_id]
+            passages.append(Passage(chunk.text, chunk.source, score))
         
-        for word in words:
-            if current_size + len(word) > chunk_size:
-                chunks.append(" ".join(current_chunk))
-                current_chunk = [word]
-                current_size = len(word)
+        context, sources, tokens = build_context(passages, budget, self.min_score_ratio)
+        if context:
+            telemetry.CONTEXT_TOKENS.observe(tokens, "documents")
+        return context, sources, tokens
+
+    def _hybrid_search(self, query: str, k: int, lexical: List[tuple[int, float]], dense: List[tuple[int, float]]) -> List[tuple[int, float]]:
+        return hybrid_merge(
+            lexical,
+            dense,
+            k,
+            dense_weight=float(os.getenv("DENSE_WEIGHT", 0.5))
+        )
+
+    async def _resolve_context(self, query: str, model_version: ModelVersion) -> tuple[Optional[BaseLLMClient], str, List[str], bool]:
+        """Pick the client and prompt context for a web-search-enabled query, without calling the LLM.
+
+        Documents scoring at least local_strong_score answer alone. Weaker
+        hits (down to local_min_score, or a dense cosine of local_min_dense)
+        are merged with web results that arrive within web_search_deadline
+        of the start; with no usable document hit the web results are
+        awaited. When the predicted document score is weak, the web search
+        starts alongside retrieval instead of after it, and is cancelled if
+        strong hits come back.
+        """
+        # Determine if using premium model
+        is_premium = model_version == ModelVersion.ITHAI_2
+        client = self.premium_router if is_premium else self.free_router
+        budget = self.context_budgets[model_version]
+        started = time.perf_counter()
+        
+        search = None
+        documents = self.documents
+        bound = documents.score_bound(query)
+        if self.speculative_search and bound * self.score_ratio < self.local_strong_score:
+            search = asyncio.ensure_future(self._web_results(query))
+        
+        with span("retrieval"):
+            if search is not None:
+                # In a thread, so the search request goes out meanwhile
+                ranked, top_score, dense_score = await asyncio.to_thread(self._rank, documents, query)
             else:
-                current_chunk.append(word)
-                current_size += len(word) + 1
-                
-        if current_chunk:
-            chunks.append(" ".join(current_chunk))
-            
-        return chunks
-    
-    def find_relevant_context(self, query: str, max_chunks: int = 2) -> tuple[str, List[str]]:
-        relevant_chunks = []
-        sources = []
+                ranked, top_score, dense_score = self._rank(documents, query)
+        if bound > 0:
+            self.score_ratio += 0.1 * (top_score / bound - self.score_ratio)
         
-        query_words = set(query.lower().split())
-        scored_chunks = []
+        if top_score >= self.local_strong_score:
+            if search is not None:
+                search.cancel()
+            plan = "local_cancelled" if search is not None else "local"
+            telemetry.CONTEXT_PLANS.inc(plan)
+            telemetry.set_attribute("context_plan", plan)
+            context, sources, _ = self._document_context(documents, ranked, budget)
+            return client, context, sources, True
         
-        for chunk in self.knowledge:
-            chunk_words = set(chunk.lower().split())
-            score = len(query_words.intersection(chunk_words))
-            if score > 0:
-                scored_chunks.append((score, chunk))
+        if search is None:
+            search = asyncio.ensure_future(self._web_results(query))
+        doc_context, doc_sources, doc_tokens = "", [], 0
+        if top_score >= self.local_min_score or (self.embedder is not None and dense_score >= self.local_min_dense):
+            doc_context, doc_sources, doc_tokens = self._document_context(documents, ranked, budget)
         
-        scored_chunks.sort(reverse=True)
+        # With documents to fall back on, web results only count if they make
+        # the deadline; a late search keeps running and still fills the caches
+        timeout = max(0.0, self.web_search_deadline - (time.perf_counter() - started)) if doc_context else None
+        with span("web_wait"):
+            done, _ = await asyncio.wait({search}, timeout=timeout)
+        search_results = search.result() if done else []
         
-        for _, chunk in scored_chunks[:max_chunks]:
-            relevant_chunks.append(chunk)
-            sources.append(self.sources[chunk])
-            
-        return "\n".join(relevant_chunks), list(set(sources))
+        web_context, web_sources = "", []
+        if search_results:
+            passages = [
+                Passage(self.search_engine.format_results([result]), f"Web: {result['link']}")
+                for result in search_results
+            ]
+            web_context, web_sources, tokens = build_context(passages, budget - doc_tokens)
+            telemetry.CONTEXT_TOKENS.observe(tokens, "web")
+        
+        plan = "merged" if doc_context and web_context else "local_deadline" if doc_context else "web" if web_context else "none"
+        telemetry.CONTEXT_PLANS.inc(plan)
+        telemetry.set_attribute("context_plan", plan)
+        if not doc_context and not web_context:
+            # If no context available from either source
+            return None, "", [], False
+        context = "\n".join(part for part in (doc_context, web_context) if part)
+        return client, context, doc_sources + web_sources, bool(doc_context)
+
+    async def _web_results(self, query: str) -> List[Dict[str, str]]:
+        """Web results for ``query``: snippets already fetched for a similar
+        question, else a new search (whose results are kept)"""
+        if self.web_index is not None:
+            with span("web_index"):
+                results = [result for result, _ in self.web_index.search(query, self.search_engine.max_results)]
+            if results:
+                return results
+        with span("web_search"):
+            results = await self.search_engine.search(query + " kesehatan ibu hamil indonesia")
+        if results and self.web_index is not None:
+            self.web_index.add(results)
+        return results
 
     async def get_answer(self, query: str, model_version: ModelVersion, use_web_search: bool) -> tuple[str, List[str], bool]:
+        precomputed = self._precomputed(query, model_version, use_web_search)
+        if precomputed is not None:
+            return precomputed.answer, precomputed.sources, precomputed.is_document_based
+
         # If web search is disabled, use conversational mode
         if not use_web_search:
             return await self.get_conversational_response(query)
             
         # Otherwise, proceed with normal search-enabled response
-        # Get document context first
-        doc_context, doc_sources = self.find_relevant_context(query)
-        
-        # Determine if using premium model
-        is_premium = model_version == ModelVersion.ITHAI_2
-        client = self.gpt4_client if is_premium else self.groq_client
+        client, context, sources, is_document_based = await self._resolve_context(query, model_version)
+        if client is None:
+            return NO_CONTEXT_ANSWER, [], False
         
-        # If we have relevant document context, use only that
-        if doc_context.strip():
-            response = await client.get_response(query, doc_context)
-            return response, doc_sources, True
-        
-        # If no document context, try search engine for all users
-        search_results = await self.search_engine.search(query + " kesehatan ibu hamil indonesia")
-        if search_results:
-            search_context = self.search_engine.format_results(search_results)
-            response = await client.get_response(query, search_context)
-            sources = [f"Web: {result['link']}" for result in search_results]
-            return response, sources, False
+        response = await self._cached_response(client, query, context, model_version, use_web_search)
+        return response, sources, is_document_based
+
+    async def stream_answer(self, query: str, model_version: ModelVersion, use_web_search: bool) -> tuple[List[str], bool, AsyncIterator[str]]:
+        """Like get_answer, but returns sources up front and the answer as text deltas"""
+        precomputed = self._precomputed(query, model_version, use_web_search)
+        if precomputed is not None:
+            return precomputed.sources, precomputed.is_document_based, _single_delta(precomputed.answer)
+
+        if not use_web_search:
+            context = self._conversation_context(query)
+            return [], False, await self._cached_stream(self.free_router, query, context, ModelVersion.ITHAI_1, False)
         
-        # If no context available from either source
-        return "Maaf, informasi yang Anda tanyakan tidak tersedia dalam dokumen referensi kami maupun sumber online.", [], False
-
-    # Add this new method
-    async def get_basic_response(self, query: str, context: str) -> str:
-        """Handle basic conversations without web search"""
-        is_greeting = bool(re.search(r'^hi\b|^hello\b|^hay\b|^halo\b', query.lower()))
-        is_thanks = bool(re.search(r'thank|thanks|terima kasih', query.lower()))
-        is_goodbye = bool(re.search(r'bye|goodbye|sampai jumpa', query.lower()))
+        client, context, sources, is_document_based = await self._resolve_context(query, model_version)
+        if client is None:
+            return [], False, _single_delta(NO_CONTEXT_ANSWER)
+        return sources, is_document_based, await self._cached_stream(client, query, context, model_version, True)
+
+    def _precomputed(self, query: str, model_version: ModelVersion, use_web_search: bool):
+        if self.answer_table is None:
+            return None
+        # Only valid for the corpus it was computed against; stale after a reload
+        return self.answer_table.lookup(query, model_version.value, use_web_search, self.documents.version)
+
+    async def _cached_response(self, client: BaseLLMClient, query: str, context: str,
+                               model_version: ModelVersion, use_web_search: bool) -> str:
+        key = self.answer_cache.make_key(query, model_version.value, use_web_search, context)
+        cached = await self.answer_cache.get(key)
+        if cached is not None:
+            return cached
         
-        if is_greeting:
-            return ("Halo! Saya PregnaAI, asisten AI yang siap membantu Anda seputar kehamilan. "
-                   "Saya dapat memberikan informasi tentang kesehatan ibu hamil, memberikan saran nutrisi, "
-                   "dan menjawab pertanyaan umum seputar kehamilan. Apa yang ingin Anda ketahui?")
-        elif is_thanks:
-            return ("Sama-sama! Senang bisa membantu Anda. Jangan ragu untuk bertanya lagi jika "
-                   "Anda memiliki pertanyaan lain seputar kehamilan.")
-        elif is_goodbye:
-            return ("Sampai jumpa! Jaga kesehatan Anda dan bayi. Jangan lupa untuk rutin "
-                   "melakukan pemeriksaan dan mengisi DailyCheckup Anda.")
+        started = time.perf_counter()
+        with span("llm"):
+            response = await client.get_response(query, context)
+        await self.answer_cache.set(key, response, time.perf_counter() - started)
+        return response
+
+    async def _cached_stream(self, client: BaseLLMClient, query: str, context: str,
+                             model_version: ModelVersion, use_web_search: bool) -> AsyncIterator[str]:
+        key = self.answer_cache.make_key(query, model_version.value, use_web_search, context)
+        cached = await self.answer_cache.get(key)
+        if cached is not None:
+            return _single_delta(cached)
+        return self._stream_into_cache(key, client.stream_response(query, context))
+
+    async def _stream_into_cache(self, key: str, deltas: AsyncIterator[str]) -> AsyncIterator[str]:
+        started = time.perf_counter()
+        parts = []
+        async for delta in deltas:
+            parts.append(delta)
+            yield delta
+        # Only complete answers are cached; a failed stream raises before this
+        await self.answer_cache.set(key, "".join(parts), time.perf_counter() - started)
+
+    def get_basic_response(self, query: str) -> Optional[str]:
+        """Canned/templated reply for small talk, answered locally without an LLM call"""
+        intent = self.intents.classify(query)
+        if intent is None or intent.confidence < self.intents.min_confidence:
+            return None
+        telemetry.LOCAL_ANSWERS.inc(intent.name)
+        return self.intents.respond(intent)
+
+    def _conversation_context(self, query: str) -> str:
+        if self.full_platform_context:
+            context = self.platform_context.full
         else:
-            # Use the LLM for other basic responses
-            client = self.groq_client  # Using Groq for basic responses
-            return await client.get_response(query, context)
+            context = self.platform_context.for_query(query)
+        telemetry.CONTEXT_TOKENS.observe(count_tokens(context), "platform")
+        return context
 
     async def get_conversational_response(self, query: str) -> tuple[str, List[str], bool]:
         """Handle platform-focused conversations without web search"""
         # Use base Groq model for consistent responses
-        response = await self.groq_client.get_response(
+        response = await self._cached_response(
+            self.free_router,
             query,
-            WEBSITE_CONTEXT
+            self._conversation_context(query),
+            ModelVersion.ITHAI_1,
+            False
         )
         return response, [], False
 
-# Initialize knowledge base
-kb = HealthKnowledgeBase()
-pregnancy_kb = KnowledgeBase(lang='id', serpapi_key=os.getenv("SERPAPI_KEY_1"))
-expert_system = InferenceEngine(pregnancy_kb, kb.groq_client)  # Pass the LLM client
-
-# Initialize pregnancy knowledge base
-def initialize_pregnancy_kb():
-    # Add pregnancy-related symptoms
-    pregnancy_kb.add_symptom('nausea', {
-        'name': {'id': 'Mual', 'en': 'Nausea'},
-        'weight': 1.2,
-        'questions': {
-            'id': [
-                'Seberapa sering Anda merasa mual?',
-                'Apakah mual disertai muntah?'
-            ],
-            'en': [
-                'How often do you feel nauseous?',
-                'Is the nausea accompanied by vomiting?'
-            ]
-        }
-    })
-    # ...add other symptoms and conditions...
-
-# Initialize expert system on startup
-initialize_pregnancy_kb()
-
 WEBSITE_CONTEXT = """
 You are PregnaAI, a friendly and helpful AI assistant for pregnant mothers. You are part of a comprehensive pregnancy care platform that includes:
 
@@ -275,9 +485,66 @@ Conversation Guidelines:
 - Focus on being a helpful companion rather than a medical advisor
 """
 
-@app.post("/v1/health/chat", response_model=HealthResponse)
-async def health_chat(query: HealthQuery, x_api_key: str = Header(None)):
-    print(f"Received API Key: {x_api_key}")  # Debug log
+# Initialize knowledge base (empty; filled by the warm-up below)
+search_service = SearchService.from_env()
+# Per-key rate limits and premium-first provider slots, shared by both tiers
+admission = AdmissionController.from_env()
+kb = HealthKnowledgeBase(search_service, admission)
+pregnancy_kb = KnowledgeBase(lang='id', search_service=search_service)
+expert_system = InferenceEngine(
+    pregnancy_kb,
+    kb.free_router,  # Pass the LLM client
+    sessions=SessionStore.from_env(),
+    max_questions=int(os.getenv("DIAGNOSIS_MAX_QUESTIONS", 5))
+)
+
+def _warm_rules(report):
+    pregnancy_kb.load_rules()
+    expert_system.compile_rules()
+    report(rules=len(pregnancy_kb.rules))
+
+def _warm_documents(report):
+    if Path(DEFAULT_STORE_PATH).exists():
+        kb.load_store(DEFAULT_STORE_PATH, report)
+    else:
+        report(chunks=0)
+
+def _warm_tokenizer(report):
+    # Fetched over the network on a cold host; prompts are budgeted with the estimate until then
+    report(counts="exact" if load_encoding() is not None else "estimate")
+
+def _warm_answer_cache(report):
+    report(entries=kb.answer_cache.warm())
+
+def _warm_precomputed_answers(report):
+    if kb.answer_table is not None:
+        report(answers=kb.answer_table.load(), corpus_version=kb.answer_table.corpus_version)
+
+warmup = Warmup()
+warmup.add("rules", _warm_rules)
+warmup.add("documents", _warm_documents)
+warmup.add("answer_cache", _warm_answer_cache)
+warmup.add("precomputed_answers", _warm_precomputed_answers)
+warmup.add("tokenizer", _warm_tokenizer)
+defer_encoding()
+
+reloader = DocumentReloader.from_env(kb, DEFAULT_STORE_PATH)
+# Slow chat/diagnosis requests submitted as jobs; handlers are registered below
+jobs = JobQueue.from_env()
+
+def require_warm(*stages: str):
+    """503 + Retry-After while a stage the request needs is still loading"""
+    if not warmup.ready(*stages):
+        raise HTTPException(
+            status_code=503,
+            detail=f"Service is warming up ({', '.join(stages)}), please retry shortly",
+            headers={"Retry-After": "2"}
+        )
+
+
+
+def authorize_chat(query: HealthQuery, x_api_key: Optional[str]):
+    telemetry.set_attribute("version", query.version.value)
     
     required_key = os.getenv("API_KEY_REQUIRED")
     premium_key = os.getenv("PREMIUM_API_KEY")
@@ -295,64 +562,441 @@ async def health_chat(query: HealthQuery, x_api_key: str = Header(None)):
             detail="Access to ITHAI-2.0 requires a premium API key. Please upgrade or use ITHAI-1.0."
         )
     
-    try:
-        print(f"Processing query with version: {query.version}")  # Debug log
-        
-        # Check if it's a basic conversation
-        basic_patterns = [
-            r'^hi\b|^hello\b|^hay\b|^halo\b',
-            r'thank|thanks|terima kasih',
-            r'bye|goodbye|sampai jumpa',
-        ]
-        
-        is_basic = any(re.search(pattern, query.question.lower()) for pattern in basic_patterns)
-        
-        if is_basic and not query.useWebSearch:
-            # Use direct response without web search
-            response = await kb.get_basic_response(query.question, WEBSITE_CONTEXT)
-            return HealthResponse(
-                answer=response,
-                sources=[],
-                is_document_based=False,
-                version=query.version
-            )
-        
-        # Otherwise, proceed with normal search-enabled response
-        response, sources, is_document_based = await kb.get_answer(
-            query.question, 
-            query.version,
-            query.useWebSearch
-        )
-        
+    admission.check_rate(x_api_key, PREMIUM if x_api_key == premium_key else FREE)
+
+async def answer_chat(query: HealthQuery) -> HealthResponse:
+    # Small talk is answered locally, without retrieval or an LLM call
+    response = None if query.useWebSearch else kb.get_basic_response(query.question)
+    
+    if response is not None:
         return HealthResponse(
             answer=response,
-            sources=sources if query.useWebSearch else [],
-            is_document_based=is_document_based,
+            sources=[],
+            is_document_based=False,
             version=query.version
         )
+    
+    # Otherwise, proceed with normal search-enabled response
+    response, sources, is_document_based = await kb.get_answer(
+        query.question, 
+        query.version,
+        query.useWebSearch
+    )
+    
+    return HealthResponse(
+        answer=response,
+        sources=sources if query.useWebSearch else [],
+        is_document_based=is_document_based,
+        version=query.version
+    )
+
+@app.post("/v1/health/chat", response_model=HealthResponse)
+async def health_chat(query: HealthQuery, x_api_key: str = Header(None)):
+    authorize_chat(query, x_api_key)
+    if query.useWebSearch:
+        require_warm("documents")
+    
+    try:
+        print(f"Processing query with version: {query.version}")  # Debug log
+        return await answer_chat(query)
+    except HTTPException:
+        # 429 shed while queued for a provider slot, 503 providers down
+        raise
     except Exception as e:
         print(f"Error in health_chat: {str(e)}")  # Debug log
         raise HTTPException(status_code=500, detail=str(e))
 
+def _sse(event: str, data: Dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/v1/health/chat/stream")
+async def health_chat_stream(query: HealthQuery, x_api_key: str = Header(None)):
+    """Streaming /v1/health/chat as Server-Sent Events.
+
+    Emits one `meta` event (sources, is_document_based, version) before
+    generation starts, a `delta` event per text fragment, then `done` with a
+    summary, or `error` if the provider fails mid-stream.
+    """
+    authorize_chat(query, x_api_key)
+    if query.useWebSearch:
+        require_warm("documents")
+    started = time.perf_counter()
+    
+    try:
+        basic = None if query.useWebSearch else kb.get_basic_response(query.question)
+        if basic is not None:
+            sources, is_document_based = [], False
+            deltas = _single_delta(basic)
+        else:
+            sources, is_document_based, deltas = await kb.stream_answer(
+                query.question,
+                query.version,
+                query.useWebSearch
+            )
+    except HTTPException:
+        # 429 shed while queued for a provider slot, 503 providers down
+        raise
+    except Exception as e:
+        print(f"Error in health_chat_stream: {str(e)}")  # Debug log
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    async def events():
+        yield _sse("meta", {
+            "sources": sources if query.useWebSearch else [],
+            "is_document_based": is_document_based,
+            "version": query.version.value,
+        })
+        first_token_ms = None
+        answer_chars = 0
+        try:
+            async for delta in deltas:
+                if first_token_ms is None:
+                    first_token_ms = (time.perf_counter() - started) * 1000
+                answer_chars += len(delta)
+                yield _sse("delta", {"text": delta})
+        except Exception as e:
+            print(f"Error in health_chat_stream: {str(e)}")  # Debug log
+            error = {"detail": getattr(e, "detail", str(e))}
+            if isinstance(e, HTTPException):
+                # e.g. 429 when the request was shed while queued for a provider slot
+                error["status"] = e.status_code
+                if e.headers and "Retry-After" in e.headers:
+                    error["retry_after"] = int(e.headers["Retry-After"])
+            yield _sse("error", error)
+            return
+        yield _sse("done", {
+            "answer_chars": answer_chars,
+            "time_to_first_token_ms": round(first_token_ms or 0, 1),
+            "total_ms": round((time.perf_counter() - started) * 1000, 1),
+        })
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 class DiagnosisRequest(BaseModel):
     complaint: str
     answers: Optional[Dict[str, str]] = None
 
-@app.post("/v1/health/diagnose")
-async def diagnose_symptoms(request: DiagnosisRequest, x_api_key: str = Header(None)):
+class DiagnosisBatchRequest(BaseModel):
+    items: List[DiagnosisRequest]
+
+class DiagnosisSessionRequest(BaseModel):
+    complaint: str
+
+class DiagnosisAnswerRequest(BaseModel):
+    answer: str
+
+DIAGNOSE_BATCH_MAX_ITEMS = int(os.getenv("DIAGNOSE_BATCH_MAX_ITEMS", 100))
+DIAGNOSE_BATCH_CONCURRENCY = int(os.getenv("DIAGNOSE_BATCH_CONCURRENCY", 8))
+
+def authorize_premium(x_api_key: Optional[str]):
     premium_key = os.getenv("PREMIUM_API_KEY")
     if not x_api_key or x_api_key != premium_key:
         raise HTTPException(
             status_code=401, 
             detail="This endpoint requires a premium API key"
         )
+    admission.check_rate(x_api_key, PREMIUM)
+
+@app.post("/v1/health/diagnose")
+async def diagnose_symptoms(request: DiagnosisRequest, x_api_key: str = Header(None)):
+    authorize_premium(x_api_key)
+    require_warm("rules")
         
     try:
         diagnosis = await expert_system.diagnose(request.complaint, request.answers)
-        return diagnosis
+        return _diagnosis_payload(diagnosis)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/v1/health/diagnose/batch")
+async def diagnose_batch(request: DiagnosisBatchRequest, x_api_key: str = Header(None)):
+    """Diagnose many check-ins (e.g. from the clinic dashboard) in one request.
+
+    Items run concurrently, at most DIAGNOSE_BATCH_CONCURRENCY LLM calls at a
+    time; `results` follows the order of `items`, with `{"error": ...}` for an
+    item that failed.
+    """
+    authorize_premium(x_api_key)
+    require_warm("rules")
+    if len(request.items) > DIAGNOSE_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"A batch may contain at most {DIAGNOSE_BATCH_MAX_ITEMS} items"
+        )
+    results = await expert_system.diagnose_batch(
+        [item.model_dump() for item in request.items],
+        DIAGNOSE_BATCH_CONCURRENCY
+    )
+    return {"results": [_diagnosis_payload(result) for result in results]}
+
+def _diagnosis_payload(diagnosis):
+    if isinstance(diagnosis, InteractiveDiagnosis):
+        return diagnosis.to_dict(expert_system.max_questions)
+    return diagnosis
+
+@app.post("/v1/health/diagnose/session")
+async def start_diagnosis_session(request: DiagnosisSessionRequest, x_api_key: str = Header(None)):
+    """Start an interactive diagnosis: one adaptive question per round trip.
+
+    Returns `session_id` and `next_question`; answer it through
+    `/v1/health/diagnose/session/{session_id}/answer` until `completed` is
+    true. Scores are updated after every answer.
+    """
+    authorize_premium(x_api_key)
+    require_warm("rules")
+    try:
+        return _diagnosis_payload(await expert_system.start_session(request.complaint))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/v1/health/diagnose/session/{session_id}/answer")
+async def answer_diagnosis_session(session_id: str, request: DiagnosisAnswerRequest, x_api_key: str = Header(None)):
+    authorize_premium(x_api_key)
+    require_warm("rules")
+    diagnosis = await expert_system.answer_session(session_id, request.answer)
+    if diagnosis is None:
+        raise HTTPException(status_code=404, detail="Diagnosis session not found or expired")
+    return _diagnosis_payload(diagnosis)
+
+@app.get("/v1/health/diagnose/session/{session_id}")
+async def get_diagnosis_session(session_id: str, x_api_key: str = Header(None)):
+    authorize_premium(x_api_key)
+    diagnosis = await expert_system.sessions.get(session_id)
+    if diagnosis is None:
+        raise HTTPException(status_code=404, detail="Diagnosis session not found or expired")
+    return _diagnosis_payload(diagnosis)
+
+# Job mode: submit returns 202 and a job id at once; the result is polled
+# from /v1/jobs/{job_id} (?wait= long-polls) or followed as SSE
+
+async def _chat_job(payload: Dict):
+    return jsonable_encoder(await answer_chat(HealthQuery(**payload)))
+
+async def _diagnose_job(payload: Dict):
+    diagnosis = await expert_system.diagnose(payload["complaint"], payload.get("answers"))
+    return jsonable_encoder(_diagnosis_payload(diagnosis))
+
+jobs.register("chat", _chat_job)
+jobs.register("diagnose", _diagnose_job)
+
+JOB_MAX_WAIT = 30.0
+JOB_FOLLOW_SECONDS = 600.0
+
+def _job_response(job, created: bool) -> JSONResponse:
+    return JSONResponse(
+        job.to_dict(),
+        status_code=202 if created else 200,
+        headers={"Location": f"/v1/jobs/{job.id}"}
+    )
+
+@app.post("/v1/health/chat/jobs", status_code=202)
+async def submit_chat_job(query: HealthQuery, x_api_key: str = Header(None),
+                          idempotency_key: Optional[str] = Header(None), x_client_id: Optional[str] = Header(None)):
+    """/v1/health/chat as a background job.
+
+    Returns the job (202), or the job already created for the same
+    `Idempotency-Key` (200; 409 if its request differed). The key must be
+    unique, e.g. a UUID. Apps sharing an API key send their own
+    `X-Client-Id`; jobs and keys are scoped to it, and reading the job
+    needs the same header.
+    """
+    authorize_chat(query, x_api_key)
+    if query.useWebSearch:
+        require_warm("documents")
+    job, created = await jobs.submit("chat", jsonable_encoder(query), x_api_key, current_tier.get(),
+                                     idempotency_key, x_client_id)
+    return _job_response(job, created)
+
+@app.post("/v1/health/diagnose/jobs", status_code=202)
+async def submit_diagnosis_job(request: DiagnosisRequest, x_api_key: str = Header(None),
+                               idempotency_key: Optional[str] = Header(None), x_client_id: Optional[str] = Header(None)):
+    """/v1/health/diagnose as a background job; see /v1/health/chat/jobs"""
+    authorize_premium(x_api_key)
+    require_warm("rules")
+    job, created = await jobs.submit("diagnose", request.model_dump(), x_api_key, current_tier.get(),
+                                     idempotency_key, x_client_id)
+    return _job_response(job, created)
+
+def authorize_job(x_api_key: Optional[str]):
+    if not x_api_key or x_api_key not in (os.getenv("API_KEY_REQUIRED"), os.getenv("PREMIUM_API_KEY")):
+        raise HTTPException(status_code=401, detail="Missing or invalid API key")
+
+@app.get("/v1/jobs/{job_id}")
+async def get_job(job_id: str, wait: float = 0.0, x_api_key: str = Header(None),
+                  x_client_id: Optional[str] = Header(None)):
+    """The job's status, with `result` once succeeded or `error` once failed.
+
+    `wait` (seconds, at most 30) holds the request until the job changes.
+    """
+    authorize_job(x_api_key)
+    job = await jobs.wait(job_id, x_api_key, min(max(wait, 0.0), JOB_MAX_WAIT), x_client_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return job.to_dict()
+
+@app.get("/v1/jobs/{job_id}/events")
+async def follow_job(job_id: str, x_api_key: str = Header(None), x_client_id: Optional[str] = Header(None)):
+    """Server-Sent Events: a `status` event per change, then `done` with the finished job"""
+    authorize_job(x_api_key)
+    if await jobs.get(job_id, x_api_key, x_client_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+
+    async def events():
+        async for job in jobs.follow(job_id, x_api_key, JOB_FOLLOW_SECONDS, x_client_id):
+            yield _sse("done" if job.status in FINISHED else "status", job.to_dict())
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def _answer_cache_counts():
+    cache = kb.answer_cache
+    counts = {("hit_memory",): cache.hits_memory, ("hit_shared",): cache.hits_shared, ("miss",): cache.misses}
+    if kb.answer_table is not None:
+        counts[("hit_precomputed",)] = kb.answer_table.hits_exact + kb.answer_table.hits_similar
+    return counts
+
+def _search_counts():
+    return {
+        ("upstream",): search_service.upstream_calls,
+        ("cache_hit",): search_service.cache_hits,
+        ("coalesced",): search_service.coalesced,
+        ("web_index",): kb.web_index.hits if kb.web_index is not None else 0,
+    }
+
+telemetry.CallbackMetric(
+    "pregna_answer_cache_lookups_total", "Answer cache lookups by result",
+    _answer_cache_counts, ("result",), kind="counter"
+)
+telemetry.CallbackMetric(
+    "pregna_answer_cache_saved_seconds_total", "Provider latency avoided by answer cache hits",
+    lambda: {(): kb.answer_cache.saved_latency_seconds}, kind="counter"
+)
+telemetry.CallbackMetric(
+    "pregna_web_search_total", "Web search requests by how they were served",
+    _search_counts, ("result",), kind="counter"
+)
+
+telemetry.CallbackMetric(
+    "pregna_warmup_stage_ready", "1 once a start-up warm-up stage has completed",
+    lambda: {(name,): int(stage["status"] == "done") for name, stage in warmup.state.items()}, ("stage",)
+)
+
+telemetry.CallbackMetric(
+    "pregna_admission_inflight", "Provider calls holding an admission slot, by tier",
+    lambda: {(name,): tier.inflight for name, tier in admission.tiers.items()}, ("tier",)
+)
+telemetry.CallbackMetric(
+    "pregna_admission_queued", "Requests waiting for an admission slot, by tier",
+    lambda: {(name,): count for name, count in admission.queued().items()}, ("tier",)
+)
+
+telemetry.CallbackMetric(
+    "pregna_jobs_pending", "Unfinished background jobs, queued or running",
+    lambda: {("queued",): jobs.pending - jobs.running, ("running",): jobs.running}, ("state",)
+)
+
+telemetry.CallbackMetric(
+    "pregna_index_segments", "Segments in the published document index",
+    lambda: {(): len(kb.documents.segments)}
+)
+telemetry.CallbackMetric(
+    "pregna_index_chunks", "Live document chunks in the published index",
+    lambda: {(): len(kb.documents)}
+)
+
+@app.get("/health/live")
+def liveness():
+    """The process is up and its event loop is answering"""
+    return {"status": "alive", "uptime_s": round(time.monotonic() - PROCESS_STARTED, 3)}
+
+@app.get("/health/ready")
+def readiness():
+    """200 once every warm-up stage is done, 503 with per-stage progress until then"""
+    status = warmup.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+@app.get("/metrics")
+def metrics():
+    return PlainTextResponse(telemetry.render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.get("/v1/cache/stats")
+def cache_stats():
+    return {
+        **kb.answer_cache.stats(),
+        "precomputed": kb.answer_table.stats() if kb.answer_table is not None else None,
+        "search": search_service.stats(),
+        "web_index": kb.web_index.stats() if kb.web_index is not None else None,
+    }
+
+@app.get("/v1/llm/stats")
+def llm_stats():
+    return {
+        ModelVersion.ITHAI_1.value: kb.free_router.stats(),
+        ModelVersion.ITHAI_2.value: kb.premium_router.stats(),
+        "admission": admission.stats(),
+        "jobs": jobs.stats(),
+    }
+
+def authorize_admin(x_admin_key: Optional[str]):
+    admin_key = os.getenv("ADMIN_API_KEY")
+    if not admin_key or x_admin_key != admin_key:
+        raise HTTPException(status_code=401, detail="This endpoint requires the admin API key")
+
+@app.post("/v1/admin/reload", status_code=202)
+async def reload_documents(compact: bool = False, x_admin_key: str = Header(None)):
+    """Ingest new and changed documents and publish them, in the background.
+
+    `compact=true` also merges every index segment into one. Progress and
+    the outcome are reported by `GET /v1/admin/index`.
+    """
+    authorize_admin(x_admin_key)
+    require_warm("documents")
+    started = reloader.start_reload(compact)
+    return {"status": "started" if started else "already_running", **reloader.status()}
+
+@app.get("/v1/admin/index")
+def index_status(x_admin_key: str = Header(None)):
+    authorize_admin(x_admin_key)
+    return reloader.status()
+
+@app.get("/v1/admin/profiles")
+def list_profiles(x_admin_key: str = Header(None)):
+    """Recent request profiles (newest first) and event-loop stalls.
+
+    Profile a request by sending it with `x-profile: 1` and the admin key;
+    its id comes back in the `x-profile-id` response header.
+    """
+    authorize_admin(x_admin_key)
+    return {
+        "enabled": profiler.enabled,
+        "sample_rate": profiler.sample_rate,
+        "profiles": list(reversed(profiler.profiles)),
+        "loop_blocks": list(reversed(profiler.blocks)),
+    }
+
+@app.get("/v1/admin/profiles/{profile_id}")
+def get_profile(profile_id: str, format: str = "collapsed", x_admin_key: str = Header(None)):
+    """A profile as collapsed stacks (flamegraph.pl, speedscope), or `format=pstats`
+    for the cProfile report of an admin-requested one"""
+    authorize_admin(x_admin_key)
+    profile = profiler.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    try:
+        text = profiler.render(profile, format)
+    except OSError:
+        raise HTTPException(status_code=404, detail="Profile files are no longer available")
+    if text is None:
+        raise HTTPException(status_code=400, detail="format must be collapsed, or pstats for a cProfile run")
+    return PlainTextResponse(text)
+
 @app.get("/docs/usage")
 def usage_docs():
     return {
@@ -361,6 +1005,4 @@ def usage_docs():
 
 if __name__ == "__main__":
     import uvicorn
-    # Initialize expert system
-    initialize_pregnancy_kb()
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
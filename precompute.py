@@ -0,0 +1,330 @@
+"""Precomputed answers for the most frequent chat questions.
+
+    python -m precompute [--log requests.jsonl ...] [--top 200] [--min-count 2] [--concurrency 2]
+
+Mines chat requests from JSONL request logs (the format replayed by
+benchmarks/loadtest.py), keeps the most frequent normalized questions,
+answers them through ``HealthKnowledgeBase.get_answer`` a few at a time
+and writes the answers, with their sources, to a SQLite answer table
+tagged with the document corpus they were computed against. The API loads
+the table at start-up and answers a matching question straight from it;
+once the corpus changes (a new or edited journal) the table no longer
+matches and is ignored until the job is run again.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from intents import FILLER_WORDS
+from retrieval.text import normalize, tokenize
+
+DEFAULT_TABLE_PATH = os.getenv("PRECOMPUTED_ANSWERS_PATH", "data/index/answers.db")
+CHAT_PATHS = ("/v1/health/chat", "/v1/health/chat/stream")
+
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE answers (
+    question TEXT NOT NULL,
+    version TEXT NOT NULL,
+    web INTEGER NOT NULL,
+    asked INTEGER NOT NULL,
+    answer TEXT NOT NULL,
+    sources TEXT NOT NULL,
+    is_document_based INTEGER NOT NULL,
+    PRIMARY KEY (question, version, web)
+);
+"""
+
+
+# Chat spellings of words that decide whether two questions mean the same
+ABBREVIATIONS = {
+    "yg": "yang", "utk": "untuk", "dgn": "dengan", "sy": "saya", "kalo": "kalau", "klo": "kalau",
+    "gmn": "bagaimana", "gimana": "bagaimana", "knp": "kenapa", "brp": "berapa", "bs": "bisa",
+    "bumil": "ibu hamil", "tdk": "tidak", "gak": "tidak", "ga": "tidak", "gk": "tidak", "nggak": "tidak",
+    "ngga": "tidak", "enggak": "tidak", "blm": "belum", "jgn": "jangan",
+}
+# Stopwords to BM25, but "boleh makan nanas" and "jangan makan nanas" are different questions
+NEGATIONS = frozenset(["tidak", "bukan", "jangan", "belum", "tanpa"])
+
+
+def question_terms(question: str) -> frozenset:
+    """Stemmed content words and negations of ``question``, address terms and fillers ("bu", "dok", "ya") aside."""
+    words = [
+        word for word in " ".join(ABBREVIATIONS.get(word, word) for word in normalize(question).split()).split()
+        if word not in FILLER_WORDS
+    ]
+    return frozenset(tokenize(" ".join(words))) | NEGATIONS.intersection(words)
+
+
+class PrecomputedAnswer(NamedTuple):
+    question: str
+    answer: str
+    sources: List[str]
+    is_document_based: bool
+
+
+class AnswerTable:
+    """Answer table written by ``python -m precompute``, held in memory.
+
+    A question matches an entry for the same model version and web-search
+    flag when its normalized text is the same, or else when its content
+    words overlap the entry's by at least ``min_similarity`` (Jaccard) with
+    the same numbers and negations, so "Makanan apa yg baik untuk ibu hamil
+    ya dok?" finds "makanan apa yang baik untuk ibu hamil" but "trimester 2"
+    never finds "trimester 3". Nothing is returned when the table was computed against
+    another corpus version or is older than ``max_age`` seconds. The file
+    is checked for a new version every ``check_interval`` seconds and
+    reloaded in a background thread.
+    """
+
+    def __init__(self, path: str, min_similarity: float = 0.8, max_age: float = 7 * 86400.0,
+                 check_interval: float = 30.0):
+        self.path = path
+        self.min_similarity = min_similarity
+        self.max_age = max_age
+        self.check_interval = check_interval
+        # Replaced as a whole by load(): (corpus version, created, entries, exact, postings)
+        self._table: Tuple = (None, 0.0, [], {}, {})
+        self._mtime: Optional[float] = None
+        self._checked = time.monotonic()
+        self._loading = False
+        self.hits_exact = 0
+        self.hits_similar = 0
+        self.stale = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls) -> Optional["AnswerTable"]:
+        """PRECOMPUTED_ANSWERS=0 disables it; PRECOMPUTED_ANSWERS_PATH,
+        PRECOMPUTED_MIN_SIMILARITY and PRECOMPUTED_MAX_AGE (seconds) tune it."""
+        if os.getenv("PRECOMPUTED_ANSWERS", "1") == "0":
+            return None
+        return cls(
+            DEFAULT_TABLE_PATH,
+            min_similarity=float(os.getenv("PRECOMPUTED_MIN_SIMILARITY", 0.8)),
+            max_age=float(os.getenv("PRECOMPUTED_MAX_AGE", 7 * 86400)),
+        )
+
+    def __len__(self) -> int:
+        return len(self._table[2])
+
+    @property
+    def corpus_version(self) -> Optional[str]:
+        return self._table[0]
+
+    def load(self) -> int:
+        """(Re)read the table file; returns the number of answers."""
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            self._table, self._mtime = (None, 0.0, [], {}, {}), None
+            return 0
+        conn = sqlite3.connect(f"file:{Path(self.path).as_posix()}?mode=ro", uri=True)
+        try:
+            meta = dict(conn.execute("SELECT key, value FROM meta"))
+            rows = conn.execute(
+                "SELECT question, version, web, answer, sources, is_document_based FROM answers ORDER BY asked DESC"
+            ).fetchall()
+        finally:
+            conn.close()
+        entries, exact, postings = [], {}, {}
+        for question, version, web, answer, sources, is_document_based in rows:
+            entry_id = len(entries)
+            terms = question_terms(question)
+            entries.append((version, bool(web), terms, PrecomputedAnswer(question, answer, json.loads(sources),
+                                                                         bool(is_document_based))))
+            exact[(question, version, bool(web))] = entry_id
+            for term in terms:
+                postings.setdefault(term, []).append(entry_id)
+        self._table = (meta.get("corpus_version"), float(meta.get("created", 0)), entries, exact, postings)
+        self._mtime = mtime
+        return len(entries)
+
+    def _reload_if_changed(self):
+        now = time.monotonic()
+        if self._loading or now - self._checked < self.check_interval:
+            return
+        self._checked = now
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            mtime = None
+        if mtime != self._mtime:
+            self._loading = True
+
+            def reload():
+                try:
+                    self.load()
+                except Exception as e:
+                    print(f"Could not reload precomputed answers: {e}")
+                finally:
+                    self._loading = False
+
+            threading.Thread(target=reload, daemon=True).start()
+
+    def lookup(self, question: str, version: str, web: bool, corpus_version: str) -> Optional[PrecomputedAnswer]:
+        """The answer for ``question``, if the table has it (or a near duplicate) for the current corpus."""
+        self._reload_if_changed()
+        table_version, created, entries, exact, postings = self._table
+        if not entries:
+            return None
+        if table_version != corpus_version or time.time() - created > self.max_age:
+            self.stale += 1
+            return None
+        entry_id = exact.get((normalize(question), version, web))
+        if entry_id is not None:
+            self.hits_exact += 1
+            return entries[entry_id][3]
+
+        terms = question_terms(question)
+        overlap: Dict[int, int] = {}
+        for term in terms:
+            for candidate in postings.get(term, ()):
+                overlap[candidate] = overlap.get(candidate, 0) + 1
+        # Terms a near duplicate must share exactly
+        pinned = {term for term in terms if term.isdigit() or term in NEGATIONS}
+        best, best_similarity = None, self.min_similarity
+        for candidate, shared in overlap.items():
+            entry_version, entry_web, entry_terms, answer = entries[candidate]
+            similarity = shared / (len(terms) + len(entry_terms) - shared)
+            if (similarity >= best_similarity and entry_version == version and entry_web == web
+                    and pinned == {term for term in entry_terms if term.isdigit() or term in NEGATIONS}):
+                best, best_similarity = answer, similarity
+        if best is None:
+            self.misses += 1
+            return None
+        self.hits_similar += 1
+        return best
+
+    def stats(self) -> Dict:
+        return {
+            "answers": len(self),
+            "corpus_version": self.corpus_version,
+            "hits_exact": self.hits_exact,
+            "hits_similar": self.hits_similar,
+            "stale": self.stale,
+            "misses": self.misses,
+        }
+
+
+def mine_questions(paths: Iterable[str]) -> Counter:
+    """Count chat requests by ``(normalized question, version, useWebSearch)``."""
+    counts: Counter = Counter()
+    for path in paths:
+        with open(path, encoding="utf-8") as file:
+            for line in file:
+                if not line.strip():
+                    continue
+                request = json.loads(line)
+                body = request.get("body") or {}
+                if request.get("path") not in CHAT_PATHS or not body.get("question"):
+                    continue
+                question = normalize(body["question"])
+                if question:
+                    counts[(question, body.get("version", "ITHAI-1.0"), bool(body.get("useWebSearch", False)))] += 1
+    return counts
+
+
+def write_table(path: str, corpus_version: str, rows: List[Tuple], meta: Dict[str, str]):
+    """Write a new table next to ``path`` and atomically replace it."""
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    conn = sqlite3.connect(tmp)
+    try:
+        with conn:
+            conn.executescript(SCHEMA)
+            conn.executemany("INSERT INTO meta (key, value) VALUES (?, ?)",
+                             list({**meta, "corpus_version": corpus_version, "created": str(time.time())}.items()))
+            conn.executemany(
+                "INSERT INTO answers (question, version, web, asked, answer, sources, is_document_based) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+    finally:
+        conn.close()
+    os.replace(tmp, path)
+
+
+async def answer_all(kb, questions: List[Tuple[Tuple[str, str, bool], int]], concurrency: int,
+                     interval: float) -> Tuple[List[Tuple], int]:
+    """Answer each question, at most ``concurrency`` at once and one started every ``interval`` seconds."""
+    from main import NO_CONTEXT_ANSWER
+    from models import ModelVersion
+
+    # Provider calls take free-tier admission slots (the default tier), and
+    # at most ``concurrency`` of them, so the job stays a trickle
+    semaphore = asyncio.Semaphore(concurrency)
+    rows, failed = [], 0
+
+    async def one(question, version, web, asked):
+        nonlocal failed
+        async with semaphore:
+            try:
+                answer, sources, is_document_based = await kb.get_answer(question, ModelVersion(version), web)
+            except Exception as e:
+                print(f"Could not answer {question!r}: {e}")
+                failed += 1
+                return
+        if answer != NO_CONTEXT_ANSWER:
+            rows.append((question, version, int(web), asked, answer, json.dumps(sources), int(is_document_based)))
+
+    tasks = []
+    for (question, version, web), asked in questions:
+        tasks.append(asyncio.ensure_future(one(question, version, web, asked)))
+        await asyncio.sleep(interval)
+    await asyncio.gather(*tasks)
+    return rows, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--log", nargs="+", default=["benchmarks/data/traffic_sample.jsonl"],
+                        help="JSONL request logs ({method, path, body: {question, version, useWebSearch}})")
+    parser.add_argument("--output", default=DEFAULT_TABLE_PATH)
+    parser.add_argument("--top", type=int, default=200, help="Most frequent questions to answer")
+    parser.add_argument("--min-count", type=int, default=2, help="Skip questions asked fewer times")
+    parser.add_argument("--concurrency", type=int, default=2, help="Provider calls in flight at once")
+    parser.add_argument("--interval", type=float, default=0.2, help="Seconds between starting two questions")
+    args = parser.parse_args()
+
+    import main as service
+    from retrieval.ingest import DEFAULT_STORE_PATH
+
+    started = time.perf_counter()
+    counts = mine_questions(args.log)
+    kb = service.kb
+    # Answer from the providers, not from an older table
+    kb.answer_table = None
+    questions = [
+        (key, asked) for key, asked in counts.most_common()
+        # Small talk is answered locally anyway
+        if asked >= args.min_count and (key[2] or kb.get_basic_response(key[0]) is None)
+    ][:args.top]
+    if Path(DEFAULT_STORE_PATH).exists():
+        kb.load_store(DEFAULT_STORE_PATH)
+
+    async def run():
+        try:
+            return await answer_all(kb, questions, args.concurrency, args.interval)
+        finally:
+            await service.search_service.close()
+
+    rows, failed = asyncio.run(run())
+    write_table(args.output, kb.documents.version, rows, {"logs": ",".join(args.log)})
+    covered = sum(asked for (key, asked) in questions)
+    print(f"{len(counts)} distinct questions in {sum(counts.values())} chat requests; "
+          f"answered {len(rows)} of the top {len(questions)} ({covered / max(1, sum(counts.values())):.0%} of requests), "
+          f"{failed} failed, in {time.perf_counter() - started:.1f}s -> {args.output} (corpus {kb.documents.version})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+"""Opt-in request profiling and event-loop stall detection.
+
+Nothing here is installed unless configured, so a normal deployment pays
+nothing. With PROFILING=1 a request is profiled when it carries
+``x-profile: 1`` with the admin key, or for a PROFILE_SAMPLE_RATE
+fraction of requests:
+
+- a sampler thread records the stacks of the event-loop thread (and of
+  worker threads doing retrieval or ingestion) every PROFILE_INTERVAL_MS
+  while the request is in flight, written as collapsed stacks
+  (``frame;frame;frame count``) for flamegraph.pl, speedscope or
+  inferno. Samples where the loop sits in ``select`` are time spent
+  waiting on the network;
+- admin-requested profiles also run cProfile on the loop thread, saved
+  as a ``.prof`` file (pstats, snakeviz) with exact call counts, e.g. for
+  Pydantic validation or the intent regexes.
+
+The loop is shared, so stacks of other requests in flight are mixed in;
+profile at low load or read the frames under the route's handler. One
+request is profiled at a time.
+
+With LOOP_BLOCK_MS set, a watchdog thread notices when the loop has not
+run a heartbeat callback for that long, captures what the loop thread is
+executing at that moment, and logs the stall once the loop is back.
+"""
+import asyncio
+import cProfile
+import io
+import json
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from pathlib import Path
+from typing import Deque, Dict, List, Optional
+
+import telemetry
+
+# Leaf frames of a thread that is idle rather than working (waiting on a
+# lock, a queue, the selector, or for work in a to_thread/executor pool)
+_IDLE_FILES = ("threading.py", "queue.py", "selectors.py", os.path.join("futures", "thread.py"))
+
+
+def _frame_label(code) -> str:
+    parts = Path(code.co_filename).parts[-2:]
+    return f"{code.co_name} ({'/'.join(parts)}:{code.co_firstlineno})"
+
+
+def collapse(frame) -> List[str]:
+    """Frames of a stack, outermost first."""
+    stack = []
+    while frame is not None:
+        stack.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+class StackSampler:
+    """Samples thread stacks every ``interval`` seconds until stopped."""
+
+    def __init__(self, loop_thread: int, interval: float):
+        self.loop_thread = loop_thread
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.idle = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def _run(self):
+        me = threading.get_ident()
+        names: Dict[int, str] = {}
+        while not self._stop.wait(self.interval):
+            self.samples += 1
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == me:
+                    continue
+                idle = frame.f_code.co_filename.endswith(_IDLE_FILES)
+                if thread_id == self.loop_thread:
+                    root = "[event loop]"
+                    self.idle += idle
+                elif idle:
+                    continue
+                else:
+                    if thread_id not in names:
+                        names.update((thread.ident, thread.name) for thread in threading.enumerate())
+                    root = f"[{names.get(thread_id, thread_id)}]"
+                self.stacks[";".join([root] + collapse(frame))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def top(self, n: int = 10) -> List[Dict]:
+        """Leaf frames that the samples landed in most."""
+        leaves: Counter = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        total = sum(leaves.values()) or 1
+        return [{"frame": frame, "share": round(count / total, 3)} for frame, count in leaves.most_common(n)]
+
+
+class LoopWatchdog:
+    """Logs event-loop stalls of ``threshold`` seconds or more, with the blocking stack."""
+
+    def __init__(self, threshold: float, on_block):
+        self.threshold = threshold
+        self.interval = threshold / 2
+        self.on_block = on_block
+        self._last_beat = time.perf_counter()
+        self._loop_thread: Optional[int] = None
+        self._handle: Optional[asyncio.TimerHandle] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _beat(self):
+        self._last_beat = time.perf_counter()
+        self._handle = asyncio.get_running_loop().call_later(self.interval, self._beat)
+
+    def _watch(self):
+        stalled = None
+        while not self._stop.wait(self.threshold / 4):
+            beat = self._last_beat
+            if stalled is None:
+                if time.perf_counter() - beat - self.interval >= self.threshold:
+                    frame = sys._current_frames().get(self._loop_thread)
+                    stalled = (beat, {"ts": time.time(), "stack": collapse(frame) if frame is not None else []})
+            elif beat != stalled[0]:
+                # The loop is back: the heartbeat ran this much later than due
+                record = stalled[1]
+                record["blocked_ms"] = round((beat - stalled[0] - self.interval) * 1000, 1)
+                self.on_block(record)
+                stalled = None
+
+    def start(self):
+        self._loop_thread = threading.get_ident()
+        self._stop.clear()
+        self._beat()
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._handle is not None:
+            self._handle.cancel()
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+class Profiler:
+    def __init__(self, enabled: bool = False, sample_rate: float = 0.0, interval: float = 0.002,
+                 directory: str = "logs/profiles", keep: int = 50, loop_block: float = 0.0):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self.directory = Path(directory)
+        self.profiles: Deque[Dict] = deque(maxlen=keep)
+        self.blocks: Deque[Dict] = deque(maxlen=keep)
+        self.watchdog = LoopWatchdog(loop_block, self._record_block) if loop_block > 0 else None
+        self._active = False
+
+    @classmethod
+    def from_env(cls) -> "Profiler":
+        """PROFILING=1 installs request profiling (x-profile header with the
+        admin key, plus PROFILE_SAMPLE_RATE of requests), sampling every
+        PROFILE_INTERVAL_MS into PROFILE_DIR, the last PROFILE_KEEP listed.
+        LOOP_BLOCK_MS > 0 starts the event-loop watchdog."""
+        return cls(
+            enabled=os.getenv("PROFILING", "0") == "1",
+            sample_rate=float(os.getenv("PROFILE_SAMPLE_RATE", 0.0)),
+            interval=float(os.getenv("PROFILE_INTERVAL_MS", 2)) / 1000,
+            directory=os.getenv("PROFILE_DIR", "logs/profiles"),
+            keep=int(os.getenv("PROFILE_KEEP", 50)),
+            loop_block=float(os.getenv("LOOP_BLOCK_MS", 0)) / 1000,
+        )
+
+    def start(self):
+        if self.watchdog is not None:
+            self.watchdog.start()
+
+    def stop(self):
+        if self.watchdog is not None:
+            self.watchdog.stop()
+
+    def _record_block(self, record: Dict):
+        # Called from the watchdog thread, so the file write is off the loop
+        telemetry.LOOP_BLOCKS.inc()
+        self.blocks.append(record)
+        print(f"Event loop blocked for {record['blocked_ms']} ms in {record['stack'][-1] if record['stack'] else '?'}")
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with open(self.directory / "loop_blocks.jsonl", "a") as file:
+                file.write(json.dumps(record) + "\n")
+        except OSError as e:
+            print(f"Loop block log error: {e}")
+
+    def trigger(self, scope) -> Optional[str]:
+        """How this request is to be profiled: "header", "sampled", "busy" or None."""
+        requested = False
+        admin_key = None
+        for name, value in scope["headers"]:
+            if name == b"x-profile":
+                requested = value not in (b"", b"0")
+            elif name == b"x-admin-key":
+                admin_key = value.decode("latin-1")
+        if requested:
+            expected = os.getenv("ADMIN_API_KEY")
+            if not expected or admin_key != expected:
+                requested = False
+        if not requested and not (self.sample_rate and random.random() < self.sample_rate):
+            return None
+        if self._active:
+            return "busy" if requested else None
+        return "header" if requested else "sampled"
+
+    def get(self, profile_id: str) -> Optional[Dict]:
+        return next((profile for profile in self.profiles if profile["id"] == profile_id), None)
+
+    def render(self, profile: Dict, format: str) -> Optional[str]:
+        """A saved profile as collapsed stacks, or (cProfile runs) the top of its pstats report."""
+        files = profile["files"]
+        if format == "collapsed":
+            return Path(files["collapsed"]).read_text(encoding="utf-8")
+        if format == "pstats" and files.get("pstats"):
+            out = io.StringIO()
+            pstats.Stats(files["pstats"], stream=out).sort_stats("cumulative").print_stats(40)
+            return out.getvalue()
+        return None
+
+    def _save(self, profile: Dict, sampler: StackSampler, cpu: Optional[cProfile.Profile]):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        stem = self.directory / f"{time.strftime('%Y%m%d-%H%M%S')}-{profile['id']}"
+        files = {"collapsed": f"{stem}.collapsed"}
+        Path(files["collapsed"]).write_text(sampler.collapsed(), encoding="utf-8")
+        if cpu is not None:
+            files["pstats"] = f"{stem}.prof"
+            cpu.dump_stats(files["pstats"])
+        profile["files"] = files
+        self.profiles.append(profile)
+
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling the requests ``Profiler.trigger`` selects."""
+
+    def __init__(self, app, profiler: Profiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        trigger = self.profiler.trigger(scope) if scope["type"] == "http" else None
+        if trigger is None:
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = "busy" if trigger == "busy" else uuid.uuid4().hex[:12]
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        if trigger == "busy":
+            await self.app(scope, receive, send_wrapper)
+            return
+
+        self.profiler._active = True
+        sampler = StackSampler(threading.get_ident(), self.profiler.interval)
+        cpu = cProfile.Profile() if trigger == "header" else None
+        started = time.perf_counter()
+        sampler.start()
+        if cpu is not None:
+            try:
+                cpu.enable()
+            except ValueError:
+                # Another profiler (e.g. a debugger) already holds the hook
+                cpu = None
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if cpu is not None:
+                cpu.disable()
+            elapsed = time.perf_counter() - started
+            await asyncio.to_thread(sampler.stop)
+            self.profiler._active = False
+            profile = {
+                "id": profile_id,
+                "ts": time.time(),
+                "trigger": trigger,
+                "method": scope["method"],
+                "path": scope["path"],
+                "status": status,
+                "duration_ms": round(elapsed * 1000, 1),
+                "samples": sampler.samples,
+                "loop_idle_share": round(sampler.idle / max(1, sampler.samples), 3),
+                "top_frames": sampler.top(),
+            }
+            try:
+                await asyncio.to_thread(self.profiler._save, profile, sampler, cpu)
+            except OSError as e:
+                print(f"Profile write error: {e}")
@@ -0,0 +1,198 @@
+import asyncio
+import os
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import telemetry
+from retrieval.ingest import DEFAULT_SOURCE_DIRS, discover, ingest
+from retrieval.store import ChunkStore
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+class DocumentReloader:
+    """Keeps ``kb.documents`` in step with the document folders, without a restart.
+
+    A reload reads what changed in the chunk store (written by the ingest
+    CLI, an admin reload or another worker) into a new segment and
+    publishes the next ``DocumentIndex`` with one reference swap; an admin
+    reload first ingests new and changed files from the folders. All of it
+    runs in a worker thread, one reload at a time. The watcher polls the
+    store file every ``interval`` seconds and reloads when it changed; with
+    ``watch_ingest`` it polls the folders too and ingests them. Ingesting
+    takes a file lock next to the store, so of several workers only one
+    extracts a new journal and the others just read it from the store.
+    Every ``compact_interval`` seconds the watcher also merges all segments
+    into one.
+    """
+
+    def __init__(self, kb, store_path: str, directories: List[str], interval: float = 30.0,
+                 compact_interval: float = 3600.0, max_segments: int = 4, max_dead_ratio: float = 0.3,
+                 ingest_workers: int = 2, chunking: Tuple = ("words",), watch_ingest: bool = False):
+        self.kb = kb
+        self.store_path = store_path
+        self.directories = directories
+        self.interval = interval
+        self.watch_ingest = watch_ingest
+        self.compact_interval = compact_interval
+        self.max_segments = max_segments
+        self.max_dead_ratio = max_dead_ratio
+        self.ingest_workers = ingest_workers
+        self.chunking = chunking
+        self.task: Optional[asyncio.Task] = None
+        self.running: Optional[asyncio.Task] = None
+        self.last: Optional[Dict] = None
+        self.reloads = 0
+        self._lock = asyncio.Lock()
+        self._fingerprint = None
+        self._compacted_at = time.monotonic()
+
+    @classmethod
+    def from_env(cls, kb, store_path: str) -> "DocumentReloader":
+        """INDEX_WATCH_DIRS (comma-separated), INDEX_WATCH_INTERVAL (seconds, 0
+        disables the watcher), INDEX_WATCH_INGEST=1 (the watcher ingests the
+        folders too), INDEX_COMPACT_INTERVAL, INDEX_MAX_SEGMENTS,
+        INDEX_MAX_DEAD_RATIO and INDEX_INGEST_WORKERS; chunking follows the
+        ingest command (CHUNKING, CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS)."""
+        directories = os.getenv("INDEX_WATCH_DIRS")
+        return cls(
+            kb,
+            store_path,
+            [d for d in directories.split(",") if d] if directories is not None else DEFAULT_SOURCE_DIRS,
+            interval=float(os.getenv("INDEX_WATCH_INTERVAL", 30)),
+            compact_interval=float(os.getenv("INDEX_COMPACT_INTERVAL", 3600)),
+            max_segments=int(os.getenv("INDEX_MAX_SEGMENTS", 4)),
+            max_dead_ratio=float(os.getenv("INDEX_MAX_DEAD_RATIO", 0.3)),
+            ingest_workers=int(os.getenv("INDEX_INGEST_WORKERS", 2)),
+            chunking=(os.getenv("CHUNKING", "words"), 1000, int(os.getenv("CHUNK_TOKENS", 256)),
+                      int(os.getenv("CHUNK_OVERLAP_TOKENS", 48))),
+            watch_ingest=os.getenv("INDEX_WATCH_INGEST", "0") == "1",
+        )
+
+    def _ingest(self) -> Optional[Dict[str, list]]:
+        """Ingest the folders into the store; None if another process is ingesting."""
+        Path(self.store_path).parent.mkdir(parents=True, exist_ok=True)
+        with open(f"{self.store_path}.ingest.lock", "a") as lock:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return None
+            store = ChunkStore(self.store_path)
+            try:
+                return ingest(store, self.directories, self.ingest_workers, chunking=self.chunking)
+            finally:
+                store.close()
+
+    def _reload(self, compact: bool, ingest: bool) -> Dict:
+        started = time.perf_counter()
+        report: Dict = {"compact": compact}
+        if ingest and self.directories:
+            ingested = self._ingest()
+            # The lock holder's writes reach this worker through the store
+            report["ingested"] = "elsewhere" if ingested is None else {
+                status: paths for status, paths in ingested.items()
+                if status in ("added", "updated", "removed", "failed") and paths
+            }
+        report["ingest_s"] = round(time.perf_counter() - started, 3)
+
+        store = ChunkStore(self.store_path, read_only=True)
+        try:
+            documents = self.kb.documents.refreshed(store, self.max_segments, self.max_dead_ratio, compact)
+        finally:
+            store.close()
+        if documents is not None and self.kb.embedder is not None:
+            # Embed new and merged segments here, not in the first search after the swap
+            documents.build_dense(self.kb.embedder, self.kb.dense_quantize)
+        if documents is not None:
+            # Requests already past this point keep the DocumentIndex they read
+            self.kb.documents = documents
+        report.update(
+            published=documents is not None,
+            segments=len(self.kb.documents.segments),
+            live_chunks=len(self.kb.documents),
+            seconds=round(time.perf_counter() - started, 3),
+        )
+        return report
+
+    async def reload(self, compact: bool = False, ingest: bool = True) -> Dict:
+        """Run one reload (after any that is already running) and return its report."""
+        async with self._lock:
+            try:
+                report = await asyncio.to_thread(self._reload, compact, ingest)
+            except Exception as e:
+                print(f"Document reload failed: {e}")
+                telemetry.INDEX_RELOADS.inc("compact" if compact else "incremental", "failed")
+                self.last = {"compact": compact, "error": str(e), "finished": time.time()}
+                raise
+            if compact:
+                self._compacted_at = time.monotonic()
+            telemetry.INDEX_RELOADS.inc("compact" if compact else "incremental",
+                                        "published" if report["published"] else "unchanged")
+            self.reloads += 1
+            self.last = {**report, "finished": time.time()}
+            return report
+
+    def start_reload(self, compact: bool = False, ingest: bool = True) -> bool:
+        """Reload in the background; False if one is already running."""
+        if self.running is not None and not self.running.done():
+            return False
+        self.running = asyncio.create_task(self.reload(compact, ingest))
+        # The outcome is kept in ``last``; don't report the exception again
+        self.running.add_done_callback(lambda task: task.cancelled() or task.exception())
+        return True
+
+    def _current_fingerprint(self):
+        paths = discover(self.directories) if self.watch_ingest else []
+        files = []
+        for path in paths + [self.store_path]:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((path, stat.st_mtime, stat.st_size))
+        return files
+
+    async def watch(self, after: Optional[asyncio.Task] = None):
+        if after is not None:
+            await asyncio.wait({after})
+        while True:
+            fingerprint = await asyncio.to_thread(self._current_fingerprint)
+            compact = self.compact_interval > 0 and time.monotonic() - self._compacted_at >= self.compact_interval
+            if fingerprint != self._fingerprint or compact:
+                # Taken before the reload, so a change made while it runs is
+                # seen next time (as is the reload's own store write, a no-op)
+                self._fingerprint = fingerprint
+                try:
+                    await self.reload(compact, self.watch_ingest)
+                except Exception:
+                    self._fingerprint = None
+            await asyncio.sleep(self.interval)
+
+    def start(self, after: Optional[asyncio.Task] = None):
+        """Start the watcher once ``after`` (the start-up warm-up) has finished."""
+        if self.interval > 0:
+            self.task = asyncio.create_task(self.watch(after))
+
+    async def stop(self):
+        for task in (self.task, self.running):
+            if task is not None and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
+
+    def status(self) -> Dict:
+        return {
+            "running": self._lock.locked(),
+            "reloads": self.reloads,
+            "last": self.last,
+            "watch_interval_s": self.interval,
+            "watch_ingest": self.watch_ingest,
+            "index": self.kb.documents.stats(),
+        }
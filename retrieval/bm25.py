@@ -0,0 +1,212 @@
+import heapq
+import json
+import math
+import mmap
+import os
+import struct
+from array import array
+from operator import itemgetter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from retrieval.text import tokenize
+
+SNAPSHOT_MAGIC = b"BM25IDX1"
+
+
+class BM25Index:
+    """Inverted index with BM25 scoring.
+
+    Postings are appended as documents are added; ``finalize`` (called lazily on
+    the first search after a change) turns them into impact-ordered lists of
+    precomputed BM25 term weights, so a query is just a sum over the postings
+    of its terms. ``max_postings`` caps how many postings of a single term are
+    read per query, which keeps latency flat on very common terms as the
+    corpus grows (those terms carry the lowest IDF anyway).
+
+    A finalized index can be ``save``d as a snapshot file; ``load`` maps it
+    read-only, so every worker on a host shares the same posting pages
+    through the OS page cache. A loaded index cannot take new documents.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, max_postings: int = 2000):
+        self.k1 = k1
+        self.b = b
+        self.max_postings = max_postings
+        self.doc_lengths = array("I")
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        self._impacts: Dict[str, Tuple[array, array]] = {}
+        # Highest weight per term, filled in lazily by score_bound
+        self._max_impacts: Dict[str, float] = {}
+        self._dirty = False
+        self._mmap: Optional[mmap.mmap] = None
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def add(self, text: str) -> int:
+        return self.add_tokens(tokenize(text))
+
+    def add_tokens(self, tokens: List[str]) -> int:
+        if self._mmap is not None:
+            raise ValueError("BM25 index was loaded from a read-only snapshot")
+        doc_id = len(self.doc_lengths)
+        self.doc_lengths.append(len(tokens))
+
+        term_freqs: Dict[str, int] = {}
+        for token in tokens:
+            term_freqs[token] = term_freqs.get(token, 0) + 1
+
+        for term, tf in term_freqs.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = (array("I"), array("I"))
+            postings[0].append(doc_id)
+            postings[1].append(tf)
+
+        self._dirty = True
+        return doc_id
+
+    def add_many(self, texts: Iterable[str]) -> None:
+        for text in texts:
+            self.add(text)
+
+    def document_frequency(self, term: str) -> int:
+        postings = self._postings.get(term) if self._dirty else self._impacts.get(term)
+        return len(postings[0]) if postings is not None else 0
+
+    def finalize(self, background: Sequence["BM25Index"] = ()) -> None:
+        """Compute the term weights.
+
+        ``background`` indexes (other segments searched alongside this one)
+        count towards document frequencies and the average length, so the
+        scores of a small index stay comparable with theirs.
+        """
+        n_docs = len(self.doc_lengths)
+        if not n_docs:
+            self._impacts = {}
+            self._dirty = False
+            return
+
+        k1, b = self.k1, self.b
+        total_docs = n_docs + sum(len(other) for other in background)
+        avgdl = ((sum(self.doc_lengths) + sum(sum(other.doc_lengths) for other in background)) / total_docs) or 1.0
+        norms = [k1 * (1 - b + b * dl / avgdl) for dl in self.doc_lengths]
+
+        impacts = {}
+        for term, (doc_ids, tfs) in self._postings.items():
+            df = len(doc_ids) + sum(other.document_frequency(term) for other in background)
+            idf = math.log(1 + (total_docs - df + 0.5) / (df + 0.5))
+            weights = [idf * tf * (k1 + 1) / (tf + norms[doc_id]) for doc_id, tf in zip(doc_ids, tfs)]
+            if len(doc_ids) > self.max_postings:
+                order = sorted(range(len(doc_ids)), key=weights.__getitem__, reverse=True)
+                impacts[term] = (array("I", (doc_ids[i] for i in order)), array("f", (weights[i] for i in order)))
+            else:
+                impacts[term] = (array("I", doc_ids), array("f", weights))
+
+        self._impacts = impacts
+        self._max_impacts = {}
+        self._dirty = False
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[int, float]]:
+        """Return up to ``k`` ``(doc_id, score)`` pairs, best first."""
+        if self._dirty:
+            self.finalize()
+
+        scores: Dict[int, float] = {}
+        limit = self.max_postings
+        for term in set(tokenize(query)):
+            postings = self._impacts.get(term)
+            if postings is None:
+                continue
+            doc_ids, weights = postings
+            if len(doc_ids) > limit:
+                doc_ids, weights = doc_ids[:limit], weights[:limit]
+            get = scores.get
+            for doc_id, weight in zip(doc_ids, weights):
+                scores[doc_id] = get(doc_id, 0.0) + weight
+
+        if not scores:
+            return []
+        return heapq.nlargest(k, scores.items(), key=itemgetter(1))
+
+    def score_bound(self, query: str) -> float:
+        """Upper bound on any document's score for ``query``, without scoring.
+
+        The sum of each query term's highest weight; a term's maximum is
+        computed once (a scan of its postings) and cached.
+        """
+        if self._dirty:
+            self.finalize()
+        bound = 0.0
+        for term in set(tokenize(query)):
+            best = self._max_impacts.get(term)
+            if best is None:
+                postings = self._impacts.get(term)
+                if postings is None:
+                    continue
+                best = self._max_impacts[term] = max(postings[1])
+            bound += best
+        return bound
+
+    def save(self, path: str, signature=None):
+        """Write the finalized index as a snapshot (atomically replacing ``path``).
+
+        ``signature`` identifies the corpus it was built from; ``load`` only
+        accepts the snapshot for the same signature.
+        """
+        if self._dirty:
+            self.finalize()
+        terms = {}
+        offset = len(self.doc_lengths) * 4
+        for term, (doc_ids, _) in self._impacts.items():
+            terms[term] = (offset, len(doc_ids))
+            offset += len(doc_ids) * 8
+        header = json.dumps({
+            "k1": self.k1, "b": self.b, "max_postings": self.max_postings,
+            "docs": len(self.doc_lengths), "signature": signature, "terms": terms,
+        }).encode("utf-8")
+        header += b" " * (-len(header) % 4)
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as file:
+            file.write(SNAPSHOT_MAGIC + struct.pack("<Q", len(header)) + header)
+            file.write(array("I", self.doc_lengths).tobytes())
+            for doc_ids, weights in self._impacts.values():
+                file.write(array("I", doc_ids).tobytes())
+                file.write(array("f", weights).tobytes())
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str, signature=None) -> Optional["BM25Index"]:
+        """Map a snapshot written by ``save``; None if missing or built from another corpus."""
+        try:
+            file = open(path, "rb")
+        except FileNotFoundError:
+            return None
+        with file:
+            if file.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+                return None
+            (header_length,) = struct.unpack("<Q", file.read(8))
+            header = json.loads(file.read(header_length))
+            if signature is not None and header["signature"] != list(signature):
+                return None
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        index = cls(header["k1"], header["b"], header["max_postings"])
+        base = len(SNAPSHOT_MAGIC) + 8 + header_length
+        view = memoryview(mapped)
+        index.doc_lengths = array("I", view[base:base + header["docs"] * 4].cast("I"))
+        for term, (offset, count) in header["terms"].items():
+            start = base + offset
+            index._impacts[term] = (
+                view[start:start + count * 4].cast("I"),
+                view[start + count * 4:start + count * 8].cast("f"),
+            )
+        index._mmap = mapped
+        return index
+
+
+def snapshot_path(store_path: str) -> str:
+    return str(Path(store_path).with_suffix("")) + ".bm25"
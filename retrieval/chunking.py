@@ -0,0 +1,109 @@
+import re
+from typing import Callable, Iterable, Iterator, List, Tuple
+
+from retrieval.text import count_tokens, iter_sentences
+
+_WORD_RE = re.compile(r"\S+")
+
+
+def iter_chunks(pages: Iterable[str], chunk_size: int = 1000) -> Iterator[Tuple[int, int, str]]:
+    """Stream word-aligned chunks of about ``chunk_size`` characters.
+
+    ``pages`` is consumed lazily and treated as if joined with newlines, so
+    only the current page and the chunk being built are held in memory.
+    Yields ``(start, end, chunk)`` where start/end are character offsets of
+    the chunk's first and last word in the joined text; whitespace inside a
+    chunk is collapsed to single spaces.
+    """
+    current_chunk = []
+    current_size = 0
+    start = end = 0
+    base = 0
+
+    for page in pages:
+        for match in _WORD_RE.finditer(page):
+            word = match.group()
+            if current_chunk and current_size + len(word) > chunk_size:
+                yield start, end, " ".join(current_chunk)
+                current_chunk = []
+                current_size = 0
+            if not current_chunk:
+                start = base + match.start()
+            current_chunk.append(word)
+            current_size += len(word) + 1
+            end = base + match.end()
+        base += len(page) + 1
+
+    if current_chunk:
+        yield start, end, " ".join(current_chunk)
+
+
+def chunk_text(text: str, chunk_size: int = 1000) -> List[Tuple[int, int, str]]:
+    return list(iter_chunks([text], chunk_size))
+
+
+def _sentence_spans(pages: Iterable[str]) -> Iterator[Tuple[int, int, str]]:
+    # A sentence may run over a page break: the unfinished tail of one page
+    # is carried into the next, as if the pages were joined with newlines
+    tail, tail_start, base = "", 0, 0
+    for page in pages:
+        text = f"{tail}\n{page}" if tail else page
+        offset = tail_start if tail else base
+        spans = list(iter_sentences(text))
+        tail = ""
+        if spans and text[:spans[-1][1]].rstrip()[-1:] not in ".!?\"')]":
+            start, _ = spans.pop()
+            tail, tail_start = text[start:], offset + start
+        for start, end in spans:
+            yield offset + start, offset + end, " ".join(text[start:end].split())
+        base += len(page) + 1
+    if tail.strip():
+        yield tail_start, tail_start + len(tail), " ".join(tail.split())
+
+
+def iter_sentence_chunks(pages: Iterable[str], max_tokens: int = 256,
+                         overlap_tokens: int = 48) -> Iterator[Tuple[int, int, str]]:
+    """Stream chunks of whole sentences, at most ``max_tokens`` tokens each.
+
+    Consecutive chunks share their boundary sentences, up to
+    ``overlap_tokens``, so a fact split across a chunk border still appears
+    whole in one of them (the context packer drops the repeated sentences
+    when both chunks are retrieved). A sentence longer than the limit is cut
+    into word-aligned pieces. Yields ``(start, end, chunk)`` like
+    ``iter_chunks``.
+    """
+    current: List[Tuple[int, int, str, int]] = []
+    size = 0
+    for start, end, sentence in _sentence_spans(pages):
+        tokens = count_tokens(sentence)
+        pieces = [(start, end, sentence, tokens)]
+        if tokens > max_tokens:
+            # Cut at this sentence's own characters-per-token rate, with some slack
+            piece_chars = max(1, len(sentence) * max_tokens * 9 // (tokens * 10))
+            pieces = [(start + s, start + e, piece, count_tokens(piece))
+                      for s, e, piece in chunk_text(sentence, piece_chars)]
+        for piece in pieces:
+            if current and size + piece[3] > max_tokens:
+                yield current[0][0], current[-1][1], " ".join(item[2] for item in current)
+                overlap: List[Tuple[int, int, str, int]] = []
+                kept = 0
+                for item in reversed(current):
+                    if kept + item[3] > overlap_tokens or kept + item[3] + piece[3] > max_tokens:
+                        break
+                    overlap.insert(0, item)
+                    kept += item[3]
+                current, size = overlap, kept
+            current.append(piece)
+            size += piece[3]
+    if current:
+        yield current[0][0], current[-1][1], " ".join(item[2] for item in current)
+
+
+def make_chunker(mode: str = "words", chunk_size: int = 1000, max_tokens: int = 256,
+                 overlap_tokens: int = 48) -> Callable[[Iterable[str]], Iterator[Tuple[int, int, str]]]:
+    """``words``: ~chunk_size characters (the default); ``sentences``: token-sized with overlap."""
+    if mode == "sentences":
+        return lambda pages: iter_sentence_chunks(pages, max_tokens, overlap_tokens)
+    if mode != "words":
+        raise ValueError(f"Unknown chunking mode {mode!r}")
+    return lambda pages: iter_chunks(pages, chunk_size)
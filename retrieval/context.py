@@ -0,0 +1,174 @@
+import os
+import re
+from typing import Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from retrieval.text import count_tokens, normalize, split_sentences, tokenize
+
+# Context window per model; Groq model ids usually end in it ("llama3-8b-8192")
+MODEL_CONTEXT_WINDOWS = {
+    "llama3-8b-8192": 8192,
+    "llama3-70b-8192": 8192,
+    "mixtral-8x7b-32768": 32768,
+    "gemma-7b-it": 8192,
+    "gpt-4-turbo-preview": 128000,
+    "gpt-4-turbo": 128000,
+}
+# Tokens of retrieved context per request, about two ~1000-character chunks.
+# GPT-4 Turbo input tokens are what the premium tier pays for, so it gets
+# less. Override with CONTEXT_TOKENS_<MODEL> (e.g. CONTEXT_TOKENS_LLAMA3_8B_8192).
+DEFAULT_CONTEXT_BUDGETS = {
+    "llama3-8b-8192": 512,
+    "gpt-4-turbo-preview": 400,
+}
+DEFAULT_CONTEXT_BUDGET = 512
+# System prompt, question and the answer itself must still fit the window
+RESERVED_TOKENS = 2048
+SEPARATOR = "\n"
+
+_WINDOW_SUFFIX_RE = re.compile(r"-(\d{4,6})$")
+
+
+def context_window(model: str) -> Optional[int]:
+    if model in MODEL_CONTEXT_WINDOWS:
+        return MODEL_CONTEXT_WINDOWS[model]
+    match = _WINDOW_SUFFIX_RE.search(model)
+    return int(match.group(1)) if match else None
+
+
+def context_budget(model: str) -> int:
+    """Token budget for retrieved context sent to ``model``."""
+    env = "CONTEXT_TOKENS_" + re.sub(r"\W", "_", model).upper()
+    budget = int(os.getenv(env, os.getenv("CONTEXT_TOKENS", DEFAULT_CONTEXT_BUDGETS.get(model, DEFAULT_CONTEXT_BUDGET))))
+    window = context_window(model)
+    if window is not None:
+        budget = min(budget, window - RESERVED_TOKENS)
+    return max(0, budget)
+
+
+class Passage(NamedTuple):
+    text: str
+    source: str
+    score: float = 0.0
+
+
+def _shingles(text: str, size: int = 3) -> Set[Tuple[str, ...]]:
+    words = normalize(text).split()
+    if len(words) <= size:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def dedupe_passages(passages: Iterable[Passage], threshold: float = 0.8) -> List[Passage]:
+    """Drop repeated text, keeping the first (best-ranked) copy.
+
+    Sentences already present in a kept passage are removed, which is what
+    overlapping chunks and mirrored web snippets produce; a passage left
+    with little new text, or whose word 3-grams are mostly covered by kept
+    passages (a near-duplicate), is dropped entirely.
+    """
+    kept: List[Passage] = []
+    seen_sentences: Set[str] = set()
+    seen_shingles: Set[Tuple[str, ...]] = set()
+    for passage in passages:
+        sentences = split_sentences(passage.text)
+        fresh = []
+        for sentence in sentences:
+            key = normalize(sentence)
+            if key and key not in seen_sentences:
+                fresh.append(sentence)
+        if not fresh:
+            continue
+        text = passage.text if len(fresh) == len(sentences) else " ".join(fresh)
+        shingles = _shingles(text)
+        if shingles and len(shingles & seen_shingles) / len(shingles) >= threshold:
+            continue
+        seen_sentences.update(normalize(sentence) for sentence in fresh)
+        seen_shingles |= shingles
+        kept.append(passage._replace(text=text))
+    return kept
+
+
+def _truncate(text: str, budget: int) -> str:
+    """Leading whole sentences of ``text`` within ``budget`` tokens."""
+    parts = []
+    used = 0
+    for sentence in split_sentences(text):
+        tokens = count_tokens(sentence) + 1
+        if used + tokens > budget:
+            break
+        parts.append(sentence)
+        used += tokens
+    return " ".join(parts)
+
+
+def pack_passages(passages: Iterable[Passage], budget: int, min_fragment: int = 48) -> Tuple[List[Passage], int]:
+    """Greedily fit ranked passages into ``budget`` tokens.
+
+    Passages are taken in rank order; one that does not fit is skipped in
+    favour of shorter, lower-ranked ones, except that when at least
+    ``min_fragment`` tokens remain its leading sentences are used instead.
+    Returns the packed passages (in rank order) and the tokens they use,
+    separators included.
+    """
+    separator = count_tokens(SEPARATOR)
+    packed: List[Passage] = []
+    used = 0
+    for passage in passages:
+        remaining = budget - used - (separator if packed else 0)
+        if remaining <= 0:
+            break
+        tokens = count_tokens(passage.text)
+        if tokens > remaining:
+            if remaining < min_fragment:
+                continue
+            text = _truncate(passage.text, remaining)
+            if not text:
+                continue
+            passage, tokens = passage._replace(text=text), count_tokens(text)
+        used += tokens + (separator if packed else 0)
+        packed.append(passage)
+    return packed, used
+
+
+def build_context(passages: Iterable[Passage], budget: int,
+                  min_score_ratio: float = 0.0) -> Tuple[str, List[str], int]:
+    """Dedupe and pack passages: ``(context, sources, tokens)``.
+
+    Passages scoring below ``min_score_ratio`` of the best one are left out
+    even when the budget has room: the budget is a ceiling, not a target.
+    """
+    passages = list(passages)
+    if passages and min_score_ratio > 0:
+        cutoff = max(passage.score for passage in passages) * min_score_ratio
+        passages = [passage for passage in passages if passage.score >= cutoff]
+    packed, tokens = pack_passages(dedupe_passages(passages), budget)
+    sources = list(dict.fromkeys(passage.source for passage in packed))
+    return SEPARATOR.join(passage.text for passage in packed), sources, tokens
+
+
+class SectionedContext:
+    """A long, static system context, sent only in the parts a query needs.
+
+    ``text`` is split into blank-line separated sections. The first section
+    (who the assistant is) and the last (how to talk) always go out; the
+    sections in between are included when the query shares a word with
+    them, otherwise only their title lines are, as a one-line overview.
+    """
+
+    def __init__(self, text: str):
+        sections = [section.strip() for section in re.split(r"\n\s*\n", text.strip()) if section.strip()]
+        self.head = sections[0] if sections else ""
+        self.tail = sections[-1] if len(sections) > 1 else ""
+        self.sections = sections[1:-1]
+        self._terms = [set(tokenize(section)) for section in self.sections]
+        titles = [section.splitlines()[0].rstrip(":") for section in self.sections]
+        self.overview = f"Platform features: {'; '.join(titles)}." if titles else ""
+        self.full = "\n\n".join(sections)
+
+    def for_query(self, query: str) -> str:
+        terms = set(tokenize(query))
+        matched = [section for section, section_terms in zip(self.sections, self._terms) if terms & section_terms]
+        if len(matched) == len(self.sections):
+            return self.full
+        parts = [self.head, *matched, self.overview, self.tail]
+        return "\n\n".join(part for part in parts if part)
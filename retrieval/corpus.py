@@ -0,0 +1,65 @@
+from array import array
+from typing import Dict, Iterator, List
+
+
+class Chunk:
+    __slots__ = ("id", "text", "source")
+
+    def __init__(self, chunk_id: int, text: str, source: str):
+        self.id = chunk_id
+        self.text = text
+        self.source = source
+
+
+class ChunkCorpus:
+    """Chunk texts in one contiguous UTF-8 buffer, sources in a small table.
+
+    Chunk ``i`` is ``buffer[offsets[i]:offsets[i + 1]]`` and comes from
+    ``sources[source_ids[i]]``, so a chunk costs its encoded bytes plus 12
+    bytes of bookkeeping instead of a ``str`` object, a list slot and a
+    dict entry keyed by the same text. Ids are positions, in the order
+    chunks were added, and line up with the BM25 and dense index ids; text
+    is only decoded for the chunks a search actually returns. Identical
+    chunks from different files keep their own source.
+    """
+
+    __slots__ = ("_buffer", "_offsets", "_source_ids", "sources", "_source_index")
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._offsets = array("Q", [0])
+        self._source_ids = array("I")
+        self.sources: List[str] = []
+        self._source_index: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._source_ids)
+
+    def append(self, text: str, source: str) -> int:
+        source_id = self._source_index.get(source)
+        if source_id is None:
+            source_id = self._source_index[source] = len(self.sources)
+            self.sources.append(source)
+        self._buffer += text.encode("utf-8")
+        self._offsets.append(len(self._buffer))
+        self._source_ids.append(source_id)
+        return len(self._source_ids) - 1
+
+    def text(self, chunk_id: int) -> str:
+        return str(memoryview(self._buffer)[self._offsets[chunk_id]:self._offsets[chunk_id + 1]], "utf-8")
+
+    def source(self, chunk_id: int) -> str:
+        return self.sources[self._source_ids[chunk_id]]
+
+    def __getitem__(self, chunk_id: int) -> Chunk:
+        return Chunk(chunk_id, self.text(chunk_id), self.source(chunk_id))
+
+    def __iter__(self) -> Iterator[str]:
+        """Every chunk's text, in id order (decoded one at a time)."""
+        for chunk_id in range(len(self)):
+            yield self.text(chunk_id)
+
+    def nbytes(self) -> int:
+        """Bytes held by the buffer and arrays (the source table aside)."""
+        return (len(self._buffer) + self._offsets.itemsize * len(self._offsets)
+                + self._source_ids.itemsize * len(self._source_ids))
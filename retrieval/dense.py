@@ -0,0 +1,163 @@
+import os
+import zlib
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from retrieval.text import tokenize
+
+try:
+    import numpy as np
+except ImportError:  # dense retrieval is optional
+    np = None
+
+DENSE_AVAILABLE = np is not None
+
+
+class HashedNgramEmbedder:
+    """Dependency-free CPU embedding: hashed character n-grams of stemmed tokens.
+
+    Shares sub-word features between inflections, compounds and misspellings
+    ("mual", "mualnya", "mul"), which exact-token BM25 cannot. Features are
+    log-scaled counts weighted by an IDF vector ``fit`` on the corpus, so
+    n-grams that occur everywhere do not dominate the cosine. Uses crc32 so
+    vectors are stable across processes.
+    """
+
+    def __init__(self, dim: int = 4096, ngram_sizes: Tuple[int, ...] = (3, 4, 5),
+                 idf: Optional["np.ndarray"] = None):
+        self.dim = dim
+        self.ngram_sizes = ngram_sizes
+        self.idf = idf
+
+    def _counts(self, texts: List[str]) -> "np.ndarray":
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in tokenize(text):
+                padded = f"#{token}#"
+                matrix[row, zlib.crc32(padded.encode("utf-8")) % self.dim] += 1
+                for n in self.ngram_sizes:
+                    for i in range(len(padded) - n + 1):
+                        matrix[row, zlib.crc32(padded[i:i + n].encode("utf-8")) % self.dim] += 1
+        return matrix
+
+    def fit(self, texts: Iterable[str]) -> "HashedNgramEmbedder":
+        counts = self._counts(list(texts))
+        df = np.count_nonzero(counts, axis=0)
+        self.idf = np.log((1 + len(counts)) / (1 + df)).astype(np.float32) + 1.0
+        return self
+
+    def embed(self, texts: Iterable[str]) -> "np.ndarray":
+        matrix = np.log1p(self._counts(list(texts)))
+        if self.idf is not None:
+            matrix *= self.idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+
+class DenseIndex:
+    """Chunk embedding matrix (float32, or int8 with per-row scales) and top-k search.
+
+    Saved as .npy files and opened with ``mmap_mode='r'``, so workers share
+    the pages through the OS cache instead of each holding a copy. Row ``i``
+    is the ``i``-th chunk of the store it was built from, so a saved matrix
+    records the store's signature and is only loaded for the same one.
+    """
+
+    def __init__(self, matrix: "np.ndarray", scales: Optional["np.ndarray"] = None,
+                 idf: Optional["np.ndarray"] = None):
+        self.matrix = matrix
+        self.scales = scales
+        # IDF of the embedder the rows were built with; queries must use it too
+        self.idf = idf
+
+    def __len__(self) -> int:
+        return self.matrix.shape[0]
+
+    @classmethod
+    def build(cls, embedder: HashedNgramEmbedder, texts: List[str], quantize: bool = False,
+              fit: bool = True) -> "DenseIndex":
+        """Embed ``texts``; ``fit=False`` keeps the embedder's IDF, so the
+        vectors stay comparable with a matrix built earlier."""
+        if fit:
+            embedder.fit(texts)
+        vectors = embedder.embed(texts)
+        if not quantize:
+            return cls(np.ascontiguousarray(vectors, dtype=np.float32), idf=embedder.idf)
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        quantized = np.round(vectors / scales[:, None]).astype(np.int8)
+        return cls(quantized, scales.astype(np.float32), embedder.idf)
+
+    def save(self, path: str, signature=None):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        np.save(f"{path}.npy", self.matrix)
+        signature = np.array(signature, dtype=np.int64) if signature is not None else None
+        for suffix, array in (("scales", self.scales), ("idf", self.idf), ("signature", signature)):
+            if array is not None:
+                np.save(f"{path}.{suffix}.npy", array)
+            else:
+                Path(f"{path}.{suffix}.npy").unlink(missing_ok=True)
+
+    @classmethod
+    def load(cls, path: str, signature=None) -> Optional["DenseIndex"]:
+        """Map a matrix written by ``save``; None if missing or built from another store."""
+        if not Path(f"{path}.npy").exists():
+            return None
+        if signature is not None:
+            signature_path = Path(f"{path}.signature.npy")
+            if not signature_path.exists() or np.load(signature_path).tolist() != list(signature):
+                return None
+        matrix = np.load(f"{path}.npy", mmap_mode="r")
+        scales_path = Path(f"{path}.scales.npy")
+        idf_path = Path(f"{path}.idf.npy")
+        scales = np.load(scales_path) if scales_path.exists() else None
+        idf = np.load(idf_path) if idf_path.exists() else None
+        return cls(matrix, scales, idf)
+
+    def search(self, query_vector: "np.ndarray", k: int = 10, block_rows: int = 65536) -> List[Tuple[int, float]]:
+        """Top-k ``(row, cosine)`` by one matrix-vector product and argpartition."""
+        n = len(self)
+        if not n:
+            return []
+        if self.matrix.dtype == np.float32:
+            scores = self.matrix @ query_vector
+        else:
+            # Upcast int8 rows in blocks so a query never copies the whole matrix
+            scores = np.empty(n, dtype=np.float32)
+            for start in range(0, n, block_rows):
+                block = self.matrix[start:start + block_rows].astype(np.float32)
+                scores[start:start + block_rows] = block @ query_vector
+            scores *= self.scales
+        k = min(k, n)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(i), float(scores[i])) for i in top]
+
+
+def hybrid_merge(lexical: List[Tuple[int, float]], dense: List[Tuple[int, float]], k: int,
+                 dense_weight: float = 0.5, min_dense_score: float = 0.25) -> List[Tuple[int, float]]:
+    """Fuse BM25 and dense candidates by max-normalized weighted sum.
+
+    Dense hits below ``min_dense_score`` cosine are dropped, so a query with
+    no real match still comes back empty and can fall through to web search.
+    """
+    combined: Dict[int, float] = {}
+    if lexical:
+        top = lexical[0][1] or 1.0
+        for doc_id, score in lexical:
+            combined[doc_id] = (1 - dense_weight) * score / top
+    dense = [(doc_id, score) for doc_id, score in dense if score >= min_dense_score]
+    if dense:
+        top = dense[0][1] or 1.0
+        for doc_id, score in dense:
+            combined[doc_id] = combined.get(doc_id, 0.0) + dense_weight * score / top
+    return sorted(combined.items(), key=lambda item: item[1], reverse=True)[:k]
+
+
+def dense_enabled() -> bool:
+    return DENSE_AVAILABLE and os.getenv("DENSE_RETRIEVAL", "0") == "1"
+
+
+def dense_path(store_path: str) -> str:
+    return str(Path(store_path).with_suffix("")) + ".dense"
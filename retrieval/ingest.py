@@ -0,0 +1,254 @@
+"""Incremental document ingestion into the on-disk chunk store.
+
+    python -m retrieval.ingest [--db data/index/chunks.db] [--workers N] [DIR ...]
+
+Only files whose mtime/size changed are read, and only files whose content
+hash changed are re-extracted, so adding one journal does not re-process the
+rest of the corpus. Extraction fans files, and page ranges of large PDFs, out
+over a process pool; pages stream through the chunker so a worker holds a
+few pages at a time rather than a whole journal.
+"""
+import argparse
+import hashlib
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import PyPDF2
+import docx
+
+from retrieval.bm25 import BM25Index, snapshot_path
+from retrieval.chunking import make_chunker
+from retrieval.dense import DENSE_AVAILABLE, DenseIndex, HashedNgramEmbedder, dense_path
+from retrieval.store import ChunkStore
+from retrieval.text import TOKENIZER_VERSION, tokenize
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+DEFAULT_STORE_PATH = os.getenv("CHUNK_STORE_PATH", "data/index/chunks.db")
+DEFAULT_SOURCE_DIRS = ["data/documents", "data/sistem-pakar"]
+SUPPORTED_SUFFIXES = {".pdf", ".docx"}
+PAGES_PER_TASK = 16
+
+
+def iter_pdf_pages(path: str, start: int = 0, stop: Optional[int] = None) -> Iterator[str]:
+    with open(path, 'rb') as file:
+        reader = PyPDF2.PdfReader(file)
+        for page_number in range(start, len(reader.pages) if stop is None else stop):
+            yield reader.pages[page_number].extract_text() or ""
+
+
+def iter_docx_paragraphs(path: str) -> Iterator[str]:
+    for paragraph in docx.Document(path).paragraphs:
+        yield paragraph.text
+
+
+def pdf_page_count(path: str) -> int:
+    with open(path, 'rb') as file:
+        return len(PyPDF2.PdfReader(file).pages)
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def discover(directories: Iterable[str]) -> List[str]:
+    paths = []
+    for directory in directories:
+        root = Path(directory)
+        if not root.is_dir():
+            continue
+        paths.extend(
+            str(path) for path in sorted(root.rglob("*"))
+            if path.is_file() and path.suffix.lower() in SUPPORTED_SUFFIXES
+        )
+    return paths
+
+
+def extract_range(path: str, start: int, stop: Optional[int], chunking: Tuple = ("words",)) -> Tuple[int, int, List[Tuple[int, int, str, str]]]:
+    """Extract and chunk one unit of work (a PDF page range or a whole DOCX).
+
+    ``chunking`` is the positional arguments of ``make_chunker``.
+    Runs in a pool worker. Returns ``(pages, chars, chunks)``; chunk offsets
+    are relative to the start of the range and rebased by the caller.
+    """
+    pages = 0
+    chars = 0
+
+    def counted(texts):
+        nonlocal pages, chars
+        for text in texts:
+            pages += 1
+            chars += len(text) + 1
+            yield text
+
+    is_pdf = Path(path).suffix.lower() == ".pdf"
+    texts = counted(iter_pdf_pages(path, start, stop) if is_pdf else iter_docx_paragraphs(path))
+    chunks = [(s, e, chunk, " ".join(tokenize(chunk))) for s, e, chunk in make_chunker(*chunking)(texts)]
+    return (pages if is_pdf else 1), chars, chunks
+
+
+def plan_tasks(path: str, pages_per_task: int) -> List[Tuple[str, int, Optional[int]]]:
+    if Path(path).suffix.lower() != ".pdf":
+        return [(path, 0, None)]
+    page_count = pdf_page_count(path)
+    return [
+        (path, start, min(start + pages_per_task, page_count))
+        for start in range(0, page_count, pages_per_task)
+    ] or [(path, 0, 0)]
+
+
+def peak_rss_mb() -> Dict[str, float]:
+    """Peak resident set size of this process and of reaped pool workers."""
+    if resource is None:
+        return {}
+    scale = 1024 * 1024 if os.uname().sysname == "Darwin" else 1024
+    return {
+        "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale,
+        "workers": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale,
+    }
+
+
+def ingest(store: ChunkStore, directories: Iterable[str], workers: Optional[int] = None,
+           pages_per_task: int = PAGES_PER_TASK, chunking: Tuple = ("words",),
+           force: bool = False) -> Dict[str, list]:
+    """Bring the store in line with the files under ``directories``.
+
+    Files in the store outside these folders are left alone.
+    ``workers=1`` extracts in-process; otherwise a process pool is used.
+    ``force`` re-extracts unchanged files too, e.g. after switching chunking.
+    """
+    report = {"added": [], "updated": [], "unchanged": [], "removed": [], "failed": [], "pages": 0}
+    if store.tokenizer_version() != TOKENIZER_VERSION:
+        # The stemmer changed since the store was built; the text is still good
+        print(f"Re-tokenizing stored chunks (tokenizer {store.tokenizer_version()} -> {TOKENIZER_VERSION})")
+        store.retokenize(lambda text: " ".join(tokenize(text)), TOKENIZER_VERSION)
+    directories = list(directories)
+    paths = discover(directories)
+
+    pending = []
+    for path in paths:
+        stat = os.stat(path)
+        existing = store.get_file(path)
+        if not force and existing and existing[1] == stat.st_mtime and existing[2] == stat.st_size:
+            report["unchanged"].append(path)
+            continue
+
+        sha256 = file_sha256(path)
+        if not force and existing and existing[3] == sha256:
+            store.touch_file(path, stat.st_mtime)
+            report["unchanged"].append(path)
+            continue
+
+        try:
+            tasks = plan_tasks(path, pages_per_task)
+        except Exception as e:
+            print(f"Ingestion error for {path}: {e}")
+            report["failed"].append(path)
+            continue
+        pending.append((path, stat, sha256, existing, tasks))
+
+    def run(executor):
+        # Submit every unit up front so small files run alongside large ones
+        submitted = [
+            [executor.submit(extract_range, *task, chunking) for task in tasks] if executor else None
+            for _, _, _, _, tasks in pending
+        ]
+        for (path, stat, sha256, existing, tasks), futures in zip(pending, submitted):
+            chunks = []
+            base = 0
+            try:
+                for i, task in enumerate(tasks):
+                    pages, chars, range_chunks = futures[i].result() if futures else extract_range(*task, chunking)
+                    chunks.extend((base + s, base + e, chunk, tokens) for s, e, chunk, tokens in range_chunks)
+                    base += chars
+                    report["pages"] += pages
+            except Exception as e:
+                print(f"Ingestion error for {path}: {e}")
+                report["failed"].append(path)
+                continue
+            store.replace_file(path, f"Document: {Path(path).name}", stat.st_mtime, stat.st_size, sha256, chunks)
+            report["updated" if existing else "added"].append(path)
+
+    if workers == 1 or not pending:
+        run(None)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            run(executor)
+
+    # A folder that does not exist here (not mounted, another working
+    # directory, an image shipped without the PDFs) removes nothing
+    roots = [directory for directory in directories if Path(directory).is_dir()]
+    report["removed"] = store.remove_missing(paths, roots)
+    return report
+
+
+def build_bm25_snapshot(store: ChunkStore, path: str):
+    """Index every chunk in store order and save the snapshot API workers memory-map."""
+    index = BM25Index()
+    for _, tokens, _ in store.iter_chunks():
+        index.add_tokens(tokens.split())
+    index.save(path, store.signature())
+    print(f"BM25 snapshot: {len(index)} chunks -> {path}")
+
+
+def build_dense_index(store: ChunkStore, path: str, quantize: bool = False):
+    """Embed every chunk in store order and save the matrix next to the store."""
+    if not DENSE_AVAILABLE:
+        print("Skipping dense index: numpy is not installed")
+        return
+    texts = [text for text, _, _ in store.iter_chunks()]
+    DenseIndex.build(HashedNgramEmbedder(), texts, quantize).save(path, store.signature())
+    print(f"Dense index: {len(texts)} chunks -> {path}.npy")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest PDF/DOCX documents into the chunk store")
+    parser.add_argument("directories", nargs="*", default=DEFAULT_SOURCE_DIRS)
+    parser.add_argument("--db", default=DEFAULT_STORE_PATH)
+    parser.add_argument("--workers", type=int, default=None, help="Extraction processes (default: CPU count)")
+    parser.add_argument("--pages-per-task", type=int, default=PAGES_PER_TASK)
+    parser.add_argument("--dense", action="store_true", help="Also build the dense embedding matrix (needs numpy)")
+    parser.add_argument("--quantize", action="store_true", help="Store dense vectors as int8")
+    parser.add_argument("--chunking", choices=("words", "sentences"), default=os.getenv("CHUNKING", "words"),
+                        help="words: ~1000-character chunks; sentences: token-sized sentence chunks with overlap")
+    parser.add_argument("--chunk-tokens", type=int, default=int(os.getenv("CHUNK_TOKENS", 256)))
+    parser.add_argument("--overlap-tokens", type=int, default=int(os.getenv("CHUNK_OVERLAP_TOKENS", 48)))
+    parser.add_argument("--force", action="store_true", help="Re-extract every file, e.g. after changing --chunking")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    store = ChunkStore(args.db)
+    try:
+        chunking = (args.chunking, 1000, args.chunk_tokens, args.overlap_tokens)
+        report = ingest(store, args.directories, args.workers, args.pages_per_task, chunking, args.force)
+        build_bm25_snapshot(store, snapshot_path(args.db))
+        if args.dense:
+            build_dense_index(store, dense_path(args.db), args.quantize)
+    finally:
+        store.close()
+    elapsed = time.perf_counter() - start
+
+    pages = report.pop("pages")
+    for status, paths in report.items():
+        for path in paths:
+            print(f"{status:>9}: {path}")
+    print(f"Done in {elapsed:.2f}s -> {args.db}")
+    if pages:
+        print(f"Extracted {pages} pages ({pages / elapsed:.1f} pages/sec)")
+    rss = peak_rss_mb()
+    if rss:
+        print(f"Peak RSS: parent {rss['self']:.1f} MB, largest worker {rss['workers']:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
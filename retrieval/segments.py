@@ -0,0 +1,255 @@
+import hashlib
+import heapq
+from array import array
+from bisect import bisect_right
+from operator import itemgetter
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple
+
+from retrieval.bm25 import BM25Index
+from retrieval.corpus import Chunk, ChunkCorpus
+from retrieval.dense import DenseIndex, HashedNgramEmbedder
+from retrieval.store import ChunkStore
+from retrieval.text import TOKENIZER_VERSION, tokenize
+
+
+class Segment:
+    """Chunks of a set of files with their own BM25 index.
+
+    Never modified once published, apart from the dense matrix, which is
+    built before publishing (``DocumentIndex.build_dense``) or, for a
+    segment published without one, on first use. ``files`` maps each path
+    to the ``(file id, sha256)`` it was read at and ``file_ids`` gives the
+    file of every chunk. A ``pinned`` segment holds documents loaded outside the chunk
+    store, so a reload can neither supersede nor rebuild it.
+    """
+
+    __slots__ = ("corpus", "index", "dense", "file_ids", "files", "file_chunks", "pinned")
+
+    def __init__(self, corpus: ChunkCorpus, index: BM25Index, file_ids: array,
+                 files: Dict[str, Tuple[int, str]], pinned: bool = False):
+        self.corpus = corpus
+        self.index = index
+        self.dense: Optional[DenseIndex] = None
+        self.file_ids = file_ids
+        self.files = files
+        self.pinned = pinned
+        self.file_chunks: Dict[int, int] = {}
+        for file_id in file_ids:
+            self.file_chunks[file_id] = self.file_chunks.get(file_id, 0) + 1
+
+    def __len__(self) -> int:
+        return len(self.corpus)
+
+    @classmethod
+    def read(cls, store: ChunkStore, versions: Optional[Dict[str, Tuple[int, str]]] = None,
+             index: Optional[BM25Index] = None, progress: Optional[Callable] = None,
+             background: Sequence[BM25Index] = ()) -> "Segment":
+        """Load the files in ``versions`` (default: every file) from ``store``.
+
+        ``index`` is a BM25 index already built over the same chunks in
+        store order (the memory-mapped snapshot); otherwise one is built
+        from the stored tokens, weighted with the statistics of the
+        ``background`` segments it will be searched with. A file re-ingested
+        while it is read is recorded at the version whose chunks were
+        actually read. Tokens stored by an older tokenizer are recomputed
+        from the text.
+        """
+        mapped = index is not None
+        stale_tokens = store.tokenizer_version() != TOKENIZER_VERSION
+        if not mapped:
+            index = BM25Index()
+        corpus = ChunkCorpus()
+        file_ids = array("I")
+        files: Dict[str, Tuple[int, str]] = {}
+        wanted = None if versions is None else [file_id for file_id, _ in versions.values()]
+        for file_id, path, sha256, text, tokens, source in store.iter_file_chunks(wanted):
+            files[path] = (file_id, sha256)
+            corpus.append(text, source)
+            file_ids.append(file_id)
+            if not mapped:
+                index.add_tokens(tokenize(text) if stale_tokens else tokens.split())
+            if progress is not None and len(corpus) % 1000 == 0:
+                progress(chunks=len(corpus))
+        if not mapped:
+            index.finalize(background)
+        # Files without any chunk (e.g. scanned PDFs) are still recorded, so
+        # they are not read again on every reload
+        for path, version in (versions or {}).items():
+            files.setdefault(path, version)
+        return cls(corpus, index, file_ids, files)
+
+    @classmethod
+    def pinned_chunks(cls, chunks: Sequence[str], source: str) -> "Segment":
+        """A segment of chunks that did not come from the store (see ``pinned``)."""
+        corpus = ChunkCorpus()
+        index = BM25Index()
+        for chunk in chunks:
+            corpus.append(chunk, source)
+            index.add(chunk)
+        index.finalize()
+        return cls(corpus, index, array("I", [0] * len(chunks)), {}, pinned=True)
+
+
+class DocumentIndex:
+    """A consistent, read-only view of every searchable chunk.
+
+    A request holds one ``DocumentIndex`` from ranking to reading chunk
+    text; a reload builds the next one aside and the knowledge base swaps a
+    single reference, so a search sees the documents either before or after
+    a reload and never a half-built index. Chunk ids run across the
+    segments, oldest first. A file re-ingested or removed since a segment
+    was built stays in that segment, marked dead by file id and filtered
+    out of results, until a merge rewrites it.
+
+    A new segment is weighted with the document frequencies of the
+    segments already published, so a new journal ranks as it would after a
+    full rebuild; older segments keep their weights until they are merged,
+    which keeps the drift small.
+    """
+
+    __slots__ = ("segments", "dead", "bases", "files", "version", "_dead_chunks")
+
+    def __init__(self, segments: Sequence[Segment] = (), dead: Optional[Sequence[FrozenSet[int]]] = None):
+        self.segments = tuple(segments)
+        self.dead = tuple(dead) if dead is not None else tuple(frozenset() for _ in self.segments)
+        self.bases: List[int] = []
+        # Live version of every store file: path -> (segment, file id, sha256)
+        self.files: Dict[str, Tuple[int, int, str]] = {}
+        total = 0
+        for number, (segment, dead_ids) in enumerate(zip(self.segments, self.dead)):
+            self.bases.append(total)
+            total += len(segment)
+            for path, (file_id, sha256) in segment.files.items():
+                if file_id not in dead_ids:
+                    self.files[path] = (number, file_id, sha256)
+        self._dead_chunks = tuple(
+            sum(segment.file_chunks.get(file_id, 0) for file_id in dead_ids)
+            for segment, dead_ids in zip(self.segments, self.dead)
+        )
+        # Identifies the store files searched, e.g. to tell whether an answer precomputed against them still holds
+        self.version = corpus_version((path, sha256) for path, (_, _, sha256) in self.files.items())
+
+    def __len__(self) -> int:
+        """Live chunks."""
+        return sum(len(segment) for segment in self.segments) - sum(self._dead_chunks)
+
+    def _locate(self, doc_id: int) -> Tuple[Segment, int]:
+        number = bisect_right(self.bases, doc_id) - 1
+        return self.segments[number], doc_id - self.bases[number]
+
+    def __getitem__(self, doc_id: int) -> Chunk:
+        segment, local = self._locate(doc_id)
+        return Chunk(doc_id, segment.corpus.text(local), segment.corpus.source(local))
+
+    def _live(self, hits: List[Tuple[int, float]], number: int, k: int) -> List[Tuple[int, float]]:
+        dead = self.dead[number]
+        if dead:
+            file_ids = self.segments[number].file_ids
+            hits = [(doc_id, score) for doc_id, score in hits if file_ids[doc_id] not in dead]
+        base = self.bases[number]
+        return [(base + doc_id, score) for doc_id, score in hits[:k]]
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[int, float]]:
+        """BM25 ``(doc_id, score)`` pairs over the live chunks of every segment, best first."""
+        if len(self.segments) == 1:
+            return self._live(self.segments[0].index.search(query, k + self._dead_chunks[0]), 0, k)
+        hits = []
+        for number, segment in enumerate(self.segments):
+            # Over-fetch by the segment's dead chunks so k live ones remain
+            hits.extend(self._live(segment.index.search(query, k + self._dead_chunks[number]), number, k))
+        return heapq.nlargest(k, hits, key=itemgetter(1))
+
+    def score_bound(self, query: str) -> float:
+        return max((segment.index.score_bound(query) for segment in self.segments), default=0.0)
+
+    def build_dense(self, embedder: HashedNgramEmbedder, quantize: bool = False):
+        """Embed the segments that have no dense matrix yet, e.g. before publishing this view."""
+        for segment in self.segments:
+            if len(segment) and (segment.dense is None or len(segment.dense) != len(segment)):
+                # Later segments reuse the first one's IDF, so all share one vector space
+                segment.dense = DenseIndex.build(embedder, list(segment.corpus), quantize, fit=embedder.idf is None)
+
+    def dense_search(self, embedder: HashedNgramEmbedder, query: str, k: int,
+                     quantize: bool = False) -> List[Tuple[int, float]]:
+        """Dense ``(doc_id, cosine)`` pairs; a segment published without a matrix gets one here."""
+        self.build_dense(embedder, quantize)
+        query_vector = embedder.embed([query])[0]
+        hits = []
+        for number, segment in enumerate(self.segments):
+            if not len(segment):
+                continue
+            hits.extend(self._live(segment.dense.search(query_vector, k + self._dead_chunks[number]), number, k))
+        return heapq.nlargest(k, hits, key=itemgetter(1))
+
+    def changes(self, versions: Dict[str, Tuple[int, str]]) -> Tuple[List[str], List[str]]:
+        """``(changed, removed)`` store paths: new or re-ingested since this view was built, and gone."""
+        changed = [path for path, version in versions.items() if self.files.get(path, (None,))[1:] != version]
+        removed = [path for path in self.files if path not in versions]
+        return changed, removed
+
+    def refreshed(self, store: ChunkStore, max_segments: int = 4, max_dead_ratio: float = 0.3,
+                  compact: bool = False) -> Optional["DocumentIndex"]:
+        """The next view after re-reading ``store``, or None when nothing changed.
+
+        New and re-ingested files go into one new segment; earlier copies
+        of them, and removed files, are marked dead. A segment that is more
+        than ``max_dead_ratio`` dead is merged into the new one (re-read
+        from the store), and so are the smallest segments while there would
+        be more than ``max_segments``. ``compact`` merges every segment.
+        """
+        versions = store.file_versions()
+        changed, removed = self.changes(versions)
+        dead = [set(dead_ids) for dead_ids in self.dead]
+        for path in changed + removed:
+            if path in self.files:
+                number, file_id, _ = self.files[path]
+                dead[number].add(file_id)
+
+        mergeable = [number for number, segment in enumerate(self.segments) if not segment.pinned]
+        if compact:
+            merged = set(mergeable) if changed or removed or len(mergeable) > 1 or any(dead[n] for n in mergeable) else set()
+        else:
+            merged = {
+                number for number in mergeable
+                if len(self.segments[number]) and self._dead_ratio(number, dead[number]) > max_dead_ratio
+            }
+            by_size = sorted((n for n in mergeable if n not in merged), key=lambda n: len(self.segments[n]))
+            while by_size and len(self.segments) - len(merged) + bool(changed or merged) > max_segments:
+                merged.add(by_size.pop(0))
+        if not changed and not removed and not merged:
+            return None
+
+        paths = set(changed)
+        for path, (number, _, _) in self.files.items():
+            if number in merged and path in versions:
+                paths.add(path)
+        segments = [segment for number, segment in enumerate(self.segments) if number not in merged]
+        kept_dead = [frozenset(dead[number]) for number in range(len(self.segments)) if number not in merged]
+        if paths:
+            background = [segment.index for segment in segments]
+            segments.append(Segment.read(store, {path: versions[path] for path in paths}, background=background))
+            kept_dead.append(frozenset())
+        return DocumentIndex(segments, kept_dead)
+
+    def _dead_ratio(self, number: int, dead_ids: Iterable[int]) -> float:
+        segment = self.segments[number]
+        return sum(segment.file_chunks.get(file_id, 0) for file_id in dead_ids) / len(segment)
+
+    def stats(self) -> Dict:
+        return {
+            "segments": [
+                {"chunks": len(segment), "dead_chunks": dead_chunks, "files": len(segment.files), "pinned": segment.pinned}
+                for segment, dead_chunks in zip(self.segments, self._dead_chunks)
+            ],
+            "live_chunks": len(self),
+            "files": len(self.files),
+            "version": self.version,
+        }
+
+
+def corpus_version(files: Iterable[Tuple[str, str]]) -> str:
+    """Short digest of ``(path, sha256)`` pairs, independent of their order."""
+    digest = hashlib.sha1()
+    for path, sha256 in sorted(files):
+        digest.update(f"{path}\x1f{sha256}\n".encode("utf-8"))
+    return digest.hexdigest()[:16]
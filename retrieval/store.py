@@ -0,0 +1,141 @@
+import sqlite3
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from retrieval.text import TOKENIZER_VERSION
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    source TEXT NOT NULL,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    sha256 TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    id INTEGER PRIMARY KEY,
+    file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    seq INTEGER NOT NULL,
+    start INTEGER NOT NULL,
+    end INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    tokens TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS chunks_file ON chunks(file_id, seq);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+class ChunkStore:
+    """SQLite-backed store of extracted chunks, their offsets and source files.
+
+    Written by the ingestion command; API workers open it with ``read_only=True``
+    and stream chunks (with pre-tokenized text) straight into the index.
+    """
+
+    def __init__(self, path: str, read_only: bool = False):
+        self.path = path
+        if read_only:
+            self.conn = sqlite3.connect(f"file:{Path(path).as_posix()}?mode=ro", uri=True)
+        else:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self.conn = sqlite3.connect(path)
+            self.conn.execute("PRAGMA foreign_keys=ON")
+            self.conn.executescript(SCHEMA)
+            if self.conn.execute("SELECT 1 FROM chunks LIMIT 1").fetchone() is None:
+                # Nothing tokenized yet: what is stored from now on is current
+                self._set_meta("tokenizer_version", TOKENIZER_VERSION)
+
+    def close(self):
+        self.conn.close()
+
+    def _set_meta(self, key: str, value):
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def tokenizer_version(self) -> int:
+        """``TOKENIZER_VERSION`` the stored tokens were made with (1 before it was recorded)."""
+        try:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = 'tokenizer_version'").fetchone()
+        except sqlite3.OperationalError:  # opened read-only, from before the meta table
+            row = None
+        return int(row[0]) if row else 1
+
+    def retokenize(self, tokens_of: Callable[[str], str], version: int):
+        """Recompute every chunk's tokens from its text, e.g. after the stemmer changed."""
+        with self.conn:
+            rows = self.conn.execute("SELECT id, text FROM chunks").fetchall()
+            self.conn.executemany("UPDATE chunks SET tokens = ? WHERE id = ?",
+                                  [(tokens_of(text), chunk_id) for chunk_id, text in rows])
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('tokenizer_version', ?)",
+                              (str(version),))
+
+    def get_file(self, path: str) -> Optional[Tuple[int, float, int, str]]:
+        """Return ``(id, mtime, size, sha256)`` for an ingested file, or None."""
+        return self.conn.execute(
+            "SELECT id, mtime, size, sha256 FROM files WHERE path = ?", (path,)
+        ).fetchone()
+
+    def touch_file(self, path: str, mtime: float):
+        with self.conn:
+            self.conn.execute("UPDATE files SET mtime = ? WHERE path = ?", (mtime, path))
+
+    def replace_file(self, path: str, source: str, mtime: float, size: int, sha256: str,
+                     chunks: List[Tuple[int, int, str, str]]):
+        """Atomically replace a file's chunks; each chunk is ``(start, end, text, tokens)``."""
+        with self.conn:
+            self.conn.execute("DELETE FROM files WHERE path = ?", (path,))
+            file_id = self.conn.execute(
+                "INSERT INTO files (path, source, mtime, size, sha256) VALUES (?, ?, ?, ?, ?)",
+                (path, source, mtime, size, sha256),
+            ).lastrowid
+            self.conn.executemany(
+                "INSERT INTO chunks (file_id, seq, start, end, text, tokens) VALUES (?, ?, ?, ?, ?, ?)",
+                [(file_id, seq, start, end, text, tokens) for seq, (start, end, text, tokens) in enumerate(chunks)],
+            )
+
+    def remove_missing(self, present_paths, roots: Iterable[str]) -> List[str]:
+        """Delete the files under ``roots`` that are not in ``present_paths``."""
+        present = set(present_paths)
+        roots = [Path(root) for root in roots]
+        missing = [
+            path for (path,) in self.conn.execute("SELECT path FROM files")
+            if path not in present and any(Path(path).is_relative_to(root) for root in roots)
+        ]
+        with self.conn:
+            self.conn.executemany("DELETE FROM files WHERE path = ?", [(path,) for path in missing])
+        return missing
+
+    def file_versions(self) -> Dict[str, Tuple[int, str]]:
+        """``{path: (id, sha256)}`` of every ingested file; re-ingesting a file gives it a new row."""
+        return {path: (file_id, sha256) for file_id, path, sha256 in self.conn.execute("SELECT id, path, sha256 FROM files")}
+
+    def signature(self) -> Tuple[int, int, int]:
+        """``(chunk count, highest chunk id, tokenizer version)``: changes whenever
+        any file is re-ingested or the stored tokens are recomputed."""
+        count, last_id = self.conn.execute("SELECT COUNT(*), COALESCE(MAX(id), 0) FROM chunks").fetchone()
+        return count, last_id, self.tokenizer_version()
+
+    def iter_chunks(self) -> Iterator[Tuple[str, str, str]]:
+        """Yield ``(text, tokens, source)`` for every chunk in file/sequence order."""
+        yield from self.conn.execute(
+            "SELECT c.text, c.tokens, f.source FROM chunks c JOIN files f ON f.id = c.file_id "
+            "ORDER BY c.file_id, c.seq"
+        )
+
+    def iter_file_chunks(self, file_ids: Optional[Iterable[int]] = None) -> Iterator[Tuple[int, str, str, str, str, str]]:
+        """Yield ``(file id, path, sha256, text, tokens, source)`` in the order of ``iter_chunks``,
+        for every file or only ``file_ids``."""
+        query = (
+            "SELECT c.file_id, f.path, f.sha256, c.text, c.tokens, f.source FROM chunks c "
+            "JOIN files f ON f.id = c.file_id"
+        )
+        if file_ids is None:
+            yield from self.conn.execute(query + " ORDER BY c.file_id, c.seq")
+            return
+        for file_id in sorted(file_ids):
+            yield from self.conn.execute(query + " WHERE c.file_id = ? ORDER BY c.seq", (file_id,))
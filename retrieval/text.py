@@ -0,0 +1,228 @@
+import re
+from functools import lru_cache
+from typing import Iterator, List, Tuple
+
+try:
+    import tiktoken
+except ImportError:  # exact BPE counts are optional
+    tiktoken = None
+
+# Word characters only: drops punctuation, digits stay (e.g. "trimester 2", "asam folat 400")
+_TOKEN_RE = re.compile(r"[^\W_]+", re.UNICODE)
+
+STOPWORDS = frozenset("""
+ada adalah agar akan aku anda apa apakah atau bagaimana bagi bahwa baik banyak
+bawah beberapa belum berapa bila bisa boleh buat bukan cara dalam dan dapat dari
+demikian dengan di dia ini itu jadi jangan jika juga kalau kami kamu karena ke
+kembali kenapa ketika kita lagi lain lalu lebih maka mana masih mau melalui
+memang mengapa menjadi mereka mungkin namun nya oleh pada para pula saat saja
+sama sangat saya sebagai sebelum sedang sehingga sejak seperti serta setelah
+siapa sudah supaya tanpa tapi telah tentang tersebut tetapi untuk yaitu yang
+a an and are as at be by for from how in is it of on or that the this to was
+what when where which who why with you your
+""".split())
+
+# Bump whenever tokenize() output changes: chunk tokens stored by an
+# earlier version are recomputed (see ChunkStore.tokenizer_version)
+TOKENIZER_VERSION = 3
+
+_PARTICLES = ("lah", "kah", "tah", "pun")
+_POSSESSIVES = ("nya", "ku", "mu")
+_SUFFIXES = ("kan", "an", "i")
+_VOWELS = "aeiou"
+_MIN_STEM = 3
+# Letters a plain (non-nasal) prefix must leave: "se" + "hat" and "di" + "are" are roots
+_MIN_PREFIXED = 4
+
+# Roots the affix rules alone would get wrong: words that start like a
+# prefixed word ("sehat", "periksa"), roots whose prefixed form is
+# ambiguous (me- + "pilih" and me- + "minum" both give "mem" + vowel) and
+# roots ending like a suffix ("konsumsi")
+_ROOTS = frozenset("""
+ajar bedah bengkak diabetes diagnosa diagnosis diare diet dinding dingin kejang
+keluar keluarga kepala keringat ketuban konsumsi kurang nilai pakai pantau
+pecah pegal pening periksa perlu perut pijat pikir pilih potong pukul renang sehat
+selaput sembelit sendi serat serum sesak
+""".split())
+
+
+def _prefix_candidates(word: str) -> List[str]:
+    """Possible roots of ``word`` after removing one prefix.
+
+    The first is what the affix rules pick (``word`` itself when no prefix
+    applies); the others are only taken when they are in ``_ROOTS``.
+    """
+    # per- before a consonant: perdarahan, persalinan; "perlu", "pernah" are roots
+    if word.startswith("per") and word[3:4] and word[3] not in _VOWELS:
+        if word[3] != "r" and len(word) - 3 >= _MIN_PREFIXED:
+            return [word[3:]]
+        return [word]
+    for head in ("me", "pe"):
+        if not word.startswith(head):
+            continue
+        rest = word[2:]
+        if rest.startswith("ng") and rest[2:3] in _VOWELS + "ghk" and len(rest) - 2 >= _MIN_STEM:
+            # meng- + vowel also stands for a root in k-: mengurangi
+            return [rest[2:], "k" + rest[2:]] if rest[2] in _VOWELS else [rest[2:]]
+        if rest.startswith("ny") and rest[2:3] in _VOWELS and len(rest) - 1 >= _MIN_STEM:
+            return ["s" + rest[2:]]
+        if rest.startswith("m") and len(rest) - 1 >= _MIN_STEM:
+            if rest[1] in "bfvp":
+                return [rest[1:]]
+            # The root may start with m (memakan) or p (memilih); m is tried first
+            return [rest, "p" + rest[1:]] if len(rest) >= _MIN_PREFIXED else [word, "p" + rest[1:]]
+        if rest.startswith("n") and len(rest) - 1 >= _MIN_STEM:
+            return [rest[1:]] if rest[1] in "cdjz" else ["t" + rest[1:], rest]
+        if rest[:1] in "lrwy" and len(rest) >= _MIN_STEM:
+            # pel- + ajar: pelajaran
+            return [rest, rest[1:]] if rest[0] == "l" else [rest]
+        if head == "pe" and len(rest) >= _MIN_PREFIXED:
+            return [rest]
+        return [word]
+    for prefix in ("ber", "ter"):
+        if word.startswith(prefix) and word[3:4] not in ("", "r"):
+            rest = word[3:] if len(word) - 3 >= _MIN_PREFIXED else word
+            # ber- + renang is written "berenang"
+            return [rest, word[2:]] if word[3] in _VOWELS else [rest]
+    if word.startswith("be") and len(word) - 2 >= _MIN_PREFIXED:
+        rest = word[2:]
+        # Plain be- only comes before a root in r- (berenang) or with "er"
+        # (bekerja); "bel" + ajar is the one other form
+        if (rest[0] == "r" and rest[1] in _VOWELS) or rest[1:3] == "er":
+            return [rest]
+        return [word, rest[1:]] if rest[0] == "l" else [word]
+    for prefix in ("di", "ke", "se"):
+        if word.startswith(prefix) and len(word) - 2 >= _MIN_PREFIXED:
+            return [word[2:]]
+    return [word]
+
+
+@lru_cache(maxsize=65536)
+def stem(word: str) -> str:
+    """Light rule-based Indonesian stemmer (Nazief-Adriani style, small root list).
+
+    Strips particles, possessives, one derivational suffix and up to two
+    derivational prefixes (memperhatikan -> hati), never leaving fewer than
+    three characters (four after a plain prefix). A root in ``_ROOTS`` is
+    kept whole and preferred over what the rules would give. When a prefix
+    only comes off with the suffix left on, the suffix is part of the root:
+    "dimakan" is di- + makan, not "dima" + -kan.
+    """
+    if len(word) <= 4 or not word.isalpha():
+        return word
+
+    for particle in _PARTICLES:
+        if word.endswith(particle) and len(word) - len(particle) > _MIN_STEM:
+            word = word[:-len(particle)]
+            break
+
+    for possessive in _POSSESSIVES:
+        if word.endswith(possessive) and len(word) - len(possessive) > _MIN_STEM:
+            word = word[:-len(possessive)]
+            break
+
+    bases = [word]
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) > _MIN_STEM:
+            bases.insert(0, word[:-len(suffix)])
+            break
+
+    ruled = []
+    for base in bases:
+        if base in _ROOTS:
+            return base
+        for number, candidate in enumerate(_prefix_candidates(base)):
+            inner = _prefix_candidates(candidate) if candidate != base else [candidate]
+            for option in [candidate] + inner:
+                if option in _ROOTS:
+                    return option
+            if number == 0:
+                ruled.append((base, inner[0]))
+    for base, stripped in ruled:
+        if stripped != base:
+            return stripped
+    return bases[0]
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase, strip punctuation, drop stopwords and stem."""
+    return [
+        stem(token)
+        for token in _TOKEN_RE.findall(text.lower())
+        if token not in STOPWORDS
+    ]
+
+
+def normalize(text: str) -> str:
+    """Lowercase and strip punctuation/extra whitespace, keeping every word."""
+    return " ".join(_TOKEN_RE.findall(text.lower()))
+
+
+# Sentence ends at ., ! or ? (possibly repeated or followed by a closing quote/bracket) before whitespace
+_SENTENCE_END_RE = re.compile(r"[.!?]+[\"')\]]*(?=\s)")
+# BPE-ish pieces: a run of letters, a run of digits, or one other symbol
+_PIECE_RE = re.compile(r"[^\W\d_]+|\d+|[^\w\s]", re.UNICODE)
+
+
+def iter_sentences(text: str) -> Iterator[Tuple[int, int]]:
+    """``(start, end)`` offsets of the sentences in ``text``, trailing text included."""
+    start = 0
+    for match in _SENTENCE_END_RE.finditer(text):
+        if text[start:match.end()].strip():
+            yield start, match.end()
+        start = match.end()
+    if text[start:].strip():
+        yield start, len(text)
+
+
+def split_sentences(text: str) -> List[str]:
+    return [text[start:end].strip() for start, end in iter_sentences(text)]
+
+
+_encoding = None
+_encoding_loaded = False
+_encoding_deferred = False
+
+
+def load_encoding():
+    """The tiktoken vocabulary, loaded once; None (estimate counts) without tiktoken or if it fails.
+
+    The vocabulary file is downloaded on first use on a cold host, so the
+    server loads it in a warm-up stage rather than inside a request.
+    """
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded and tiktoken is not None:
+        try:
+            # cl100k is GPT-4's vocabulary; Llama 3's tiktoken-based one counts within a few percent
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            print(f"tiktoken unavailable, estimating token counts: {e}")
+    _encoding_loaded = True
+    return _encoding
+
+
+def defer_encoding():
+    """Estimate counts until ``load_encoding`` has run, instead of loading on first use."""
+    global _encoding_deferred
+    _encoding_deferred = True
+
+
+def count_tokens(text: str) -> int:
+    """Prompt tokens in ``text``: exact with tiktoken installed, else a local estimate.
+
+    The estimate mimics BPE on Indonesian/English prose: a word costs one
+    token per ~4 letters (common short words are one token), digit runs one
+    per 3 digits, and every other symbol one token.
+    """
+    encoding = _encoding if _encoding_loaded or _encoding_deferred else load_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    tokens = 0
+    for piece in _PIECE_RE.findall(text):
+        if piece.isdigit():
+            tokens += (len(piece) + 2) // 3
+        elif piece.isalpha():
+            tokens += (len(piece) + 3) // 4
+        else:
+            tokens += 1
+    return tokens
@@ -0,0 +1,155 @@
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from retrieval.text import tokenize
+
+
+class WebSnippet:
+    __slots__ = ("title", "body", "link", "added", "terms", "length")
+
+    def __init__(self, title: str, body: str, link: str, added: float):
+        self.title = title
+        self.body = body
+        self.link = link
+        self.added = added
+        tokens = tokenize(f"{title} {body}")
+        self.terms: Dict[str, int] = {}
+        for token in tokens:
+            self.terms[token] = self.terms.get(token, 0) + 1
+        self.length = len(tokens)
+
+    def as_result(self) -> Dict[str, str]:
+        return {"title": self.title, "body": self.body, "link": self.link}
+
+
+class WebSnippetIndex:
+    """Recent web search results, kept so similar questions skip SerpAPI.
+
+    Every result of a web search is added (one entry per link; a repeat
+    refreshes it) and scored with BM25 against later queries. Entries older
+    than ``max_age`` seconds, or beyond the ``max_items`` most recent, are
+    evicted. Only snippets containing at least ``min_coverage`` of the
+    query's words are returned, numbers aside (a week or trimester number
+    rarely changes the answer). With the default of all of them, a question
+    about "jamu" is never answered from snippets about "kopi" just because
+    both mention "hamil" and "minum"; weighting words by IDF does not
+    prevent that, since the most asked-about topic has the lowest IDF.
+    """
+
+    def __init__(self, max_items: int = 5000, max_age: float = 6 * 3600.0, min_coverage: float = 1.0,
+                 k1: float = 1.2, b: float = 0.75):
+        self.max_items = max_items
+        self.max_age = max_age
+        self.min_coverage = min_coverage
+        self.k1 = k1
+        self.b = b
+        self._entries: "OrderedDict[str, WebSnippet]" = OrderedDict()
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._total_length = 0
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    @classmethod
+    def from_env(cls) -> Optional["WebSnippetIndex"]:
+        """WEB_INDEX=0 disables it; WEB_INDEX_SIZE, WEB_INDEX_MAX_AGE (seconds)
+        and WEB_INDEX_MIN_COVERAGE tune it."""
+        if os.getenv("WEB_INDEX", "1") == "0":
+            return None
+        return cls(
+            max_items=int(os.getenv("WEB_INDEX_SIZE", 5000)),
+            max_age=float(os.getenv("WEB_INDEX_MAX_AGE", 6 * 3600)),
+            min_coverage=float(os.getenv("WEB_INDEX_MIN_COVERAGE", 1.0)),
+        )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _remove(self, link: str):
+        entry = self._entries.pop(link)
+        for term in entry.terms:
+            postings = self._postings[term]
+            del postings[link]
+            if not postings:
+                del self._postings[term]
+        self._total_length -= entry.length
+
+    def evict(self, now: Optional[float] = None):
+        now = time.time() if now is None else now
+        while self._entries:
+            link, oldest = next(iter(self._entries.items()))
+            if len(self._entries) <= self.max_items and now - oldest.added <= self.max_age:
+                break
+            self._remove(link)
+            self.evicted += 1
+
+    def add(self, results: List[Dict[str, str]], now: Optional[float] = None) -> int:
+        """Index ``{"title", "body", "link"}`` search results; returns how many were added."""
+        now = time.time() if now is None else now
+        added = 0
+        for result in results:
+            link = result.get("link")
+            if not link:
+                continue
+            if link in self._entries:
+                self._remove(link)
+            entry = WebSnippet(result.get("title", ""), result.get("body", ""), link, now)
+            if not entry.length:
+                continue
+            self._entries[link] = entry
+            for term, tf in entry.terms.items():
+                self._postings.setdefault(term, {})[link] = tf
+            self._total_length += entry.length
+            added += 1
+        self.evict(now)
+        return added
+
+    def _idf(self, term: str) -> float:
+        df = len(self._postings.get(term, ()))
+        n = len(self._entries)
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, k: int = 5, now: Optional[float] = None) -> List[Tuple[Dict[str, str], float]]:
+        """Up to ``k`` ``(result, score)`` pairs covering the query, best first."""
+        self.evict(now)
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or not self._entries:
+            self.misses += 1
+            return []
+
+        idf = {term: self._idf(term) for term in terms}
+        avgdl = self._total_length / len(self._entries)
+        scores: Dict[str, float] = {}
+        for term in terms:
+            for link, tf in self._postings.get(term, {}).items():
+                norm = tf + self.k1 * (1 - self.b + self.b * self._entries[link].length / avgdl)
+                scores[link] = scores.get(link, 0.0) + idf[term] * tf * (self.k1 + 1) / norm
+        if not scores:
+            self.misses += 1
+            return []
+
+        words = [term for term in terms if not term.isdigit()]
+        needed = self.min_coverage * len(words)
+        ranked = []
+        for link, score in sorted(scores.items(), key=lambda item: item[1], reverse=True):
+            entry = self._entries[link]
+            if sum(term in entry.terms for term in words) >= needed:
+                ranked.append((entry.as_result(), score))
+                if len(ranked) == k:
+                    break
+        if not ranked:
+            self.misses += 1
+            return []
+        self.hits += 1
+        return ranked
+
+    def stats(self) -> Dict:
+        return {
+            "snippets": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evicted": self.evicted,
+        }
@@ -0,0 +1,135 @@
+import asyncio
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from cache import TTLCache
+
+
+class SearchError(Exception):
+    pass
+
+
+class SearchService:
+    """Single SerpAPI access path for chat web search and the expert system.
+
+    Calls SerpAPI's JSON endpoint with native async HTTP, bounded by a
+    semaphore. Responses are cached for ``cache_ttl`` seconds, concurrent
+    identical queries share one upstream request (single-flight), and
+    requests rotate across every configured API key, putting a key on
+    cooldown when SerpAPI rejects it (401/429).
+    """
+
+    def __init__(self, api_keys: List[str], base_url: str = "https://serpapi.com",
+                 cache_ttl: float = 3600.0, cache_size: int = 2048, max_concurrency: int = 8,
+                 timeout: float = 10.0, key_cooldown: float = 300.0):
+        self.api_keys = [key for key in api_keys if key]
+        self.base_url = base_url.rstrip("/")
+        self.cache = TTLCache(cache_size, cache_ttl)
+        self.timeout = timeout
+        self.key_cooldown = key_cooldown
+        self.current_key_index = -1
+        self.key_blocked_until: Dict[str, float] = {}
+        self.upstream_calls = 0
+        self.cache_hits = 0
+        self.coalesced = 0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._http: Optional[httpx.AsyncClient] = None
+
+    @classmethod
+    def from_env(cls) -> "SearchService":
+        """Keys come from SERPAPI_KEYS (comma separated) and SERPAPI_KEY_1..SERPAPI_KEY_9."""
+        keys = [key.strip() for key in os.getenv("SERPAPI_KEYS", "").split(",")]
+        keys += [os.getenv(f"SERPAPI_KEY_{i}", "") for i in range(1, 10)]
+        return cls(
+            list(dict.fromkeys(key for key in keys if key)),
+            base_url=os.getenv("SERPAPI_BASE_URL", "https://serpapi.com"),
+            cache_ttl=float(os.getenv("SEARCH_CACHE_TTL", 3600)),
+            max_concurrency=int(os.getenv("SERPAPI_MAX_CONCURRENCY", 8)),
+        )
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(timeout=self.timeout)
+        return self._http
+
+    async def close(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    def _get_next_api_key(self) -> Optional[str]:
+        now = time.monotonic()
+        for _ in range(len(self.api_keys)):
+            self.current_key_index = (self.current_key_index + 1) % len(self.api_keys)
+            key = self.api_keys[self.current_key_index]
+            if self.key_blocked_until.get(key, 0) <= now:
+                return key
+        return None
+
+    async def search_raw(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Run a SerpAPI query (without ``api_key``) and return its JSON body."""
+        cache_key = json.dumps(params, sort_keys=True)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            self.cache_hits += 1
+            return cached
+
+        # Single-flight: identical concurrent queries await one upstream task,
+        # which keeps running (and fills the cache) even if a caller goes away
+        task = self._inflight.get(cache_key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_and_cache(cache_key, params))
+            self._inflight[cache_key] = task
+            task.add_done_callback(lambda done: self._finish(cache_key, done))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, cache_key: str, task: asyncio.Future):
+        self._inflight.pop(cache_key, None)
+        if not task.cancelled():
+            task.exception()  # mark retrieved; callers have already seen it
+
+    async def _fetch_and_cache(self, cache_key: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        result = await self._fetch(params)
+        self.cache.set(cache_key, result)
+        return result
+
+    async def _fetch(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        async with self._semaphore:
+            for _ in range(max(len(self.api_keys), 1)):
+                key = self._get_next_api_key() if self.api_keys else None
+                if key is None:
+                    raise SearchError("No SerpAPI key available")
+
+                self.upstream_calls += 1
+                response = await self.http.get(f"{self.base_url}/search.json", params={**params, "api_key": key})
+                if response.status_code in (401, 429):
+                    self.key_blocked_until[key] = time.monotonic() + self.key_cooldown
+                    print(f"SerpAPI key ...{key[-4:]} rejected ({response.status_code}), rotating")
+                    continue
+
+                result = response.json()
+                if response.status_code != 200 or "error" in result:
+                    raise SearchError(result.get("error", f"HTTP {response.status_code}"))
+                return result
+            raise SearchError("All SerpAPI keys rejected")
+
+    async def organic_results(self, query: str, num: int = 5, **params) -> List[Dict[str, Any]]:
+        result = await self.search_raw({"engine": "google", "q": query, "num": num, **params})
+        return result.get("organic_results", [])[:num]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "upstream_calls": self.upstream_calls,
+            "cache_hits": self.cache_hits,
+            "coalesced": self.coalesced,
+            "keys": len(self.api_keys),
+            "keys_on_cooldown": sum(1 for until in self.key_blocked_until.values() if until > time.monotonic()),
+        }
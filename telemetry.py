@@ -0,0 +1,249 @@
+"""Low-overhead request tracing and Prometheus metrics.
+
+Spans are timed with ``perf_counter`` and attached to the current request's
+trace through a context variable; every span also feeds the
+``pregna_stage_seconds`` histogram. Nothing here does I/O on the request
+path except the sampled slow-request log.
+"""
+import json
+import os
+import random
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+ENABLED = os.getenv("TELEMETRY_ENABLED", "1") != "0"
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_MS", 2000)) / 1000
+SLOW_LOG_SAMPLE_RATE = float(os.getenv("SLOW_LOG_SAMPLE_RATE", 0.1))
+SLOW_LOG_PATH = os.getenv("SLOW_LOG_PATH", "logs/slow_requests.jsonl")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{str(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        REGISTRY.append(self)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        super().__init__(name, help, labels)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        return self.header() + [
+            f"{self.name}{_format_labels(self.label_names, labels)} {value}"
+            for labels, value in self.values.items()
+        ]
+
+
+class CallbackMetric(Metric):
+    """Values read from a callback at scrape time, for stats kept elsewhere
+    (cache and search counters)."""
+
+    def __init__(self, name: str, help: str, callback: Callable[[], Dict[Tuple[str, ...], float]],
+                 labels: Tuple[str, ...] = (), kind: str = "gauge"):
+        super().__init__(name, help, labels)
+        self.kind = kind
+        self.callback = callback
+
+    def render(self) -> List[str]:
+        return self.header() + [
+            f"{self.name}{_format_labels(self.label_names, labels)} {value}"
+            for labels, value in self.callback().items()
+        ]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        # labels -> [bucket counts..., +Inf count, sum]
+        self.series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *labels: str):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for labels, series in self.series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, labels)} {series[-1]}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+
+REGISTRY: List[Metric] = []
+
+
+def render_metrics() -> str:
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+
+REQUEST_LATENCY = Histogram(
+    "pregna_request_seconds", "HTTP request latency", ("route", "version", "status")
+)
+STAGE_LATENCY = Histogram(
+    "pregna_stage_seconds", "Latency of traced request stages", ("stage",)
+)
+LLM_LATENCY = Histogram(
+    "pregna_llm_request_seconds", "Provider call latency per model version and provider", ("version", "provider", "outcome")
+)
+LLM_EVENTS = Counter(
+    "pregna_llm_events_total", "Router hedges, hedge wins and fallbacks", ("version", "event")
+)
+DIAGNOSIS_PARSES = Counter(
+    "pregna_diagnosis_parses_total", "Diagnosis LLM outputs by parse outcome", ("outcome",)
+)
+DIAGNOSIS_PATHS = Counter(
+    "pregna_diagnosis_paths_total", "Diagnoses by path: rules only, rules + LLM narrative, full LLM", ("path",)
+)
+CONTEXT_TOKENS = Histogram(
+    "pregna_context_tokens", "Tokens of context packed into the prompt, by context kind", ("kind",),
+    buckets=(50, 100, 200, 300, 400, 600, 800, 1000, 1500, 2000, 4000)
+)
+LOCAL_ANSWERS = Counter(
+    "pregna_local_answers_total", "Small-talk messages answered locally by intent", ("intent",)
+)
+CONTEXT_PLANS = Counter(
+    "pregna_context_plans_total", "Web-search-enabled questions by context source and speculation outcome", ("plan",)
+)
+ADMISSION_REJECTIONS = Counter(
+    "pregna_admission_rejections_total", "Requests answered 429, by tier and gate (rate, queue, jobs)", ("tier", "reason")
+)
+INDEX_RELOADS = Counter(
+    "pregna_index_reloads_total", "Document index reloads by kind (incremental, compact) and outcome", ("kind", "outcome")
+)
+JOBS = Counter(
+    "pregna_jobs_total", "Background jobs finished, by kind and outcome (succeeded, failed)", ("kind", "outcome")
+)
+JOB_WAIT = Histogram(
+    "pregna_job_wait_seconds", "Time from submitting a job to each attempt starting", ("kind",),
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+)
+LOOP_BLOCKS = Counter(
+    "pregna_event_loop_blocks_total", "Event-loop stalls longer than LOOP_BLOCK_MS (profiling.LoopWatchdog)"
+)
+ADMISSION_WAIT = Histogram(
+    "pregna_admission_wait_seconds", "Time queued for a provider-call slot", ("tier",),
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0)
+)
+
+
+class Trace:
+    __slots__ = ("route", "started", "spans", "attributes")
+
+    def __init__(self, route: str):
+        self.route = route
+        self.started = time.perf_counter()
+        self.spans: List[Tuple[str, float, float]] = []
+        self.attributes: Dict[str, str] = {}
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+
+
+def set_attribute(key: str, value) -> None:
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.attributes[key] = str(value)
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Time a stage of the current request (usable in sync and async code)."""
+    if not ENABLED:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_LATENCY.observe(elapsed, name)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.spans.append((name, round((started - trace.started) * 1000, 3), round(elapsed * 1000, 3)))
+
+
+def _write_slow_request(trace: Trace, status: int, elapsed: float):
+    record = {
+        "ts": time.time(),
+        "route": trace.route,
+        "status": status,
+        "duration_ms": round(elapsed * 1000, 1),
+        "attributes": trace.attributes,
+        "spans": [{"name": n, "start_ms": s, "duration_ms": d} for n, s, d in trace.spans],
+    }
+    try:
+        Path(SLOW_LOG_PATH).parent.mkdir(parents=True, exist_ok=True)
+        with open(SLOW_LOG_PATH, "a") as file:
+            file.write(json.dumps(record) + "\n")
+    except OSError as e:
+        print(f"Slow request log error: {e}")
+
+
+class TelemetryMiddleware:
+    """ASGI middleware: one trace per HTTP request, request histogram, slow log."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        trace = Trace(scope["path"])
+        token = _current_trace.set(trace)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_trace.reset(token)
+            elapsed = time.perf_counter() - trace.started
+            # Label by route template, not raw path, to bound cardinality
+            route_path = getattr(scope.get("route"), "path", "unmatched")
+            REQUEST_LATENCY.observe(elapsed, route_path, trace.attributes.get("version", ""), str(status))
+            if elapsed >= SLOW_REQUEST_SECONDS and random.random() < SLOW_LOG_SAMPLE_RATE:
+                _write_slow_request(trace, status, elapsed)
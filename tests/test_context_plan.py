@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("numpy")
+
+import main
+from models import ModelVersion
+from search_service import SearchService
+
+CHUNKS = [
+    "Mual dan muntah di pagi hari (morning sickness) umum terjadi pada trimester pertama kehamilan.",
+    "Tablet tambah darah diminum setiap hari untuk mencegah anemia.",
+    "Pemeriksaan kehamilan dilakukan minimal enam kali selama kehamilan.",
+    "Asupan protein membantu pertumbuhan janin.",
+]
+WEB_RESULT = {"title": "Morning sickness", "body": "Mual saat hamil muda.", "link": "https://example.org/mual"}
+
+
+def make_kb(monkeypatch, dense: bool) -> main.HealthKnowledgeBase:
+    monkeypatch.setenv("DENSE_RETRIEVAL", "1" if dense else "0")
+    kb = main.HealthKnowledgeBase(SearchService([]))
+    kb._add_chunks(CHUNKS, "Document: panduan.pdf")
+
+    async def web_results(query):
+        return [WEB_RESULT]
+
+    kb._web_results = web_results
+    return kb
+
+
+def test_dense_hit_keeps_documents_when_bm25_is_weak(monkeypatch):
+    kb = make_kb(monkeypatch, dense=True)
+    # No shared term, so BM25 is below LOCAL_MIN_SCORE; the n-grams still match
+    _, top_score, dense_score = kb._rank(kb.documents, "morningsickness")
+    assert top_score < kb.local_min_score
+    assert dense_score >= kb.local_min_dense
+
+    _, context, sources, used_documents = asyncio.run(kb._resolve_context("morningsickness", ModelVersion.ITHAI_1))
+    assert used_documents
+    assert sources[0] == "Document: panduan.pdf"
+    assert "morning sickness" in context
+    assert f"Web: {WEB_RESULT['link']}" in sources
+
+
+def test_weak_bm25_without_dense_retrieval_goes_to_the_web(monkeypatch):
+    kb = make_kb(monkeypatch, dense=False)
+    _, context, sources, used_documents = asyncio.run(kb._resolve_context("morningsickness", ModelVersion.ITHAI_1))
+    assert not used_documents
+    assert sources == [f"Web: {WEB_RESULT['link']}"]
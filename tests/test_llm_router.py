@@ -0,0 +1,183 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from llm_router import LLMRouter, ProviderState
+
+
+class FakeClient:
+    def __init__(self, model: str, delay: float = 0.0, fail: bool = False, tokens=("a", "b", "c"),
+                 error: BaseException = None):
+        self.model = model
+        self.delay = delay
+        self.fail = fail
+        self.error = error or HTTPException(status_code=503, detail=f"{model} is down")
+        self.tokens = tokens
+        self.calls = 0
+        self.cancelled = 0
+
+    async def get_response(self, query: str, context: str, json_mode: bool = False) -> str:
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.fail:
+            raise self.error
+        return self.model
+
+    async def stream_response(self, query: str, context: str):
+        self.calls += 1
+        if self.fail:
+            raise self.error
+        for token in self.tokens:
+            await asyncio.sleep(self.delay)
+            yield token
+
+
+def make_router(*clients, **options) -> LLMRouter:
+    providers = [ProviderState(client.model, client, initial_latency=0.01) for client in clients]
+    return LLMRouter(providers, "test", min_hedge_delay=0.02, max_hedge_delay=0.05, **options)
+
+
+def test_fast_primary_is_not_hedged():
+    primary, backup = FakeClient("primary"), FakeClient("backup")
+    router = make_router(primary, backup)
+    assert asyncio.run(router.get_response("q", "")) == "primary"
+    assert backup.calls == 0
+    assert router.hedges == 0
+
+
+def test_slow_primary_is_hedged_and_the_loser_cancelled():
+    primary, backup = FakeClient("primary", delay=1.0), FakeClient("backup")
+    router = make_router(primary, backup)
+    assert asyncio.run(router.get_response("q", "")) == "backup"
+    assert (router.hedges, router.hedge_wins) == (1, 1)
+    assert primary.cancelled == 1
+    # A cancelled hedge loser is not a failure
+    assert router.providers[0].failures == 0
+
+
+def test_failing_primary_falls_back():
+    primary, backup = FakeClient("primary", fail=True), FakeClient("backup")
+    router = make_router(primary, backup)
+    assert asyncio.run(router.get_response("q", "")) == "backup"
+    assert router.fallbacks == 1
+    assert router.providers[0].failures == 1
+
+
+def test_stream_falls_back_before_the_first_token():
+    primary, backup = FakeClient("primary", fail=True), FakeClient("backup")
+    router = make_router(primary, backup)
+
+    async def run():
+        return [delta async for delta in router.stream_response("q", "")]
+
+    assert asyncio.run(run()) == ["a", "b", "c"]
+    assert router.fallbacks == 1
+
+
+def test_breaker_opens_then_half_opens_then_closes():
+    client = FakeClient("primary", fail=True)
+    state = ProviderState("primary", client, failure_threshold=3, open_seconds=0.05)
+    router = LLMRouter([state], "test")
+
+    for _ in range(3):
+        with pytest.raises(HTTPException):
+            asyncio.run(router.get_response("q", ""))
+    assert state.state == "open"
+    assert not state.available()
+    with pytest.raises(HTTPException) as rejected:
+        asyncio.run(router.get_response("q", ""))
+    assert rejected.value.status_code == 503
+
+    asyncio.run(asyncio.sleep(0.06))
+    assert state.state == "half-open"
+    assert state.available()
+    state.begin()
+    # Only one trial request at a time
+    assert not state.available()
+    state.release()
+
+    client.fail = False
+    assert asyncio.run(router.get_response("q", "")) == "primary"
+    assert state.state == "closed"
+    assert not state.trial_inflight
+
+
+def test_failed_half_open_trial_reopens():
+    client = FakeClient("primary", fail=True)
+    state = ProviderState("primary", client, failure_threshold=1, open_seconds=0.05)
+    router = LLMRouter([state], "test")
+    with pytest.raises(HTTPException):
+        asyncio.run(router.get_response("q", ""))
+    asyncio.run(asyncio.sleep(0.06))
+    assert state.state == "half-open"
+    with pytest.raises(HTTPException):
+        asyncio.run(router.get_response("q", ""))
+    assert state.state == "open"
+
+
+def test_client_errors_do_not_open_the_breaker():
+    rejected = HTTPException(status_code=400, detail="response_format not supported")
+    primary, backup = FakeClient("primary", fail=True, error=rejected), FakeClient("backup")
+    state = ProviderState("primary", primary, failure_threshold=2)
+    router = LLMRouter([state, ProviderState("backup", backup)], "test")
+    for _ in range(5):
+        # Another provider may accept the request, so it still falls back
+        assert asyncio.run(router.get_response("q", "", json_mode=True)) == "backup"
+    assert state.state == "closed"
+    assert state.failures == 0
+
+
+def test_client_error_releases_a_half_open_trial():
+    client = FakeClient("primary", fail=True, error=HTTPException(status_code=422, detail="bad request"))
+    state = ProviderState("primary", client, open_seconds=0.0)
+    state.opened_at = 0.0
+    with pytest.raises(HTTPException):
+        asyncio.run(LLMRouter([state], "test").get_response("q", ""))
+    assert not state.trial_inflight
+    assert state.available()
+
+
+@pytest.mark.parametrize("error", [
+    HTTPException(status_code=502, detail="bad gateway"),
+    httpx.ReadTimeout("timed out"),
+    httpx.ConnectError("connection refused"),
+])
+def test_provider_faults_open_the_breaker(error):
+    state = ProviderState("primary", FakeClient("primary", fail=True, error=error), failure_threshold=2)
+    router = LLMRouter([state], "test")
+    for _ in range(2):
+        with pytest.raises(type(error)):
+            asyncio.run(router.get_response("q", ""))
+    assert state.state == "open"
+
+
+def test_cancelled_stream_releases_the_half_open_trial():
+    client = FakeClient("primary", delay=0.05, tokens=("a",) * 20)
+    state = ProviderState("primary", client, open_seconds=0.0)
+    state.opened_at = 0.0
+    router = LLMRouter([state], "test")
+
+    async def run():
+        received = []
+
+        async def consume():
+            async for delta in router.stream_response("q", ""):
+                received.append(delta)
+
+        task = asyncio.create_task(consume())
+        while not received:
+            await asyncio.sleep(0.01)
+        assert state.trial_inflight
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    assert not state.trial_inflight
+    assert state.available()
@@ -0,0 +1,109 @@
+import asyncio
+
+import httpx
+import pytest
+
+from search_service import SearchError, SearchService
+
+RESULT = {"organic_results": [{"title": "Anemia pada kehamilan", "link": "https://example.org/anemia"}]}
+
+
+def make_service(handler, keys=("key-a", "key-b")) -> SearchService:
+    service = SearchService(list(keys), base_url="http://serpapi.test")
+    service._http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return service
+
+
+def test_concurrent_identical_queries_share_one_upstream_call():
+    calls = []
+
+    async def handler(request):
+        calls.append(request.url.params["q"])
+        await asyncio.sleep(0.05)
+        return httpx.Response(200, json=RESULT)
+
+    async def run():
+        service = make_service(handler)
+        results = await asyncio.gather(*(service.organic_results("anemia ibu hamil") for _ in range(5)))
+        await service.close()
+        return service, results
+
+    service, results = asyncio.run(run())
+    assert calls == ["anemia ibu hamil"]
+    assert all(result == RESULT["organic_results"] for result in results)
+    assert service.coalesced == 4
+
+
+def test_cached_query_skips_upstream():
+    calls = []
+
+    def handler(request):
+        calls.append(request.url.params["q"])
+        return httpx.Response(200, json=RESULT)
+
+    async def run():
+        service = make_service(handler)
+        await service.organic_results("mual")
+        await service.organic_results("mual")
+        await service.close()
+        return service
+
+    service = asyncio.run(run())
+    assert len(calls) == 1
+    assert service.cache_hits == 1
+
+
+def test_requests_rotate_across_keys():
+    keys = []
+
+    def handler(request):
+        keys.append(request.url.params["api_key"])
+        return httpx.Response(200, json=RESULT)
+
+    async def run():
+        service = make_service(handler, keys=("key-a", "key-b", "key-c"))
+        for query in ("mual", "pusing", "kram", "demam"):
+            await service.organic_results(query)
+        await service.close()
+
+    asyncio.run(run())
+    assert keys == ["key-a", "key-b", "key-c", "key-a"]
+
+
+def test_rejected_key_is_put_on_cooldown_and_skipped():
+    keys = []
+
+    def handler(request):
+        key = request.url.params["api_key"]
+        keys.append(key)
+        if key == "key-a":
+            return httpx.Response(429, json={"error": "rate limited"})
+        return httpx.Response(200, json=RESULT)
+
+    async def run():
+        service = make_service(handler)
+        first = await service.organic_results("mual")
+        await service.organic_results("pusing")
+        await service.close()
+        return service, first
+
+    service, first = asyncio.run(run())
+    assert first == RESULT["organic_results"]
+    # key-a is tried once, then skipped while cooling down
+    assert keys == ["key-a", "key-b", "key-b"]
+    assert service.stats()["keys_on_cooldown"] == 1
+
+
+def test_all_keys_rejected_raises():
+    def handler(request):
+        return httpx.Response(401, json={"error": "invalid key"})
+
+    async def run():
+        service = make_service(handler)
+        try:
+            await service.organic_results("mual")
+        finally:
+            await service.close()
+
+    with pytest.raises(SearchError):
+        asyncio.run(run())
@@ -0,0 +1,58 @@
+import asyncio
+
+from cache import SQLiteCache, TTLCache
+from expert_system.inference_engine import InteractiveDiagnosis
+from expert_system.sessions import SessionStore
+
+
+def make_store(path) -> SessionStore:
+    return SessionStore(TTLCache(100, 600), SQLiteCache(str(path), 600))
+
+
+def make_diagnosis(session_id: str) -> InteractiveDiagnosis:
+    diagnosis = InteractiveDiagnosis("sakit kepala hebat")
+    diagnosis.session_id = session_id
+    return diagnosis
+
+
+def test_session_continues_on_another_worker(tmp_path):
+    path = tmp_path / "sessions.db"
+    first, second = make_store(path), make_store(path)
+
+    async def run():
+        await first.save(make_diagnosis("s1"))
+        return await second.get("s1")
+
+    restored = asyncio.run(run())
+    assert restored is not None
+    assert restored.initial_complaint == "sakit kepala hebat"
+
+
+def test_stale_memory_copy_is_replaced_by_the_shared_one(tmp_path):
+    path = tmp_path / "sessions.db"
+    first, second = make_store(path), make_store(path)
+
+    async def run():
+        await first.save(make_diagnosis("s1"))
+        stale = await second.get("s1")
+        # The session moves on elsewhere
+        advanced = await first.get("s1")
+        advanced.answers["Sejak kapan?"] = "dua hari"
+        await first.save(advanced)
+        return stale, await second.get("s1")
+
+    stale, current = asyncio.run(run())
+    assert current is not stale
+    assert current.answers == {"Sejak kapan?": "dua hari"}
+
+
+def test_unchanged_session_keeps_the_memory_copy(tmp_path):
+    store = make_store(tmp_path / "sessions.db")
+
+    async def run():
+        diagnosis = make_diagnosis("s1")
+        await store.save(diagnosis)
+        return diagnosis, await store.get("s1")
+
+    saved, loaded = asyncio.run(run())
+    assert loaded is saved
@@ -0,0 +1,47 @@
+import pytest
+
+from retrieval.text import stem, tokenize
+
+# Inflections of one word must share a stem, and roots must survive whole
+SAME_STEM = [
+    ("sehat", ["kesehatan", "sehatnya"]),
+    ("darah", ["perdarahan", "pendarahan", "berdarah"]),
+    ("salin", ["persalinan", "bersalin"]),
+    ("hamil", ["kehamilan", "hamilnya"]),
+    ("rawat", ["perawat", "merawat", "dirawat"]),
+    ("sakit", ["penyakit", "sakitnya"]),
+    ("sendi", ["persendian", "sendinya"]),
+    ("diare", ["diarenya"]),
+    ("kepala", ["kepalanya"]),
+    ("makan", ["makanan", "memakan", "dimakan", "makanannya"]),
+    ("minum", ["minuman", "meminum", "diminum"]),
+    ("periksa", ["pemeriksaan", "memeriksa", "diperiksa", "periksakan"]),
+    ("perlu", ["keperluan", "diperlukan", "memerlukan"]),
+    ("renang", ["berenang"]),
+    ("ajar", ["belajar", "pelajaran", "mempelajari"]),
+    ("pilih", ["memilih", "dipilih", "pilihan"]),
+    ("konsumsi", ["mengonsumsi", "dikonsumsi"]),
+    ("kurang", ["mengurangi", "kekurangan"]),
+    ("hati", ["perhatian", "memperhatikan"]),
+    ("bersih", ["kebersihan", "membersihkan"]),
+]
+
+ROOTS = [
+    "sehat", "diare", "perut", "pegal", "sesak", "bedah", "kepala", "diabetes", "bengkak", "darah", "mual",
+    "makan", "minum", "periksa", "perlu", "pernah", "renang", "bersih", "konsumsi", "keluar",
+]
+
+
+@pytest.mark.parametrize("root, words", SAME_STEM)
+def test_inflections_share_the_root(root, words):
+    for word in words:
+        assert stem(word) == root, word
+
+
+@pytest.mark.parametrize("word", ROOTS)
+def test_roots_are_not_stripped(word):
+    assert stem(word) == word
+
+
+def test_tokenize_drops_stopwords_and_stems():
+    assert tokenize("Apakah perdarahan saat persalinan berbahaya?") == ["darah", "salin", "bahaya"]
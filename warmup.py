@@ -0,0 +1,76 @@
+import asyncio
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Started when the module is first imported, i.e. with the worker process
+PROCESS_STARTED = time.monotonic()
+
+
+class Warmup:
+    """Start-up work that runs after the server already accepts connections.
+
+    Stages run in order, each in a worker thread so the event loop keeps
+    serving (liveness, metrics, small talk) while indexes load. A stage
+    function gets a ``report(**detail)`` callback for progress. Requests
+    that need a stage check ``ready(name)`` and are turned away with 503
+    until it is done; a failed stage stays failed (and unready) until the
+    process restarts.
+    """
+
+    def __init__(self):
+        self._stages: List[Tuple[str, Callable]] = []
+        self.state: Dict[str, Dict] = {}
+        self.task: Optional[asyncio.Task] = None
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def add(self, name: str, func: Callable):
+        self._stages.append((name, func))
+        self.state[name] = {"status": "pending"}
+
+    def ready(self, *names: str) -> bool:
+        """True once the named stages (default: all) have completed."""
+        return all(self.state[name]["status"] == "done" for name in (names or self.state))
+
+    def start(self):
+        self.started_at = time.monotonic()
+        self.task = asyncio.create_task(self.run())
+
+    async def run(self):
+        for name, func in self._stages:
+            stage = self.state[name]
+            stage.update(status="running", started_s=round(time.monotonic() - PROCESS_STARTED, 3))
+            started = time.perf_counter()
+            try:
+                await asyncio.to_thread(func, stage.update)
+            except Exception as e:
+                print(f"Warm-up stage {name} failed: {e}")
+                stage.update(status="failed", error=str(e))
+            else:
+                stage["status"] = "done"
+            stage["seconds"] = round(time.perf_counter() - started, 3)
+        self.finished_at = time.monotonic()
+
+    async def wait(self):
+        if self.task is not None:
+            await self.task
+
+    async def stop(self):
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+
+    def status(self) -> Dict:
+        done = sum(stage["status"] == "done" for stage in self.state.values())
+        status = {
+            "ready": self.ready(),
+            "progress": round(done / len(self.state), 3) if self.state else 1.0,
+            "uptime_s": round(time.monotonic() - PROCESS_STARTED, 3),
+            "stages": self.state,
+        }
+        if self.finished_at is not None:
+            status["warmup_s"] = round(self.finished_at - self.started_at, 3)
+        return status